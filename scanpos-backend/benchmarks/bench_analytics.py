@@ -0,0 +1,87 @@
+"""Benchmark the columnar sales report on a synthetic year of sales.
+
+Usage: python benchmarks/bench_analytics.py [--invoices 300000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from scanpos_backend.analytics import ColumnarStore, COMPLETED, to_timestamp  # noqa: E402
+
+
+def build_snapshot(path, invoices, items_per_invoice, products, seed=42):
+    """Write a synthetic snapshot covering the last 365 days"""
+    rng = np.random.default_rng(seed)
+    end = to_timestamp(datetime.utcnow())
+    inv_ts = np.sort(rng.integers(end - 365 * 86400, end, invoices))
+    item_invoice = np.repeat(np.arange(1, invoices + 1), items_per_invoice)
+    n_items = item_invoice.size
+    # Skewed product popularity, like a real store
+    item_product = np.minimum(rng.zipf(1.3, n_items), products)
+    item_qty = rng.integers(1, 5, n_items)
+    item_revenue = item_qty * rng.uniform(10, 500, n_items)
+    inv_total = np.bincount(item_invoice - 1, weights=item_revenue)
+
+    columns = {
+        'inv_id': np.arange(1, invoices + 1, dtype=np.int64),
+        'inv_ts': inv_ts.astype(np.int64),
+        'inv_total': inv_total,
+        'inv_tax': inv_total * 0.05,
+        'inv_discount': np.zeros(invoices),
+        'inv_status': np.full(invoices, COMPLETED, dtype=np.int8),
+        'item_invoice': item_invoice.astype(np.int64),
+        'item_ts': np.repeat(inv_ts, items_per_invoice).astype(np.int64),
+        'item_product': item_product.astype(np.int64),
+        'item_qty': item_qty.astype(np.int64),
+        'item_revenue': item_revenue,
+        'item_status': np.full(n_items, COMPLETED, dtype=np.int8),
+    }
+    meta = {
+        'last_invoice_id': invoices, 'last_movement_id': 0, 'open_drafts': [],
+        'refreshed_at': datetime.utcnow().isoformat(), 'invoices': invoices, 'items': n_items
+    }
+    names = {i: [f'Product {i}', str(100000 + i)] for i in range(1, products + 1)}
+    ColumnarStore(path)._write(columns, meta, names)
+    return n_items
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--invoices', type=int, default=300000)
+    parser.add_argument('--items-per-invoice', type=int, default=4)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as path:
+        n_items = build_snapshot(path, args.invoices, args.items_per_invoice, args.products)
+        store = ColumnarStore(path).load()
+
+        now = datetime.utcnow()
+        ranges = {
+            'last 30 days': now - timedelta(days=30),
+            'last 365 days': now - timedelta(days=365),
+        }
+        print(f'{args.invoices} invoices, {n_items} line items')
+        for label, start in ranges.items():
+            store.sales_report(start, now)  # touch the pages once
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                store.sales_report(start, now)
+            elapsed = (time.perf_counter() - t0) / args.repeat * 1000
+            print(f'  sales_report {label:>14}: {elapsed:8.2f} ms')
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            store.daily_series(now - timedelta(days=365), now)
+        print(f'  daily_series  last 365 days: {(time.perf_counter() - t0) / args.repeat * 1000:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark customer lookups (phone prefix, name words) at a million customers.
+
+Times `lookup_customers()` directly, i.e. without the per-worker result
+cache, against an unindexed LIKE scan for comparison.
+
+Usage: python benchmarks/bench_customers.py [--customers 1000000]
+"""
+import argparse
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from scanpos_backend import create_app  # noqa: E402
+from scanpos_backend.config import Config  # noqa: E402
+from scanpos_backend.extensions import db  # noqa: E402
+from scanpos_backend.models import Customer  # noqa: E402
+from scanpos_backend.customers import lookup_customers  # noqa: E402
+
+FIRST = ['Anil', 'Anita', 'Arjun', 'Deepa', 'Farah', 'Gopal', 'Harish', 'Isha', 'Joseph', 'Kavya', 'Lakshmi',
+         'Manoj', 'Meera', 'Nikhil', 'Pooja', 'Priya', 'Rahul', 'Ravi', 'Sanjay', 'Sneha', 'Suresh', 'Vikram']
+LAST = ['Agarwal', 'Bhat', 'Das', 'Fernandes', 'Gowda', 'Iyer', 'Joshi', 'Khan', 'Menon', 'Nair', 'Patel',
+        'Rao', 'Reddy', 'Shetty', 'Singh', 'Varghese']
+
+
+def populate(path, count, seed=42):
+    rng = random.Random(seed)
+    con = sqlite3.connect(path)
+    customers, tokens = [], []
+    for i in range(1, count + 1):
+        # A suffix makes the name space large, like real surnames
+        name = f'{rng.choice(FIRST)} {rng.choice(LAST)}{rng.randint(1, 999)}'
+        digits = f'9{rng.randint(0, 10 ** 9 - 1):09d}'
+        customers.append((i, name, '+91 ' + digits, digits))
+        tokens.extend((word, i) for word in set(re.findall(r'\w+', name.lower())))
+    con.executemany('INSERT INTO customers (id, name, phone, phone_digits) VALUES (?, ?, ?, ?)', customers)
+    con.executemany('INSERT INTO customer_name_tokens (token, customer_id) VALUES (?, ?)', tokens)
+    con.commit()
+    con.execute('ANALYZE')
+    con.close()
+
+
+def timed(fn, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--customers', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    cases = {
+        'phone, 4 digits': [f'9{rng.randint(0, 999):03d}' for _ in range(args.queries)],
+        'phone, 7 digits': [f'9{rng.randint(0, 999999):06d}' for _ in range(args.queries)],
+        'name, 3 letters': [rng.choice(FIRST)[:3] for _ in range(args.queries)],
+        'first + last': [f'{rng.choice(FIRST)} {rng.choice(LAST)[:4]}' for _ in range(args.queries)],
+        'full name (rare)': [f'{rng.choice(FIRST)} {rng.choice(LAST)}{rng.randint(1, 999)}'
+                             for _ in range(args.queries)],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+            SQLALCHEMY_BINDS = {'archive': 'sqlite:///' + os.path.join(tmp, 'archive.db')}
+            SLOW_QUERY_LOG_ENABLED = False
+
+        app = create_app(BenchConfig)
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            populate(path, args.customers)
+            print(f'{args.customers} customers loaded in {time.perf_counter() - start:.1f}s')
+
+            def like_scan(query):
+                Customer.query.filter(
+                    db.or_(Customer.phone.like(f'%{query}%'), Customer.name.ilike(f'%{query}%'))
+                ).limit(10).all()
+
+            print(f'  {"":18} {"indexed p50":>12} {"p99":>9} {"LIKE p50":>10}')
+            for label, queries in cases.items():
+                p50, p99 = timed(lookup_customers, queries)
+                like_p50, _ = timed(like_scan, queries[:10])
+                print(f'  {label:18} {p50:10.2f}ms {p99:7.2f}ms {like_p50:8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
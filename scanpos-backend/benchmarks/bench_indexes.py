@@ -0,0 +1,161 @@
+"""Benchmark the listing, report and item-lookup paths with and without the
+composite indexes added by migration 4b7e2d91c0a3.
+
+Usage: python benchmarks/bench_indexes.py [--invoices 100000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from scanpos_backend import create_app  # noqa: E402
+from scanpos_backend.config import Config  # noqa: E402
+from scanpos_backend.extensions import db  # noqa: E402
+from scanpos_backend.models import Invoice, InvoiceItem  # noqa: E402
+from scanpos_backend.archive import sales_totals, top_products  # noqa: E402
+
+INDEXES = {
+    'ix_invoices_status_created':
+        'CREATE INDEX ix_invoices_status_created ON invoices '
+        '(status, created_at, total_amount, total_tax, discount_amount)',
+    'ix_invoices_created_at': 'CREATE INDEX ix_invoices_created_at ON invoices (created_at)',
+    'uq_invoice_items_invoice_product':
+        'CREATE UNIQUE INDEX uq_invoice_items_invoice_product ON invoice_items (invoice_id, product_id)',
+    'ix_invoice_items_invoice_cover':
+        'CREATE INDEX ix_invoice_items_invoice_cover ON invoice_items (invoice_id, product_id, quantity, line_total)',
+    'ix_invoice_items_product_id': 'CREATE INDEX ix_invoice_items_product_id ON invoice_items (product_id)',
+}
+
+
+def populate(path, invoices, items_per_invoice, products, seed=42):
+    """Fill the hot tables with a year of completed sales and a few drafts"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    con = sqlite3.connect(path)
+    con.executemany(
+        'INSERT INTO products (id, name, barcode, price, tax_percent, stock_qty, stock_watermark, '
+        'reorder_level, is_active, created_at) VALUES (?, ?, ?, ?, 5, 1000, 0, 10, 1, ?)',
+        # Money columns hold integer paise
+        [(i, f'Product {i}', str(100000 + i), rng.randint(1000, 50000), now) for i in range(1, products + 1)]
+    )
+    invoice_rows, item_rows = [], []
+    for i in range(1, invoices + 1):
+        created = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+        status = 'draft' if rng.random() < 0.02 else 'completed'
+        subtotal_sum = tax_sum = 0
+        for product_id in rng.sample(range(1, products + 1), items_per_invoice):
+            qty = rng.randint(1, 4)
+            subtotal = qty * 10000
+            tax = subtotal * 5 // 100
+            subtotal_sum += subtotal
+            tax_sum += tax
+            item_rows.append((i, product_id, qty, 10000, 5.0, subtotal, tax, subtotal + tax))
+        invoice_rows.append((i, f'INV-{i:08d}', status, subtotal_sum, tax_sum, 0, subtotal_sum + tax_sum, created, created))
+    con.executemany(
+        'INSERT INTO invoices (id, invoice_number, status, subtotal_amount, total_tax, discount_amount, '
+        'total_amount, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', invoice_rows
+    )
+    con.executemany(
+        'INSERT INTO invoice_items (invoice_id, product_id, quantity, unit_price, tax_percent, '
+        'line_subtotal, line_tax, line_total) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', item_rows
+    )
+    con.commit()
+    con.close()
+    return len(item_rows)
+
+
+def timed(fn, repeat):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def run_cases(invoices, products, repeat):
+    now = datetime.utcnow()
+    month = now - timedelta(days=30)
+    rng = random.Random(7)
+
+    def list_page():
+        query = Invoice.query.filter_by(status='completed').order_by(Invoice.created_at.desc())
+        query.order_by(None).count()
+        query.limit(20).all()
+
+    def list_unfiltered():
+        Invoice.query.order_by(Invoice.created_at.desc()).limit(20).all()
+
+    def item_lookup():
+        InvoiceItem.query.filter_by(
+            invoice_id=rng.randint(1, invoices), product_id=rng.randint(1, products)
+        ).first()
+
+    def product_usage():
+        db.session.query(db.func.count(InvoiceItem.id)).filter(
+            InvoiceItem.product_id == rng.randint(1, products)
+        ).scalar()
+
+    cases = {
+        'sales_totals 30 days': lambda: sales_totals(month, now),
+        'top_products 30 days': lambda: top_products(month, now),
+        'list completed, page 1': list_page,
+        'list all, page 1': list_unfiltered,
+        'item by (invoice, product)': item_lookup,
+        'items of one product': product_usage,
+    }
+    results = {}
+    for label, fn in cases.items():
+        results[label] = timed(fn, repeat)
+        db.session.rollback()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--invoices', type=int, default=100000)
+    parser.add_argument('--items-per-invoice', type=int, default=4)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+            SQLALCHEMY_BINDS = {'archive': 'sqlite:///' + os.path.join(tmp, 'archive.db')}
+            SLOW_QUERY_LOG_ENABLED = False
+
+        app = create_app(BenchConfig)
+        with app.app_context():
+            db.create_all()
+            n_items = populate(path, args.invoices, args.items_per_invoice, args.products)
+
+            def set_indexes(enabled):
+                db.session.remove()
+                with db.engine.begin() as conn:
+                    for name, ddl in INDEXES.items():
+                        conn.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+                        if enabled:
+                            conn.exec_driver_sql(ddl)
+                    conn.exec_driver_sql('ANALYZE')
+
+            set_indexes(False)
+            before = run_cases(args.invoices, args.products, args.repeat)
+            set_indexes(True)
+            after = run_cases(args.invoices, args.products, args.repeat)
+
+        print(f'{args.invoices} invoices, {n_items} line items, {args.products} products')
+        print(f'  {"":28} {"before":>10} {"after":>10}')
+        for label in before:
+            print(f'  {label:28} {before[label]:8.2f}ms {after[label]:8.2f}ms  x{before[label] / after[label]:.1f}')
+
+
+if __name__ == '__main__':
+    main()
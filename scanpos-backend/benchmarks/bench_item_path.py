@@ -0,0 +1,175 @@
+"""Benchmark adding and updating invoice lines: Core fast path vs the ORM path.
+
+Runs the same scan sequence through `POST /api/invoices/<id>/items` and
+`PUT /api/invoices/<id>/items/<item_id>` with ITEM_FAST_PATH_ENABLED on and
+off, and reports time and SQL statements per request. Uses the Flask test
+client, so the numbers are server-side cost without network.
+
+Before timing, the same requests (new and repeated scans, edits, and the
+cases that fall back to the ORM) go through both paths, and it exits with
+status 1 if any response differs, down to int vs float in the JSON.
+
+Usage: python benchmarks/bench_item_path.py [--requests 3000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy import event  # noqa: E402
+from scanpos_backend import create_app  # noqa: E402
+from scanpos_backend.config import Config  # noqa: E402
+from scanpos_backend.extensions import db  # noqa: E402
+from scanpos_backend.models import Invoice, Product, User  # noqa: E402
+
+
+def setup(app, products):
+    with app.app_context():
+        db.create_all()
+        admin = User(name='Bench', email='bench@scanpos.local', role='admin')
+        admin.set_password('bench')
+        db.session.add(admin)
+        db.session.add_all([
+            Product(name=f'Product {i}', barcode=f'BENCH{i:05d}', price=10 + i % 90 + 0.25,
+                    tax_percent=(0, 5, 12, 18)[i % 4], stock_snapshot=10 ** 6)
+            for i in range(products)
+        ])
+        db.session.commit()
+
+
+def responses(app, client, headers, fast):
+    """Status and JSON of a fixed scan/edit sequence on a fresh draft"""
+    app.config['ITEM_FAST_PATH_ENABLED'] = fast
+    invoice_id = client.post('/api/invoices', json={}, headers=headers).get_json()['invoice']['id']
+    out, line_ids = [], []
+
+    def call(body, line=None):
+        """POST a scan, or PUT to the `line`-th line added"""
+        if line is None:
+            method, path = 'POST', f'/api/invoices/{invoice_id}/items'
+        else:
+            method, path = 'PUT', f'/api/invoices/{invoice_id}/items/{line_ids[line]}'
+        response = client.open(path, method=method, json=body, headers=headers)
+        data = response.get_json()
+        item = data.get('item') if isinstance(data, dict) else None
+        if item and 'id' in item:
+            if item['id'] not in line_ids:
+                line_ids.append(item['id'])
+            # Line ids differ between the two drafts; compare their position instead
+            item['id'] = line_ids.index(item['id'])
+        # json.dumps keeps 5 and 5.0 apart
+        out.append((method, line, body, response.status_code, json.dumps(data, sort_keys=True)))
+
+    call({'barcode': 'BENCH00001', 'quantity': 2})  # new line, 5% tax
+    call({'barcode': 'BENCH00001', 'quantity': 1})  # repeat scan
+    call({'product_id': 4, 'quantity': 1})  # by id, 18% tax
+    call({'barcode': 'BENCH00002'})  # default quantity
+    call({'quantity': 3}, line=0)
+    call({'quantity': 10 ** 7}, line=1)  # short stock: ORM error
+    call({'barcode': 'BENCH00001', 'quantity': 10 ** 7})
+    call({'barcode': 'NO-SUCH-CODE', 'quantity': 1})
+    call({'product_id': 3, 'quantity': 0})
+    call({'quantity': 0}, line=2)  # removes the line
+    return out
+
+
+def check_responses(app, client, headers):
+    """Compare both paths on the same requests. Returns the differences."""
+    orm, fast = responses(app, client, headers, False), responses(app, client, headers, True)
+    return [(a, b) for a, b in zip(orm, fast) if a != b]
+
+
+def run(app, client, headers, fast, count, products, seed):
+    """Scan `count` items into fresh drafts; every fifth request edits a line"""
+    app.config['ITEM_FAST_PATH_ENABLED'] = fast
+    rng = random.Random(seed)
+    samples, statements = [], [0]
+
+    def count_statement(*args):
+        statements[0] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    try:
+        invoice_id, lines = None, []
+        for i in range(count):
+            if i % 20 == 0:
+                invoice_id = client.post('/api/invoices', json={}, headers=headers).get_json()['invoice']['id']
+                lines = []
+            statements[0] = 0
+            if lines and i % 5 == 4:
+                method, path = 'PUT', f'/api/invoices/{invoice_id}/items/{rng.choice(lines)}'
+                body = {'quantity': rng.randint(1, 4)}
+            else:
+                method, path = 'POST', f'/api/invoices/{invoice_id}/items'
+                body = {'barcode': f'BENCH{rng.randrange(products):05d}', 'quantity': 1}
+            start = time.perf_counter()
+            response = client.open(path, method=method, json=body, headers=headers)
+            samples.append((time.perf_counter() - start, statements[0]))
+            assert response.status_code in (200, 201), response.get_json()
+            if method == 'POST':
+                lines.append(response.get_json()['item']['id'])
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--products', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+            SQLALCHEMY_BINDS = {'archive': 'sqlite:///' + os.path.join(tmp, 'archive.db')}
+            SLOW_QUERY_LOG_ENABLED = False
+            ADMISSION_ENABLED = False
+
+        app = create_app(BenchConfig)
+        setup(app, args.products)
+        client = app.test_client()
+        token = client.post('/api/auth/login', json={'email': 'bench@scanpos.local', 'password': 'bench'}
+                            ).get_json()['access_token']
+        headers = {'Authorization': 'Bearer ' + token}
+
+        differences = check_responses(app, client, headers)
+        for orm, fast in differences:
+            target = 'scan' if orm[1] is None else f'line {orm[1]}'
+            print(f'Response differs for {orm[0]} {target} {orm[2]}:\n  ORM:  {orm[3]} {orm[4]}\n'
+                  f'  fast: {fast[3]} {fast[4]}')
+        if differences:
+            sys.exit(1)
+        print('Fast path and ORM responses match')
+
+        # Warm both paths first, then alternate so drift hits both alike
+        for fast in (False, True):
+            run(app, client, headers, fast, 200, args.products, seed=0)
+        results = {False: [], True: []}
+        for round_ in range(4):
+            for fast in (False, True):
+                results[fast] += run(app, client, headers, fast, args.requests // 4, args.products, seed=round_ + 1)
+
+        print(f'{args.requests} scan/edit requests per path, {args.products} products')
+        print(f'  {"path":10} {"mean":>9} {"p50":>9} {"p99":>9} {"SQL/req":>8}')
+        means = {}
+        for fast, label in ((False, 'ORM'), (True, 'Core fast')):
+            times = sorted(t for t, _ in results[fast])
+            means[fast] = sum(times) / len(times)
+            sql = sum(n for _, n in results[fast]) / len(results[fast])
+            print(f'  {label:10} {means[fast] * 1e6:7.0f}us {times[len(times) // 2] * 1e6:7.0f}us '
+                  f'{times[int(len(times) * 0.99)] * 1e6:7.0f}us {sql:8.1f}')
+        print(f'  speedup: x{means[False] / means[True]:.2f}')
+        with app.app_context():
+            assert Invoice.query.count() > 0 and Product.query.count() == args.products
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Benchmark ESC/POS receipt rendering against PDF generation of the same receipt.
+
+PDF is produced with reportlab when it is installed; otherwise a minimal
+hand-written PDF (one page, built-in Courier font, no layout engine) stands
+in as a lower bound for what any PDF path costs.
+
+Usage: python benchmarks/bench_receipts.py [--lines 15]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import zlib
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from scanpos_backend.receipts import ReceiptTemplate, ReceiptCache  # noqa: E402
+
+
+def sample_invoice(lines):
+    items = [
+        {
+            'product_name': f'Product number {i} with a fairly long name',
+            'quantity': i % 4 + 1,
+            'unit_price': 10.0 + i,
+            'tax_percent': 5.0,
+            'line_total': (i % 4 + 1) * (10.0 + i) * 1.05
+        }
+        for i in range(lines)
+    ]
+    subtotal = sum(item['quantity'] * item['unit_price'] for item in items)
+    invoice = {
+        'invoice_number': 'INV-20250101-0001',
+        'created_at': datetime(2025, 1, 1, 12, 30),
+        'subtotal_amount': subtotal,
+        'total_tax': subtotal * 0.05,
+        'discount_amount': 10.0,
+        'total_amount': subtotal * 1.05 - 10.0,
+    }
+    return invoice, items
+
+
+def receipt_text(invoice, items, width=48):
+    """Plain-text receipt lines, the content both PDF paths print"""
+    lines = ['ScanPOS', f"Invoice {invoice['invoice_number']}", invoice['created_at'].strftime('%Y-%m-%d %H:%M')]
+    for item in items:
+        lines.append(f"{item['product_name'][:32]:<32}{item['quantity']:>5}{item['line_total']:>11.2f}")
+    lines += [f"{'Subtotal':<20}{invoice['subtotal_amount']:>28.2f}",
+              f"{'Tax':<20}{invoice['total_tax']:>28.2f}",
+              f"{'TOTAL':<20}{invoice['total_amount']:>28.2f}"]
+    return lines
+
+
+def pdf_reportlab(invoice, items):
+    from reportlab.lib.units import mm
+    from reportlab.pdfgen import canvas
+    lines = receipt_text(invoice, items)
+    buffer = io.BytesIO()
+    height = (len(lines) + 4) * 4 * mm
+    pdf = canvas.Canvas(buffer, pagesize=(80 * mm, height))
+    pdf.setFont('Courier', 7)
+    y = height - 6 * mm
+    for line in lines:
+        pdf.drawString(3 * mm, y, line)
+        y -= 4 * mm
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def pdf_minimal(invoice, items):
+    lines = receipt_text(invoice, items)
+    height = (len(lines) + 4) * 11
+    ops = ['BT /F1 7 Tf 9 TL', f'8 {height - 17} Td']
+    for line in lines:
+        escaped = line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        ops.append(f'({escaped}) Tj T*')
+    ops.append('ET')
+    stream = zlib.compress('\n'.join(ops).encode('latin-1'))
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 227 {height}] '
+        f'/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>'.encode(),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>',
+        b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(stream) + stream + b'\nendstream',
+    ]
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+    xref = out.tell()
+    out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b'%010d 00000 n \n' % offset)
+    out.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def timed(fn, repeat):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - t0) / repeat * 1e6, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=15)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    invoice, items = sample_invoice(args.lines)
+    template = ReceiptTemplate(48, 'ScanPOS', [], ['Thank you for your business!'], 'Rs.', 'cp437', 0)
+    cache = ReceiptCache(512)
+    cache.put('1', template.render(invoice, items))
+
+    try:
+        import reportlab  # noqa: F401
+        pdf_label, pdf = 'PDF (reportlab)', pdf_reportlab
+    except ImportError:
+        pdf_label, pdf = 'PDF (minimal writer)', pdf_minimal
+
+    cases = {
+        'ESC/POS template render': lambda: template.render(invoice, items),
+        'ESC/POS cache hit': lambda: cache.get('1'),
+        pdf_label: lambda: pdf(invoice, items),
+    }
+    print(f'{args.lines}-line receipt')
+    for label, fn in cases.items():
+        micros, size = timed(fn, args.repeat)
+        print(f'  {label:26} {micros:9.1f} us  {size:6d} bytes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Compare the production worker models under checkout load.
+
+Starts `gunicorn -c gunicorn.conf.py` once per candidate setting (pre-fork
+sync, threaded gthread, green-thread gevent, sized for --cores), drives it
+with the checkout terminals of load_terminals.py over keep-alive HTTP, and
+prints throughput, latency and memory for each, then the SERVER_* settings
+to use: the highest checkout rate whose p99 scan latency meets --p99-ms.
+
+Run it on the till server itself (or a machine with the same core count);
+with fewer real cores than --cores the candidates just share them.
+
+Usage: python benchmarks/bench_serving.py [--cores 4] [--terminals 24] [--duration 20]
+"""
+import argparse
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import Namespace
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_terminals import (HttpClient, Stats, Terminal, create_products, in_process_app,  # noqa: E402
+                            login, percentile, zipf_weights)
+
+
+def candidates(cores, with_gevent):
+    """(label, SERVER_* environment) per setting to try"""
+    found = [
+        ('sync 2n+1', {'SERVER_WORKER_CLASS': 'sync', 'SERVER_WORKERS': 2 * cores + 1}),
+        ('gthread n x 4', {'SERVER_WORKER_CLASS': 'gthread', 'SERVER_WORKERS': cores, 'SERVER_THREADS': 4}),
+        ('gthread n x 8', {'SERVER_WORKER_CLASS': 'gthread', 'SERVER_WORKERS': cores, 'SERVER_THREADS': 8}),
+        ('gthread 2n x 2', {'SERVER_WORKER_CLASS': 'gthread', 'SERVER_WORKERS': 2 * cores, 'SERVER_THREADS': 2}),
+    ]
+    if with_gevent:
+        found.append(('gevent n x 100', {'SERVER_WORKER_CLASS': 'gevent', 'SERVER_WORKERS': cores,
+                                         'SERVER_WORKER_CONNECTIONS': 100}))
+    return found
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid):
+    """Resident memory of a process and its children"""
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS'))
+            with open(f'/proc/{current}/task/{current}/children') as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (OSError, StopIteration):
+            continue
+    return total / 1024
+
+
+def wait_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, _ = HttpClient(url, 1).request('GET', '/health')
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+def run_candidate(label, settings, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        in_process_app(tmp)  # fresh database with the load-test admin
+        port = free_port()
+        url = f'http://127.0.0.1:{port}'
+        env = dict(os.environ, **{name: str(value) for name, value in settings.items()},
+                   SERVER_BIND=f'127.0.0.1:{port}', SERVER_LOG_LEVEL='warning',
+                   DATABASE_URL='sqlite:///' + os.path.join(tmp, 'load.db'),
+                   ARCHIVE_DATABASE_URL='sqlite:///' + os.path.join(tmp, 'archive.db'),
+                   ADMISSION_ENABLED='false', SLOW_QUERY_LOG_ENABLED='false')
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                                  cwd=BACKEND, env=env)
+        try:
+            wait_ready(url)
+            setup = HttpClient(url, args.timeout)
+            token = login(setup, 'load@scanpos.local', 'load')
+            products = create_products(setup, token, args.products, 10 ** 6)
+            random.Random(args.seed).shuffle(products)
+            options = Namespace(seed=args.seed, max_items=8, edit_rate=0.2, abandon_rate=0.1,
+                                think_ms=args.think_ms)
+
+            stats = Stats()
+            deadline = time.monotonic() + args.duration
+            terminals = [
+                Terminal(i, HttpClient(url, args.timeout), token, products,
+                         zipf_weights(len(products), 1.1), options, deadline, stats)
+                for i in range(args.terminals)
+            ]
+            start = time.monotonic()
+            for terminal in terminals:
+                terminal.start()
+            for terminal in terminals:
+                terminal.join()
+            elapsed = time.monotonic() - start
+            memory = rss_mb(server.pid)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+
+    scans = sorted(stats.latencies.get('scan', ()))
+    completes = sorted(stats.latencies.get('complete', ()))
+    return {
+        'label': label,
+        'settings': settings,
+        'checkouts': stats.invoices['completed'] / elapsed,
+        'requests': sum(len(values) for values in stats.latencies.values()) / elapsed,
+        'scan_p50': percentile(scans, 50) * 1000,
+        'scan_p99': percentile(scans, 99) * 1000,
+        'complete_p99': percentile(completes, 99) * 1000,
+        'errors': sum(stats.errors.values()),
+        'memory': memory,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cores', type=int, default=4, help='Cores of the server the settings are for')
+    parser.add_argument('--terminals', type=int, default=24)
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per candidate')
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--think-ms', type=float, default=0, help='Mean pause between scans')
+    parser.add_argument('--p99-ms', type=float, default=250, help='Scan latency target')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    try:
+        import gevent  # noqa: F401
+        with_gevent = True
+    except ImportError:
+        with_gevent = False
+        print('gevent is not installed, skipping the green-thread candidate')
+
+    print(f'{args.terminals} terminals, {args.duration:.0f}s per candidate, sized for {args.cores} cores '
+          f'({os.cpu_count()} available)')
+    print(f'  {"candidate":16} {"checkouts/s":>11} {"req/s":>8} {"scan p50":>9} {"scan p99":>9} '
+          f'{"done p99":>9} {"errors":>7} {"RSS":>8}')
+    results = []
+    for label, settings in candidates(args.cores, with_gevent):
+        result = run_candidate(label, settings, args)
+        results.append(result)
+        print(f'  {label:16} {result["checkouts"]:11.1f} {result["requests"]:8.1f} {result["scan_p50"]:7.1f}ms '
+              f'{result["scan_p99"]:7.1f}ms {result["complete_p99"]:7.1f}ms {result["errors"]:7d} '
+              f'{result["memory"]:6.0f}MB')
+
+    eligible = [r for r in results if r['scan_p99'] <= args.p99_ms and not r['errors']] or results
+    best = max(eligible, key=lambda r: (r['checkouts'], -r['memory']))
+    print(f'\nRecommended for {args.cores} cores ({best["label"]}):')
+    for name, value in best['settings'].items():
+        print(f'  {name}={value}')
+
+
+if __name__ == '__main__':
+    main()
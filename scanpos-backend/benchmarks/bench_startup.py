@@ -0,0 +1,133 @@
+"""Measure backend cold start: imports, app creation, warmup and first request.
+
+Each sample runs in a fresh interpreter so nothing is cached in-process.
+The budget covers what this package adds on top of the framework floor
+(Flask, Flask-SQLAlchemy, Flask-JWT-Extended, Flask-CORS): importing
+scanpos_backend plus create_app. Exits with status 1 if the median exceeds
+it, so heavy imports creeping back into startup are caught.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--budget-ms 150]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CHILD = r'''
+import json, os, sys, time
+t = time.perf_counter()
+# Framework floor: what any Flask + SQLAlchemy app pays
+import flask, flask_sqlalchemy, flask_jwt_extended, flask_cors
+t0 = time.perf_counter()
+from scanpos_backend import create_app
+from scanpos_backend.config import Config
+t1 = time.perf_counter()
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.environ['BENCH_DB']
+    SQLALCHEMY_BINDS = {'archive': 'sqlite:///' + os.environ['BENCH_ARCHIVE_DB']}
+
+app = create_app(BenchConfig)
+t2 = time.perf_counter()
+
+timings = {'framework_import_ms': (t0 - t) * 1000, 'import_ms': (t1 - t0) * 1000,
+           'create_app_ms': (t2 - t1) * 1000}
+if os.environ['BENCH_WARMUP'] == '1':
+    from scanpos_backend.warmup import warmup, warm_worker
+    timings.update(warmup(app))
+    timings['worker_ms'] = warm_worker(app)
+t3 = time.perf_counter()
+
+from flask_jwt_extended import create_access_token
+with app.app_context():
+    token = create_access_token(identity='1')
+client = app.test_client()
+headers = {'Authorization': 'Bearer ' + token}
+t4 = time.perf_counter()
+client.get('/api/products/by-barcode/' + os.environ['BENCH_BARCODE'], headers=headers)
+t5 = time.perf_counter()
+client.get('/api/products/by-barcode/' + os.environ['BENCH_BARCODE'], headers=headers)
+t6 = time.perf_counter()
+timings.update({
+    'warmup_total_ms': (t3 - t2) * 1000,
+    'first_request_ms': (t5 - t4) * 1000,
+    'second_request_ms': (t6 - t5) * 1000,
+})
+print(json.dumps(timings))
+'''
+
+
+def seed(db_path, archive_path, products):
+    """Create a database with a realistic catalog"""
+    code = r'''
+import os, sys
+from scanpos_backend import create_app
+from scanpos_backend.config import Config
+from scanpos_backend.extensions import db
+from scanpos_backend.models import Product
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.environ['BENCH_DB']
+    SQLALCHEMY_BINDS = {'archive': 'sqlite:///' + os.environ['BENCH_ARCHIVE_DB']}
+
+app = create_app(BenchConfig)
+with app.app_context():
+    db.create_all()
+    db.session.add_all([
+        Product(name=f'Product {i}', barcode=str(890000000000 + i), price=10 + i % 500, stock_snapshot=100)
+        for i in range(int(os.environ['BENCH_PRODUCTS']))
+    ])
+    db.session.commit()
+'''
+    env = dict(os.environ, BENCH_DB=db_path, BENCH_ARCHIVE_DB=archive_path, BENCH_PRODUCTS=str(products))
+    subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, env=env, check=True)
+
+
+def sample(db_path, archive_path, warm, barcode):
+    env = dict(os.environ, BENCH_DB=db_path, BENCH_ARCHIVE_DB=archive_path,
+               BENCH_WARMUP='1' if warm else '0', BENCH_BARCODE=barcode)
+    env.pop('FLASK_RUN_FROM_CLI', None)
+    out = subprocess.run([sys.executable, '-c', CHILD], cwd=BACKEND_DIR, env=env,
+                         check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--budget-ms', type=float, default=150.0,
+                        help='Budget for importing scanpos_backend + create_app (median)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        archive_path = os.path.join(tmp, 'bench_archive.db')
+        seed(db_path, archive_path, args.products)
+        barcode = str(890000000000 + args.products // 2)
+
+        results = {}
+        for warm in (False, True):
+            runs = [sample(db_path, archive_path, warm, barcode) for _ in range(args.runs)]
+            results[warm] = {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+
+        print(f'Median of {args.runs} fresh interpreters, {args.products} products')
+        print(f'{"":24}{"no warmup":>12}{"warmup":>12}')
+        for key in results[True]:
+            cold = results[False].get(key)
+            cold = f'{cold:10.1f}ms' if cold is not None else f'{"-":>12}'
+            print(f'  {key:22}{cold}{results[True][key]:10.1f}ms')
+
+        startup = results[False]['import_ms'] + results[False]['create_app_ms']
+        status = 'OK' if startup <= args.budget_ms else 'OVER BUDGET'
+        print(f'scanpos_backend import + create_app: {startup:.1f}ms (budget {args.budget_ms:.0f}ms) {status}')
+        sys.exit(0 if startup <= args.budget_ms else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,399 @@
+"""Simulate N checkout terminals billing against one backend.
+
+Each terminal loops over the real billing flow: create a draft invoice,
+scan items by barcode with a skewed (Zipf) SKU mix, sometimes change a
+line quantity, then complete the invoice or abandon it. At the end the
+tool reports throughput, latency percentiles per step, errors by kind
+(lock timeouts, constraint conflicts, throttling), draft creates that
+failed and were retried after a backoff, and stock-consistency
+violations: products whose stock went negative (oversold) or differs from
+the opening stock minus what the completed invoices sold.
+
+Runs the app in-process (threads over a fresh SQLite database, admission
+control off) by default, or against a live server with --url; the given
+admin account is used to create the load-test products there, waiting out
+its rate limits.
+
+Usage:
+  python benchmarks/load_terminals.py [--terminals 8] [--duration 30]
+  python benchmarks/load_terminals.py --url http://127.0.0.1:5000 --email admin@scanpos.com --password ...
+"""
+import argparse
+import bisect
+import http.client
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+STEPS = ('create', 'scan', 'edit', 'complete', 'abandon')
+
+
+class HttpClient:
+    """Keep-alive JSON client for a live server, one per terminal"""
+
+    def __init__(self, url, timeout):
+        parts = urlsplit(url)
+        connection = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.conn = connection(parts.hostname, parts.port, timeout=timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.conn.request(method, path, payload, headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect on the next request
+            self.conn.close()
+            raise
+        try:
+            return response.status, json.loads(data) if data else {}
+        except ValueError:
+            return response.status, {'message': data[:200].decode(errors='replace')}
+
+
+class AppClient:
+    """Same interface over the Flask test client, for in-process runs"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_json(silent=True) or {}
+
+
+class Stats:
+    """Latencies and outcomes, merged across terminals"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)  # step -> seconds
+        self.errors = Counter()  # (step, kind) -> count
+        self.rejected = Counter()  # step -> expected 4xx (out of stock, ...)
+        self.sold = Counter()  # product id -> quantity on completed invoices
+        self.unknown = []  # invoice ids whose complete call had no clear outcome
+        self.invoices = Counter()  # 'completed' / 'abandoned' / 'failed'
+        self.create_failures = Counter()  # kind -> failed draft creates, each retried after a backoff
+        self.lock = threading.Lock()
+
+    def merge(self, other):
+        with self.lock:
+            for step, values in other.latencies.items():
+                self.latencies[step].extend(values)
+            self.errors.update(other.errors)
+            self.rejected.update(other.rejected)
+            self.sold.update(other.sold)
+            self.unknown.extend(other.unknown)
+            self.invoices.update(other.invoices)
+            self.create_failures.update(other.create_failures)
+
+
+def error_kind(status, body):
+    """Classify a failed response"""
+    message = str(body.get('message', '')).lower()
+    if status == 429:
+        return 'throttled'
+    if status == 503:
+        return 'shed'
+    if 'locked' in message or 'busy' in message or 'timeout' in message:
+        return 'lock_timeout'
+    if 'unique' in message or 'integrity' in message or 'duplicate' in message:
+        return 'conflict'
+    return f'http_{status}'
+
+
+class Terminal(threading.Thread):
+    """One till running the billing flow until the deadline"""
+
+    def __init__(self, number, client, token, products, cum_weights, args, deadline, stats):
+        super().__init__(name=f'terminal-{number}', daemon=True)
+        self.client = client
+        self.headers = {'Authorization': 'Bearer ' + token, 'X-Terminal-Id': f'load-{number}'}
+        self.products = products
+        self.cum_weights = cum_weights
+        self.args = args
+        self.deadline = deadline
+        self.stats = stats
+        self.local = Stats()
+        self.rng = random.Random(args.seed + number)
+
+    def call(self, step, method, path, body=None, headers=None):
+        """Run one request, recording latency and classifying the outcome.
+
+        Returns (status, body); status is None on a transport error.
+        """
+        start = time.perf_counter()
+        try:
+            status, data = self.client.request(method, path, body, dict(self.headers, **(headers or {})))
+        except (OSError, http.client.HTTPException) as e:
+            self.local.errors[(step, type(e).__name__)] += 1
+            return None, {}
+        self.local.latencies[step].append(time.perf_counter() - start)
+        if 400 <= status < 500 and status != 429:
+            self.local.rejected[step] += 1
+        elif status >= 429:
+            self.local.errors[(step, error_kind(status, data))] += 1
+        return status, data
+
+    def pick_product(self):
+        return self.products[bisect.bisect(self.cum_weights, self.rng.random() * self.cum_weights[-1])]
+
+    def think(self):
+        if self.args.think_ms:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.args.think_ms / 1000)
+
+    def back_off(self, failures):
+        """Wait before retrying a failed create: 50ms doubling up to 1s, with jitter"""
+        delay = min(1.0, 0.05 * 2 ** (failures - 1)) * self.rng.uniform(0.5, 1.5)
+        time.sleep(max(0.0, min(delay, self.deadline - time.monotonic())))
+
+    def run(self):
+        rng = self.rng
+        failures = 0  # consecutive failed creates
+        while time.monotonic() < self.deadline:
+            status, data = self.call('create', 'POST', '/api/invoices', {})
+            if status != 201:
+                # Not an invoice yet: count the attempt apart from failed sales
+                self.local.create_failures['transport' if status is None else error_kind(status, data)] += 1
+                failures += 1
+                self.back_off(failures)
+                continue
+            failures = 0
+            invoice_id = data['invoice']['id']
+
+            lines = {}  # item id -> product
+            for _ in range(rng.randint(1, self.args.max_items)):
+                product = self.pick_product()
+                quantity = 1 if rng.random() < 0.8 else rng.randint(2, 4)
+                status, data = self.call('scan', 'POST', f'/api/invoices/{invoice_id}/items',
+                                         {'barcode': product['barcode'], 'quantity': quantity})
+                if status in (200, 201):
+                    lines[data['item']['id']] = product
+                self.think()
+
+            if lines and rng.random() < self.args.edit_rate:
+                item_id = rng.choice(list(lines))
+                self.call('edit', 'PUT', f'/api/invoices/{invoice_id}/items/{item_id}',
+                          {'quantity': rng.randint(1, 3)})
+
+            if not lines or rng.random() < self.args.abandon_rate:
+                self.call('abandon', 'DELETE', f'/api/invoices/{invoice_id}')
+                self.local.invoices['abandoned'] += 1
+                continue
+
+            status, data = self.call('complete', 'POST', f'/api/invoices/{invoice_id}/complete', {},
+                                     headers={'Idempotency-Key': uuid.uuid4().hex})
+            if status == 200:
+                self.local.invoices['completed'] += 1
+                for item in data['invoice']['items']:
+                    self.local.sold[item['product_id']] += item['quantity']
+            elif status is None or status >= 500:
+                # The sale may or may not have been committed; checked at the end
+                self.local.unknown.append(invoice_id)
+            else:
+                self.local.invoices['failed'] += 1
+        self.stats.merge(self.local)
+
+
+def zipf_weights(n, skew):
+    """Cumulative weights so product i is picked with probability ~ 1 / (i + 1) ** skew"""
+    return list(itertools.accumulate(1 / (rank + 1) ** skew for rank in range(n)))
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+
+def login(client, email, password):
+    status, data = client.request('POST', '/api/auth/login', {'email': email, 'password': password})
+    if status != 200:
+        sys.exit(f'Login failed ({status}): {data.get("message")}')
+    return data['access_token']
+
+
+def patient_request(client, method, path, body=None, headers=None, attempts=30):
+    """Setup and check requests wait out the per-terminal rate limits instead of failing"""
+    for _ in range(attempts):
+        status, data = client.request(method, path, body, headers)
+        if status not in (429, 503):
+            break
+        time.sleep(1)
+    return status, data
+
+
+def create_products(client, token, count, stock):
+    """Create the load-test products through the API"""
+    run = uuid.uuid4().hex[:8]
+    headers = {'Authorization': 'Bearer ' + token}
+    products = []
+    for i in range(count):
+        status, data = patient_request(client, 'POST', '/api/products', {
+            'name': f'Load test {run} #{i}',
+            'barcode': f'LOAD-{run}-{i:05d}',
+            'price': round(10 + i % 90 + 0.5, 2),
+            'tax_percent': 5,
+            'stock_qty': stock,
+        }, headers)
+        if status != 201:
+            sys.exit(f'Could not create products ({status}): {data.get("message")}')
+        products.append({'id': data['product']['id'], 'barcode': data['product']['barcode']})
+    return products
+
+
+def check_stock(client, token, products, stock, stats):
+    """Compare each product's stock with the opening stock minus completed sales"""
+    headers = {'Authorization': 'Bearer ' + token}
+
+    # Settle invoices whose complete call failed ambiguously
+    for invoice_id in stats.unknown:
+        status, data = patient_request(client, 'GET', f'/api/invoices/{invoice_id}', headers=headers)
+        invoice = data.get('invoice', data)
+        if status == 200 and invoice.get('status') == 'completed':
+            stats.invoices['completed'] += 1
+            for item in invoice.get('items', []):
+                stats.sold[item['product_id']] += item['quantity']
+        else:
+            stats.invoices['failed'] += 1
+
+    oversold, mismatched = [], []
+    for product in products:
+        status, data = patient_request(client, 'GET', f'/api/products/{product["id"]}/stock', headers=headers)
+        if status != 200:
+            sys.exit(f'Could not read stock of {product["barcode"]} ({status}): {data.get("message")}')
+        actual = data['stock_qty']
+        expected = stock - stats.sold[product['id']]
+        if actual < 0:
+            oversold.append((product['barcode'], actual))
+        if actual != expected:
+            mismatched.append((product['barcode'], expected, actual))
+    return oversold, mismatched
+
+
+def in_process_app(tmp, terminals):
+    from scanpos_backend import create_app
+    from scanpos_backend.config import Config
+    from scanpos_backend.extensions import db
+    from scanpos_backend.models import User
+
+    class LoadConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp, 'load.db')
+        SQLALCHEMY_BINDS = {'archive': 'sqlite:///' + os.path.join(tmp, 'archive.db')}
+        SLOW_QUERY_LOG_ENABLED = False
+        # Terminals here scan back to back, far above the per-terminal rate
+        # limits; run against a live server to include admission control
+        ADMISSION_ENABLED = False
+        # One in-process worker runs every terminal's requests at once; its
+        # DB pool is sized for that (serving.pool_options)
+        SERVER_WORKER_CLASS = 'gthread'
+        SERVER_THREADS = terminals
+
+    app = create_app(LoadConfig)
+    with app.app_context():
+        db.create_all()
+        admin = User(name='Load test', email='load@scanpos.local', role='admin')
+        admin.set_password('load')
+        db.session.add(admin)
+        db.session.commit()
+    return app
+
+
+def report(args, stats, elapsed, oversold, mismatched):
+    completed = stats.invoices['completed']
+    requests = sum(len(values) for values in stats.latencies.values())
+    target = args.url or 'in-process app'
+    print(f'{args.terminals} terminals for {elapsed:.1f}s against {target}')
+    print(f'  invoices: {completed} completed, {stats.invoices["abandoned"]} abandoned, '
+          f'{stats.invoices["failed"]} failed')
+    if stats.create_failures:
+        kinds = ', '.join(f'{kind} {count}' for kind, count in stats.create_failures.most_common())
+        print(f'  draft creates failed and retried: {sum(stats.create_failures.values())} ({kinds})')
+    print(f'  throughput: {completed / elapsed:.1f} checkouts/s, {requests / elapsed:.1f} requests/s')
+    print(f'  {"step":10} {"count":>7} {"p50":>9} {"p95":>9} {"p99":>9} {"max":>9} {"rejected":>9}')
+    for step in STEPS:
+        values = sorted(stats.latencies.get(step, ()))
+        if not values:
+            continue
+        cells = ''.join(f'{percentile(values, p) * 1000:7.1f}ms' + ' ' for p in (50, 95, 99, 100))
+        print(f'  {step:10} {len(values):7d}  {cells}{stats.rejected[step]:8d}')
+
+    print('  errors:' if stats.errors else '  errors: none')
+    for (step, kind), count in sorted(stats.errors.items()):
+        print(f'    {step:10} {kind:16} {count}')
+    lock_timeouts = sum(count for (_, kind), count in stats.errors.items() if kind == 'lock_timeout')
+    print(f'  lock timeouts: {lock_timeouts}')
+
+    print(f'  stock violations: {len(oversold)} oversold, {len(mismatched)} mismatched')
+    for barcode, actual in oversold[:10]:
+        print(f'    oversold {barcode}: stock {actual}')
+    for barcode, expected, actual in mismatched[:10]:
+        print(f'    {barcode}: expected {expected}, found {actual}')
+    return 1 if oversold or mismatched else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Live server base URL; default runs the app in-process')
+    parser.add_argument('--email', default='load@scanpos.local', help='Admin login (live server)')
+    parser.add_argument('--password', default='load')
+    parser.add_argument('--terminals', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='Seconds')
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--stock', type=int, default=200, help='Opening stock of each product')
+    parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent of the SKU mix')
+    parser.add_argument('--max-items', type=int, default=8, help='Scans per invoice, 1..N')
+    parser.add_argument('--edit-rate', type=float, default=0.2, help='Share of invoices with a quantity edit')
+    parser.add_argument('--abandon-rate', type=float, default=0.1, help='Share of invoices abandoned')
+    parser.add_argument('--think-ms', type=float, default=0, help='Mean pause between scans')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout, live server')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.url:
+            make_client = lambda: HttpClient(args.url, args.timeout)  # noqa: E731
+        else:
+            app = in_process_app(tmp, args.terminals)
+            make_client = lambda: AppClient(app)  # noqa: E731
+
+        setup = make_client()
+        token = login(setup, args.email, args.password)
+        products = create_products(setup, token, args.products, args.stock)
+        # Hot SKUs are spread over the catalogue rather than the first rows
+        random.Random(args.seed).shuffle(products)
+        cum_weights = zipf_weights(len(products), args.skew)
+
+        stats = Stats()
+        deadline = time.monotonic() + args.duration
+        terminals = [
+            Terminal(i, make_client(), token, products, cum_weights, args, deadline, stats)
+            for i in range(args.terminals)
+        ]
+        start = time.monotonic()
+        for terminal in terminals:
+            terminal.start()
+        for terminal in terminals:
+            terminal.join()
+        elapsed = time.monotonic() - start
+
+        oversold, mismatched = check_stock(setup, token, products, args.stock, stats)
+        sys.exit(report(args, stats, elapsed, oversold, mismatched))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Gunicorn settings for production: `gunicorn -c gunicorn.conf.py`.
+
+Everything comes from the SERVER_* settings in scanpos_backend/config.py, so
+the worker model is picked per deploy with environment variables:
+
+    SERVER_WORKER_CLASS=sync     pre-fork, one request at a time per process
+    SERVER_WORKER_CLASS=gthread  pre-fork, SERVER_THREADS requests per process (default)
+    SERVER_WORKER_CLASS=gevent   green threads, needs `pip install gevent`
+
+The app is preloaded and warmed in the master (see wsgi.py) and shared
+copy-on-write; each worker opens its own DB pool after the fork. Send HUP
+for a graceful restart of the workers, USR2 to start a new master with new
+code next to the old one.
+"""
+import logging
+import os
+
+if os.environ.get('SERVER_WORKER_CLASS') == 'gevent':
+    # Patch before anything of the app is imported (importing the config
+    # loads the package), so its locks and sockets cooperate
+    from gevent import monkey
+    monkey.patch_all()
+
+from scanpos_backend.config import Config  # noqa: E402
+
+worker_class = Config.SERVER_WORKER_CLASS
+
+wsgi_app = 'wsgi:app'
+bind = Config.SERVER_BIND
+workers = Config.SERVER_WORKERS
+threads = Config.SERVER_THREADS if worker_class == 'gthread' else 1
+worker_connections = Config.SERVER_WORKER_CONNECTIONS
+# sync workers close every connection; keep-alive applies to gthread and gevent
+keepalive = Config.SERVER_KEEPALIVE_SECONDS
+timeout = Config.SERVER_TIMEOUT_SECONDS
+graceful_timeout = Config.SERVER_GRACEFUL_TIMEOUT_SECONDS
+max_requests = Config.SERVER_MAX_REQUESTS
+max_requests_jitter = Config.SERVER_MAX_REQUESTS_JITTER
+preload_app = True
+# Worker heartbeats go to a file; keep it off a slow or full disk
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+errorlog = '-'
+loglevel = os.environ.get('SERVER_LOG_LEVEL') or 'info'
+
+
+def when_ready(server):
+    from scanpos_backend.serving import admission_limits, pool_options, total_connections
+    config = {name: getattr(Config, name) for name in dir(Config) if name.isupper()}
+    log = logging.getLogger('gunicorn.error')
+    log.info(
+        'ScanPOS: %d %s workers, DB pool %s per worker, up to %d connections per database',
+        workers, worker_class, pool_options(config), total_connections(config)
+    )
+    if config['ADMISSION_ENABLED']:
+        max_inflight, checkout_reserve, class_limits = admission_limits(config)
+        log.info('ScanPOS: admission allows %d requests in flight per worker, %d reserved for checkout, class limits %s',
+                 max_inflight, checkout_reserve, class_limits)
+
+
+def post_fork(server, worker):
+    from scanpos_backend.warmup import warm_worker
+    from wsgi import app
+    warm_worker(app)
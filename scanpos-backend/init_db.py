@@ -13,6 +13,14 @@ with app.app_context():
     print("\nCreated tables:")
     print(f"  - users")
     print(f"  - products")
-    print(f"  - customers")
+    print(f"  - customers, customer_name_tokens")
     print(f"  - invoices")
     print(f"  - invoice_items")
+    print(f"  - low_stock_alerts")
+    print(f"  - stock_movements")
+    print(f"  - idempotency_keys")
+    print(f"  - jobs")
+    print(f"  - token_revocations")
+    print(f"  - cache_invalidations")
+    print(f"  - outbox_events")
+    print(f"  - archived_invoices, archived_invoice_items (archive database)")
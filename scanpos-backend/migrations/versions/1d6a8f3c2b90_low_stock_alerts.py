@@ -0,0 +1,48 @@
+"""per-product reorder levels and the low-stock alert set
+
+Revision ID: 1d6a8f3c2b90
+Revises:
+Create Date: 2026-10-19 10:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1d6a8f3c2b90'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # Databases created with db.create_all() already have the schema below;
+    # some also have an index on the raw stock column that nothing uses
+    if 'ix_products_active_stock' in {index['name'] for index in inspector.get_indexes('products')}:
+        op.drop_index('ix_products_active_stock', table_name='products')
+    if 'reorder_level' not in {column['name'] for column in inspector.get_columns('products')}:
+        # 10 was the hard-coded low-stock threshold before per-product levels
+        op.add_column('products', sa.Column('reorder_level', sa.Integer(), nullable=False, server_default='10'))
+    if inspector.has_table('low_stock_alerts'):
+        return
+
+    op.create_table(
+        'low_stock_alerts',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.PrimaryKeyConstraint('product_id')
+    )
+    op.execute("""
+        INSERT INTO low_stock_alerts (product_id, created_at)
+        SELECT id, CURRENT_TIMESTAMP FROM products
+        WHERE is_active = 1 AND stock_qty < reorder_level
+    """)
+
+
+def downgrade():
+    op.drop_table('low_stock_alerts')
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('reorder_level')
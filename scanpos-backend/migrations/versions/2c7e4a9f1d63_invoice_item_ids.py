@@ -0,0 +1,78 @@
+"""never reuse invoice line ids
+
+Revision ID: 2c7e4a9f1d63
+Revises: f4a2c9e6b871
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+from flask import current_app
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c7e4a9f1d63'
+down_revision = 'f4a2c9e6b871'
+branch_labels = None
+depends_on = None
+
+# Hot table -> the archive table that keeps its ids
+ARCHIVED = {'invoices': 'archived_invoices', 'invoice_items': 'archived_invoice_items'}
+
+
+def _autoincrement(table):
+    """Whether the table is already an AUTOINCREMENT table (created with db.create_all())"""
+    sql = op.get_bind().execute(sa.text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {'name': table}).scalar()
+    return 'AUTOINCREMENT' in (sql or '').upper()
+
+
+def _rebuild_items(autoincrement):
+    # SQLite can only add AUTOINCREMENT by recreating the table; the copy keeps
+    # the ids, and sqlite_sequence starts from the highest one
+    with op.batch_alter_table('invoice_items', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': autoincrement}):
+        pass
+
+
+def _skip_archived_ids():
+    """Start new ids above every id already in the archive.
+
+    Archiving can empty the hot tables, and invoice_items then handed out
+    archived ids again; sqlite_sequence only knows the hot rows.
+    """
+    engine = current_app.extensions['migrate'].db.engines.get('archive')
+    if engine is None or op.get_context().as_sql:
+        return
+    archived = {}
+    with engine.connect() as connection:
+        inspector = sa.inspect(connection)
+        for table, archive_table in ARCHIVED.items():
+            if inspector.has_table(archive_table):
+                archived[table] = connection.execute(sa.text(f'SELECT MAX(id) FROM {archive_table}')).scalar()
+
+    bind = op.get_bind()
+    for table, highest in archived.items():
+        if highest is None:
+            continue
+        current = bind.execute(sa.text(
+            'SELECT seq FROM sqlite_sequence WHERE name = :name'
+        ), {'name': table}).scalar()
+        if current is not None and current >= highest:
+            continue
+        bind.execute(sa.text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': table})
+        bind.execute(sa.text(
+            'INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)'
+        ), {'name': table, 'seq': highest})
+
+
+def upgrade():
+    if not _autoincrement('invoice_items'):
+        _rebuild_items(True)
+    _skip_archived_ids()
+
+
+def downgrade():
+    if _autoincrement('invoice_items'):
+        _rebuild_items(False)
@@ -0,0 +1,70 @@
+"""customer lookup indexes
+
+Revision ID: 3f6a9d2c8e47
+Revises: 7e3b5c0d9a21
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+import os
+import re
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6a9d2c8e47'
+down_revision = '7e3b5c0d9a21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('customers') as batch_op:
+        batch_op.add_column(sa.Column('phone_digits', sa.String(length=20), nullable=True))
+        batch_op.create_index('ix_customers_phone_digits', ['phone_digits'])
+    op.create_table(
+        'customer_name_tokens',
+        sa.Column('token', sa.String(length=50), nullable=False),
+        sa.Column('customer_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['customer_id'], ['customers.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('token', 'customer_id')
+    )
+    op.create_index('ix_customer_name_tokens_customer', 'customer_name_tokens', ['customer_id', 'token'])
+    op.create_index('ix_invoices_customer_id', 'invoices', ['customer_id'])
+
+    # Backfill the lookup columns of existing customers (same rules as
+    # scanpos_backend.customers, inlined so the revision stays fixed)
+    conn = op.get_bind()
+    customers = sa.table('customers', sa.column('id'), sa.column('name'), sa.column('phone'),
+                         sa.column('phone_digits'))
+    tokens = sa.table('customer_name_tokens', sa.column('token'), sa.column('customer_id'))
+    country_code = os.environ.get('PHONE_COUNTRY_CODE', '91')
+    phones, words = [], []
+    for row in conn.execute(sa.select(customers.c.id, customers.c.name, customers.c.phone)).fetchall():
+        phone = (row.phone or '').strip()
+        digits = re.sub(r'\D', '', phone)
+        if country_code and phone.startswith('+' + country_code):
+            digits = digits[len(country_code):]
+        elif country_code and phone.startswith('00' + country_code):
+            digits = digits[len(country_code) + 2:]
+        if digits:
+            phones.append({'customer_id': row.id, 'digits': digits})
+        words.extend({'token': word, 'customer_id': row.id}
+                     for word in {word[:50] for word in re.findall(r'\w+', (row.name or '').lower())})
+    if phones:
+        conn.execute(
+            customers.update().where(customers.c.id == sa.bindparam('customer_id')).values(
+                phone_digits=sa.bindparam('digits')),
+            phones
+        )
+    if words:
+        conn.execute(tokens.insert(), words)
+
+
+def downgrade():
+    op.drop_index('ix_invoices_customer_id', table_name='invoices')
+    op.drop_index('ix_customer_name_tokens_customer', table_name='customer_name_tokens')
+    op.drop_table('customer_name_tokens')
+    with op.batch_alter_table('customers') as batch_op:
+        batch_op.drop_index('ix_customers_phone_digits')
+        batch_op.drop_column('phone_digits')
@@ -0,0 +1,69 @@
+"""composite and covering indexes for listing, reports and item upsert
+
+Revision ID: 4b7e2d91c0a3
+Revises: 5e9c2a7f1b34
+Create Date: 2026-10-19 11:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7e2d91c0a3'
+down_revision = '5e9c2a7f1b34'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_invoices_status_created', 'invoices',
+     ['status', 'created_at', 'total_amount', 'total_tax', 'discount_amount'], False),
+    ('ix_invoices_created_at', 'invoices', ['created_at'], False),
+    ('uq_invoice_items_invoice_product', 'invoice_items', ['invoice_id', 'product_id'], True),
+    ('ix_invoice_items_invoice_cover', 'invoice_items',
+     ['invoice_id', 'product_id', 'quantity', 'line_total'], False),
+    ('ix_invoice_items_product_id', 'invoice_items', ['product_id'], False),
+]
+
+
+def _existing_indexes():
+    inspector = sa.inspect(op.get_bind())
+    return {
+        index['name']
+        for table in ('invoices', 'invoice_items')
+        for index in inspector.get_indexes(table)
+    }
+
+
+def upgrade():
+    # Older databases may hold the same product twice on one invoice: fold
+    # duplicates into the first line so the unique index can be built
+    op.execute("""
+        UPDATE invoice_items SET
+            quantity = (SELECT SUM(d.quantity) FROM invoice_items d
+                        WHERE d.invoice_id = invoice_items.invoice_id AND d.product_id = invoice_items.product_id),
+            line_subtotal = (SELECT SUM(d.line_subtotal) FROM invoice_items d
+                             WHERE d.invoice_id = invoice_items.invoice_id AND d.product_id = invoice_items.product_id),
+            line_tax = (SELECT SUM(d.line_tax) FROM invoice_items d
+                        WHERE d.invoice_id = invoice_items.invoice_id AND d.product_id = invoice_items.product_id),
+            line_total = (SELECT SUM(d.line_total) FROM invoice_items d
+                          WHERE d.invoice_id = invoice_items.invoice_id AND d.product_id = invoice_items.product_id)
+        WHERE id IN (SELECT MIN(id) FROM invoice_items GROUP BY invoice_id, product_id HAVING COUNT(*) > 1)
+    """)
+    op.execute("""
+        DELETE FROM invoice_items
+        WHERE id NOT IN (SELECT MIN(id) FROM invoice_items GROUP BY invoice_id, product_id)
+    """)
+
+    # Databases created with db.create_all() already have them
+    existing = _existing_indexes()
+    for name, table, columns, unique in INDEXES:
+        if name not in existing:
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    existing = _existing_indexes()
+    for name, table, columns, unique in reversed(INDEXES):
+        if name in existing:
+            op.drop_index(name, table_name=table)
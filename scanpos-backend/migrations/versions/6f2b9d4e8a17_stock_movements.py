@@ -0,0 +1,53 @@
+"""append-only stock movement ledger
+
+Revision ID: 6f2b9d4e8a17
+Revises: 1d6a8f3c2b90
+Create Date: 2026-10-19 10:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f2b9d4e8a17'
+down_revision = '1d6a8f3c2b90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # Databases created with db.create_all() already have them
+    if 'stock_watermark' not in {column['name'] for column in inspector.get_columns('products')}:
+        # Existing stock_qty values become the snapshot; with no ledger entries yet
+        # the watermark starts at 0
+        op.add_column('products', sa.Column('stock_watermark', sa.Integer(), nullable=False, server_default='0'))
+    if inspector.has_table('stock_movements'):
+        return
+
+    op.create_table(
+        'stock_movements',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('reason', sa.String(length=20), nullable=False),
+        sa.Column('invoice_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('note', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stock_movements_invoice_id', 'stock_movements', ['invoice_id'])
+    op.create_index('ix_stock_movements_product_id', 'stock_movements', ['product_id', 'id', 'quantity'])
+    op.create_index('ix_stock_movements_product_time', 'stock_movements', ['product_id', 'created_at', 'quantity'])
+
+
+def downgrade():
+    op.drop_index('ix_stock_movements_product_time', table_name='stock_movements')
+    op.drop_index('ix_stock_movements_product_id', table_name='stock_movements')
+    op.drop_index('ix_stock_movements_invoice_id', table_name='stock_movements')
+    op.drop_table('stock_movements')
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('stock_watermark')
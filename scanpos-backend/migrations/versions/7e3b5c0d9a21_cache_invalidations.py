@@ -0,0 +1,35 @@
+"""cache invalidation bus
+
+Revision ID: 7e3b5c0d9a21
+Revises: d2a87b3f5e14
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e3b5c0d9a21'
+down_revision = 'd2a87b3f5e14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'cache_invalidations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('topic', sa.String(length=50), nullable=False),
+        sa.Column('key', sa.String(length=100), nullable=True),
+        sa.Column('origin', sa.String(length=100), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sqlite_autoincrement=True
+    )
+    op.create_index('ix_cache_invalidations_created_at', 'cache_invalidations', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_cache_invalidations_created_at', table_name='cache_invalidations')
+    op.drop_table('cache_invalidations')
@@ -0,0 +1,94 @@
+"""never reuse invoice ids; archive database tables
+
+Revision ID: 8a4c1e7b3d52
+Revises: 6f2b9d4e8a17
+Create Date: 2026-10-19 10:55:00.000000
+
+"""
+from alembic import op
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from flask import current_app
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4c1e7b3d52'
+down_revision = '6f2b9d4e8a17'
+branch_labels = None
+depends_on = None
+
+
+def _autoincrement():
+    """Whether invoices is already an AUTOINCREMENT table (created with db.create_all())"""
+    sql = op.get_bind().execute(sa.text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'invoices'"
+    )).scalar()
+    return 'AUTOINCREMENT' in (sql or '').upper()
+
+
+def _rebuild_invoices(autoincrement):
+    # SQLite can only add AUTOINCREMENT by recreating the table; the copy keeps
+    # the ids, and sqlite_sequence starts from the highest one
+    with op.batch_alter_table('invoices', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': autoincrement}):
+        pass
+
+
+def _create_archive_tables(ops):
+    ops.create_table(
+        'archived_invoices',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('invoice_number', sa.String(length=50), nullable=False),
+        sa.Column('customer_id', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('subtotal_amount', sa.Float(), nullable=True),
+        sa.Column('total_tax', sa.Float(), nullable=True),
+        sa.Column('discount_amount', sa.Float(), nullable=True),
+        sa.Column('total_amount', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('archive_month', sa.Integer(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    ops.create_index('ix_archived_invoices_invoice_number', 'archived_invoices', ['invoice_number'], unique=True)
+    ops.create_index('ix_archived_invoices_archive_month', 'archived_invoices', ['archive_month'])
+    ops.create_index('ix_archived_invoices_status_created', 'archived_invoices', ['status', 'created_at'])
+    ops.create_table(
+        'archived_invoice_items',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('invoice_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('product_name', sa.String(length=200), nullable=True),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('unit_price', sa.Float(), nullable=False),
+        sa.Column('tax_percent', sa.Float(), nullable=True),
+        sa.Column('line_subtotal', sa.Float(), nullable=True),
+        sa.Column('line_tax', sa.Float(), nullable=True),
+        sa.Column('line_total', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['invoice_id'], ['archived_invoices.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    ops.create_index('ix_archived_invoice_items_invoice_id', 'archived_invoice_items', ['invoice_id'])
+    ops.create_index('ix_archived_invoice_items_product_id', 'archived_invoice_items', ['product_id'])
+
+
+def upgrade():
+    if not _autoincrement():
+        _rebuild_invoices(True)
+
+    # The archive database has no alembic history of its own; create its
+    # tables here unless db.create_all() already did
+    engine = current_app.extensions['migrate'].db.engines.get('archive')
+    if engine is None or op.get_context().as_sql:
+        return
+    with engine.begin() as connection:
+        if not sa.inspect(connection).has_table('archived_invoices'):
+            _create_archive_tables(Operations(MigrationContext.configure(connection)))
+
+
+def downgrade():
+    # Archived invoices are left in the archive database
+    if _autoincrement():
+        _rebuild_invoices(False)
@@ -0,0 +1,50 @@
+"""background jobs table
+
+Revision ID: 9c1f4e6a2b58
+Revises: 4b7e2d91c0a3
+Create Date: 2026-10-19 12:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c1f4e6a2b58'
+down_revision = '4b7e2d91c0a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('params', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('priority', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('worker', sa.String(length=100), nullable=True),
+        sa.Column('result_file', sa.String(length=255), nullable=True),
+        sa.Column('result_type', sa.String(length=100), nullable=True),
+        sa.Column('summary', sa.Text(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_jobs_status_priority', 'jobs', ['status', 'priority', 'id'])
+    op.create_index('ix_jobs_kind_created', 'jobs', ['kind', 'created_at'])
+    op.create_index('ix_jobs_user_id', 'jobs', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_jobs_user_id', table_name='jobs')
+    op.drop_index('ix_jobs_kind_created', table_name='jobs')
+    op.drop_index('ix_jobs_status_priority', table_name='jobs')
+    op.drop_table('jobs')
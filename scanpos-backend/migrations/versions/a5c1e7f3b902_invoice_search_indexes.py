@@ -0,0 +1,44 @@
+"""invoice search indexes
+
+Revision ID: a5c1e7f3b902
+Revises: 3f6a9d2c8e47
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5c1e7f3b902'
+down_revision = '3f6a9d2c8e47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('invoices') as batch_op:
+        batch_op.add_column(sa.Column('number_reversed', sa.String(length=50), nullable=True))
+    # SQLite has no reverse(), so the backfill is computed here
+    conn = op.get_bind()
+    invoices = sa.table('invoices', sa.column('id'), sa.column('invoice_number'), sa.column('number_reversed'))
+    rows = conn.execute(sa.select(invoices.c.id, invoices.c.invoice_number)).fetchall()
+    if rows:
+        conn.execute(
+            invoices.update().where(invoices.c.id == sa.bindparam('invoice_id')).values(
+                number_reversed=sa.bindparam('reversed')),
+            [{'invoice_id': row.id, 'reversed': row.invoice_number[::-1]} for row in rows]
+        )
+    op.create_index('ix_invoices_number_reversed', 'invoices', ['number_reversed'])
+    op.drop_index('ix_invoices_customer_id', table_name='invoices')
+    op.create_index('ix_invoices_customer_created', 'invoices', ['customer_id', 'created_at'])
+    op.create_index('ix_invoices_total_created', 'invoices', ['total_amount', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_invoices_total_created', table_name='invoices')
+    op.drop_index('ix_invoices_customer_created', table_name='invoices')
+    op.create_index('ix_invoices_customer_id', 'invoices', ['customer_id'])
+    op.drop_index('ix_invoices_number_reversed', table_name='invoices')
+    with op.batch_alter_table('invoices') as batch_op:
+        batch_op.drop_column('number_reversed')
@@ -0,0 +1,28 @@
+"""invoice client_id for offline sales upload
+
+Revision ID: b3e8f5a1c729
+Revises: e6b9a3d7f140
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8f5a1c729'
+down_revision = 'e6b9a3d7f140'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('invoices', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.add_column(sa.Column('client_id', sa.String(length=64), nullable=True))
+    op.create_index('ix_invoices_client_id', 'invoices', ['client_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_invoices_client_id', table_name='invoices')
+    with op.batch_alter_table('invoices', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.drop_column('client_id')
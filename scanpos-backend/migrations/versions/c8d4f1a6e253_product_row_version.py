@@ -0,0 +1,30 @@
+"""product catalog row_version
+
+Revision ID: c8d4f1a6e253
+Revises: a5c1e7f3b902
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8d4f1a6e253'
+down_revision = 'a5c1e7f3b902'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.add_column(sa.Column('row_version', sa.Integer(), nullable=True))
+    # Existing products start at their id, which is unique and increasing
+    op.execute('UPDATE products SET row_version = id')
+    op.create_index('ix_products_row_version', 'products', ['row_version'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_products_row_version', table_name='products')
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('row_version')
@@ -0,0 +1,37 @@
+"""token revocation denylist
+
+Revision ID: d2a87b3f5e14
+Revises: 9c1f4e6a2b58
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a87b3f5e14'
+down_revision = '9c1f4e6a2b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'token_revocations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('jti', sa.String(length=64), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('issued_until', sa.Integer(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('jti'),
+        sqlite_autoincrement=True
+    )
+    op.create_index('ix_token_revocations_expires_at', 'token_revocations', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_token_revocations_expires_at', table_name='token_revocations')
+    op.drop_table('token_revocations')
@@ -0,0 +1,124 @@
+"""store money as integer minor units
+
+Revision ID: e6b9a3d7f140
+Revises: c8d4f1a6e253
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from flask import current_app
+import sqlalchemy as sa
+from scanpos_backend.money import to_minor
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b9a3d7f140'
+down_revision = 'c8d4f1a6e253'
+branch_labels = None
+depends_on = None
+
+MONEY_COLUMNS = {
+    'products': ['price'],
+    'invoices': ['subtotal_amount', 'total_tax', 'discount_amount', 'total_amount'],
+    'invoice_items': ['unit_price', 'line_subtotal', 'line_tax', 'line_total'],
+}
+# The archive database is created with create_all() and has no alembic
+# history of its own, so its tables are converted here too
+ARCHIVE_MONEY_COLUMNS = {
+    'archived_invoices': ['subtotal_amount', 'total_tax', 'discount_amount', 'total_amount'],
+    'archived_invoice_items': ['unit_price', 'line_subtotal', 'line_tax', 'line_total'],
+}
+NOT_NULL = {'price', 'unit_price'}
+# Line table -> invoice table whose totals are sums of its lines
+LINE_TABLES = {'invoice_items': 'invoices', 'archived_invoice_items': 'archived_invoices'}
+# Batch mode recreates the table on SQLite; keep AUTOINCREMENT on invoices
+TABLE_KWARGS = {'invoices': {'sqlite_autoincrement': True}}
+
+
+def _alter(ops, table, columns, type_, existing_type):
+    with ops.batch_alter_table(table, table_kwargs=TABLE_KWARGS.get(table, {})) as batch_op:
+        for column in columns:
+            batch_op.alter_column(column, type_=type_, existing_type=existing_type,
+                                  existing_nullable=column not in NOT_NULL)
+
+
+def _update(bind, table, columns, rows):
+    if rows:
+        bind.execute(sa.text('UPDATE {} SET {} WHERE id = :id'.format(table, ', '.join(
+            f'{column} = :{column}' for column in columns
+        ))), rows)
+
+
+def _round_half_up(bind, table, columns):
+    """Convert every amount with to_minor(), the rounding Money applies"""
+    result = bind.execute(sa.text('SELECT id, {} FROM {}'.format(', '.join(columns), table)))
+    _update(bind, table, columns, [
+        dict(id=row.id, **{column: to_minor(row._mapping[column]) for column in columns})
+        for row in result
+    ])
+
+
+def _exact_totals(bind, invoices, items):
+    """Make each line total subtotal + tax, and each invoice the sum of its lines.
+
+    Rounding every stored amount on its own can leave a total a paisa off
+    the sum of its parts; recomputing them in integers makes the sums exact.
+    """
+    lines = []
+    sums = {}
+    for row in bind.execute(sa.text(f'SELECT id, invoice_id, line_subtotal, line_tax FROM {items}')):
+        subtotal, tax = int(row.line_subtotal or 0), int(row.line_tax or 0)
+        lines.append({'id': row.id, 'line_total': subtotal + tax})
+        invoice_subtotal, invoice_tax = sums.get(row.invoice_id, (0, 0))
+        sums[row.invoice_id] = (invoice_subtotal + subtotal, invoice_tax + tax)
+    _update(bind, items, ['line_total'], lines)
+
+    totals = []
+    for row in bind.execute(sa.text(f'SELECT id, discount_amount FROM {invoices}')):
+        if row.id not in sums:
+            continue
+        subtotal, tax = sums[row.id]
+        totals.append({'id': row.id, 'subtotal_amount': subtotal, 'total_tax': tax,
+                       'total_amount': subtotal + tax - int(row.discount_amount or 0)})
+    _update(bind, invoices, ['subtotal_amount', 'total_tax', 'total_amount'], totals)
+
+
+def _to_minor(ops, tables):
+    bind = ops.get_bind()
+    for table, columns in tables.items():
+        _round_half_up(bind, table, columns)
+    for items, invoices in LINE_TABLES.items():
+        if items in tables:
+            _exact_totals(bind, invoices, items)
+    for table, columns in tables.items():
+        _alter(ops, table, columns, sa.BigInteger(), sa.Float())
+
+
+def _to_major(ops, tables):
+    for table, columns in tables.items():
+        _alter(ops, table, columns, sa.Float(), sa.BigInteger())
+        ops.execute('UPDATE {} SET {}'.format(table, ', '.join(
+            f'{column} = {column} / 100.0' for column in columns
+        )))
+
+
+def _archive(convert):
+    engine = current_app.extensions['migrate'].db.engines.get('archive')
+    if engine is None or op.get_context().as_sql:
+        return
+    with engine.begin() as connection:
+        if not sa.inspect(connection).has_table('archived_invoices'):
+            return
+        convert(Operations(MigrationContext.configure(connection)), ARCHIVE_MONEY_COLUMNS)
+
+
+def upgrade():
+    _to_minor(op, MONEY_COLUMNS)
+    _archive(_to_minor)
+
+
+def downgrade():
+    _archive(_to_major)
+    _to_major(op, MONEY_COLUMNS)
@@ -0,0 +1,38 @@
+"""transactional outbox for the change feed
+
+Revision ID: f4a2c9e6b871
+Revises: b3e8f5a1c729
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a2c9e6b871'
+down_revision = 'b3e8f5a1c729'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'outbox_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('event_type', sa.String(length=50), nullable=False),
+        sa.Column('entity', sa.String(length=20), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sqlite_autoincrement=True
+    )
+    op.create_index('ix_outbox_events_created_at', 'outbox_events', ['created_at'])
+    op.create_index('ix_outbox_events_entity', 'outbox_events', ['entity', 'entity_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_outbox_events_entity', table_name='outbox_events')
+    op.drop_index('ix_outbox_events_created_at', table_name='outbox_events')
+    op.drop_table('outbox_events')
@@ -1,6 +1,9 @@
 from scanpos_backend import create_app
+from scanpos_backend.warmup import warmup, warm_worker
 
 app = create_app()
 
 if __name__ == '__main__':
+    warmup(app, freeze=False)
+    warm_worker(app)
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -1,5 +1,6 @@
+import os
 from flask import Flask
-from .extensions import db, migrate, jwt, cors
+from .extensions import db, jwt, cors, get_migrate
 from .config import Config
 
 
@@ -8,22 +9,57 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # One connection per request the worker model allows in flight
+    from .serving import init_pool_sizing
+    init_pool_sizing(app)
+    
     # Initialize extensions
     db.init_app(app)
-    migrate.init_app(app, db)
+    # Migrations are only needed by the `flask db` commands
+    if app.config['LOAD_MIGRATIONS'] or os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        get_migrate().init_app(app, db)
     jwt.init_app(app)
     cors.init_app(app)
     
     # Import models to register them with SQLAlchemy
     from . import models
     
+    # Reject revoked JWTs without a DB round trip per request
+    from .revocation import init_revocation
+    init_revocation(app)
+    
+    # Keep in-process caches consistent across workers
+    from .invalidation import init_invalidation
+    init_invalidation(app)
+    
+    # Time every statement and keep the slow ones
+    from .querylog import init_query_log
+    init_query_log(app)
+    
     # Register blueprints
-    from .routes import health_bp, auth_bp, products_bp, invoices_bp, reports_bp, users_bp
+    from .routes import (health_bp, auth_bp, products_bp, invoices_bp, reports_bp, users_bp, admin_bp, jobs_bp,
+                         customers_bp, events_bp)
     app.register_blueprint(health_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(products_bp)
     app.register_blueprint(invoices_bp)
     app.register_blueprint(reports_bp)
     app.register_blueprint(users_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(customers_bp)
+    app.register_blueprint(events_bp)
+    
+    # Per-terminal rate limits and load shedding
+    from .admission import init_admission
+    init_admission(app)
+    
+    # Compress responses for clients that accept it
+    from .compression import init_compression
+    init_compression(app)
+    
+    # Register CLI maintenance commands
+    from .commands import register_commands
+    register_commands(app)
     
     return app
@@ -0,0 +1,230 @@
+"""Per-terminal rate limiting and load shedding.
+
+Every request is put in a route class (checkout, scan, reports, admin,
+long_poll, general). Two checks run before the view:
+
+* token buckets per route class limit how fast one client can hit a class
+  of endpoints (429 + Retry-After when empty). The client is the JWT user
+  (else the address); X-Terminal-Id splits a user into per-terminal
+  buckets, and a per-user bucket caps the user's terminals together, so a
+  made-up terminal id buys no extra requests;
+* an in-flight limit per worker sheds load early (503 + Retry-After) once the
+  worker is saturated. A share of the slots is reserved for checkout, and
+  per-class caps stop e.g. a reports refresh storm from taking every slot.
+
+State is per worker process; limits are therefore per worker, and the
+in-flight limits are capped to what the worker model runs at once (see
+serving.admission_limits()).
+"""
+import math
+import threading
+import time
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+CHECKOUT = 'checkout'
+SCAN = 'scan'
+REPORTS = 'reports'
+ADMIN = 'admin'
+LONG_POLL = 'long_poll'  # held open until something happens; capped apart from reports
+GENERAL = 'general'
+
+# Endpoints that are not classified by blueprint
+ENDPOINT_CLASSES = {
+    'invoices.create_invoice': CHECKOUT,
+    'invoices.complete_invoice': CHECKOUT,
+    'invoices.get_invoice_receipt': CHECKOUT,
+    'invoices.add_invoice_item': SCAN,
+    'invoices.update_invoice_item': SCAN,
+    'invoices.delete_invoice_item': SCAN,
+    'products.get_product_by_barcode': SCAN,
+    'invoices.set_invoice_customer': SCAN,
+    'customers.search_customers': SCAN,
+    'customers.get_recent_customers': SCAN,
+    # ?wait= holds the request up to JOB_MAX_WAIT_SECONDS
+    'jobs.get_job': LONG_POLL,
+}
+BLUEPRINT_CLASSES = {
+    'reports': REPORTS,
+    'users': ADMIN,
+    'admin': ADMIN,
+    # Report and export jobs: submitting, listing and downloading results
+    'jobs': REPORTS,
+    # Feed consumers wait up to OUTBOX_MAX_WAIT_SECONDS for news
+    'events': LONG_POLL,
+}
+EXEMPT_ENDPOINTS = {'health.health_check', 'static'}
+
+
+def classify(endpoint):
+    """Get the route class for a Flask endpoint name"""
+    if endpoint in ENDPOINT_CLASSES:
+        return ENDPOINT_CLASSES[endpoint]
+    return BLUEPRINT_CLASSES.get(endpoint.split('.', 1)[0], GENERAL)
+
+
+class TokenBucket:
+    """Classic token bucket; not thread-safe on its own"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now):
+        """Take a token; returns 0 on success or seconds until one is available"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Process-wide admission state"""
+
+    def __init__(self, rate_limits, max_inflight, checkout_reserve, class_limits,
+                 terminals_per_user=4, max_buckets=10000):
+        self.rate_limits = rate_limits
+        self.terminals_per_user = terminals_per_user
+        self.max_inflight = max_inflight
+        self.checkout_reserve = checkout_reserve
+        self.class_limits = class_limits
+        self.max_buckets = max_buckets
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._inflight = 0
+        self._inflight_by_class = {}
+        self._counters = {}
+
+    def _count(self, route_class, outcome):
+        counters = self._counters.setdefault(route_class, {'admitted': 0, 'rate_limited': 0, 'shed': 0})
+        counters[outcome] += 1
+
+    def _bucket(self, key, rate, capacity, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_buckets:
+                self._prune(now)
+            bucket = self._buckets[key] = TokenBucket(rate, capacity, now)
+        return bucket
+
+    def admit(self, client, route_class, terminal=''):
+        """Returns (status, retry_after): status is None when admitted, else 429 or 503"""
+        now = time.monotonic()
+        with self._lock:
+            limit = self.rate_limits.get(route_class)
+            if limit:
+                rate, burst = limit
+                # The user's bucket first, so a stream of new terminal ids
+                # stops creating buckets once the user is over its limit
+                shared = self.terminals_per_user
+                per_user = self._bucket((client, route_class), rate * shared, burst * shared, now)
+                wait = per_user.take(now)
+                if not wait:
+                    wait = self._bucket((client, terminal, route_class), rate, burst, now).take(now)
+                    if wait:
+                        # Not admitted; give the user its token back
+                        per_user.tokens += 1
+                if wait:
+                    self._count(route_class, 'rate_limited')
+                    return 429, wait
+
+            # Non-checkout requests may not use the reserved slots
+            capacity = self.max_inflight if route_class == CHECKOUT else self.max_inflight - self.checkout_reserve
+            class_limit = self.class_limits.get(route_class)
+            class_inflight = self._inflight_by_class.get(route_class, 0)
+            if self._inflight >= capacity or (class_limit is not None and class_inflight >= class_limit):
+                self._count(route_class, 'shed')
+                return 503, 1
+
+            self._inflight += 1
+            self._inflight_by_class[route_class] = class_inflight + 1
+            self._count(route_class, 'admitted')
+            return None, 0
+
+    def release(self, route_class):
+        with self._lock:
+            self._inflight -= 1
+            self._inflight_by_class[route_class] -= 1
+
+    def _prune(self, now):
+        """Drop buckets that have refilled completely (idle clients)"""
+        for key, bucket in list(self._buckets.items()):
+            if bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.capacity:
+                del self._buckets[key]
+
+    def stats(self):
+        """Snapshot of the live counters"""
+        with self._lock:
+            return {
+                'inflight': self._inflight,
+                'max_inflight': self.max_inflight,
+                'checkout_reserve': self.checkout_reserve,
+                'inflight_by_class': dict(self._inflight_by_class),
+                'counters': {k: dict(v) for k, v in self._counters.items()},
+                'tracked_clients': len(self._buckets),
+                'rate_limits': {k: {'rate': v[0], 'burst': v[1]} for k, v in self.rate_limits.items() if v},
+                'class_limits': dict(self.class_limits),
+            }
+
+
+def _client_key():
+    """Identify the caller: JWT user, else address. Never the client-supplied terminal id."""
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        identity = None
+    if identity:
+        return 'user:' + str(identity)
+    return 'addr:' + (request.remote_addr or '')
+
+
+def init_admission(app):
+    """Install the admission hooks on the app"""
+    if not app.config['ADMISSION_ENABLED']:
+        return
+
+    from .serving import admission_limits
+    max_inflight, checkout_reserve, class_limits = admission_limits(app.config)
+    controller = AdmissionController(
+        rate_limits=app.config['ADMISSION_RATE_LIMITS'],
+        terminals_per_user=app.config['ADMISSION_TERMINALS_PER_USER'],
+        max_inflight=max_inflight,
+        checkout_reserve=checkout_reserve,
+        class_limits=class_limits,
+    )
+    app.extensions['admission'] = controller
+
+    @app.before_request
+    def admit_request():
+        if request.method == 'OPTIONS' or request.endpoint is None or request.endpoint in EXEMPT_ENDPOINTS:
+            return None
+        route_class = classify(request.endpoint)
+        terminal = request.headers.get('X-Terminal-Id', '')[:64]
+        status, retry_after = controller.admit(_client_key(), route_class, terminal)
+        if status is None:
+            g.admission_class = route_class
+            return None
+        message = 'Too many requests' if status == 429 else 'Server busy, please retry'
+        response = jsonify({'message': message})
+        response.status_code = status
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    @app.teardown_request
+    def release_request(exc):
+        route_class = g.pop('admission_class', None)
+        if route_class is not None:
+            controller.release(route_class)
+
+
+def get_admission_stats():
+    """Live counters for the current app, or None if admission control is off"""
+    controller = current_app.extensions.get('admission')
+    return controller.stats() if controller else None
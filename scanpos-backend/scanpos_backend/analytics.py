@@ -0,0 +1,302 @@
+"""Columnar analytics snapshot for sales reports.
+
+Completed invoices and their line items are exported into NumPy arrays
+stored as `.npy` files and opened memory-mapped, so report queries are
+vectorized scans that never touch the transactional database. The export
+is incremental: each refresh only reads invoices created after the last
+exported id, drafts that were still open at the previous refresh, and
+invoices deleted since then (found through their 'return' ledger entries).
+Amounts are kept as int64 minor units, like the database columns.
+
+Each refresh writes a new generation directory and then swaps the `CURRENT`
+pointer file to it, so readers always open a complete snapshot.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+from sqlalchemy import or_
+from .extensions import db
+from .money import from_minor, minor_units
+from .models import (Invoice, InvoiceItem, Product, StockMovement,
+                     ArchivedInvoice, ArchivedInvoiceItem)
+
+# Status codes stored in the status columns
+VOID = 0
+COMPLETED = 1
+
+# Bumped when the column layout changes; older snapshots are rebuilt
+FORMAT = 2
+
+# File naming the generation directory readers open
+POINTER = 'CURRENT'
+GENERATION_PREFIX = 'gen-'
+
+INVOICE_COLUMNS = {
+    'inv_id': np.int64,
+    'inv_ts': np.int64,  # created_at, seconds since epoch (UTC)
+    'inv_total': np.int64,  # minor units
+    'inv_tax': np.int64,
+    'inv_discount': np.int64,
+    'inv_status': np.int8,
+}
+ITEM_COLUMNS = {
+    'item_invoice': np.int64,
+    'item_ts': np.int64,  # invoice created_at, denormalized for filtering
+    'item_product': np.int64,
+    'item_qty': np.int64,
+    'item_revenue': np.int64,  # line_total, minor units
+    'item_status': np.int8,
+}
+
+_EPOCH = datetime(1970, 1, 1)
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def to_timestamp(dt):
+    """Convert a naive-UTC or aware datetime to epoch seconds"""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return int((dt - _EPOCH).total_seconds())
+
+
+class ColumnarStore:
+    """Memory-mapped columnar snapshot of completed sales"""
+
+    def __init__(self, path):
+        self.path = path
+        self._columns = {}
+        self._meta = None
+        self._products = {}
+        self._generation = None
+
+    # -- files -------------------------------------------------------------
+
+    def _current(self):
+        """Name of the generation directory the pointer names, or None"""
+        try:
+            with open(os.path.join(self.path, POINTER)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def load(self):
+        """(Re)open the arrays if another process refreshed the snapshot"""
+        generation = self._current()
+        if generation is None:
+            self._meta, self._columns, self._products = None, {}, {}
+        elif generation != self._generation:
+            directory = os.path.join(self.path, generation)
+            with open(os.path.join(directory, 'meta.json')) as f:
+                self._meta = json.load(f)
+            with open(os.path.join(directory, 'products.json')) as f:
+                self._products = {int(k): v for k, v in json.load(f).items()}
+            self._columns = {
+                name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+                for name in list(INVOICE_COLUMNS) + list(ITEM_COLUMNS)
+            }
+        self._generation = generation
+        return self
+
+    @property
+    def ready(self):
+        return self._meta is not None and self._meta.get('format') == FORMAT
+
+    @property
+    def age_seconds(self):
+        """Seconds since the last refresh"""
+        if not self.ready:
+            return None
+        return (datetime.utcnow() - datetime.fromisoformat(self._meta['refreshed_at'])).total_seconds()
+
+    def _write(self, columns, meta, products):
+        # Write the whole snapshot into a new generation directory, then
+        # replace the pointer in one rename: a reader maps every array from
+        # the generation the pointer named when it opened them
+        generation = f'{GENERATION_PREFIX}{time.time_ns():020d}'
+        directory = os.path.join(self.path, generation)
+        os.makedirs(directory)
+        for name, values in columns.items():
+            np.save(os.path.join(directory, f'{name}.npy'), values)
+        for name, payload in (('products.json', products), ('meta.json', meta)):
+            with open(os.path.join(directory, name), 'w') as f:
+                json.dump(payload, f)
+        tmp = os.path.join(self.path, f'{POINTER}.{generation}.tmp')
+        with open(tmp, 'w') as f:
+            f.write(generation)
+        os.replace(tmp, os.path.join(self.path, POINTER))
+
+        # Keep the generation this refresh started from for readers that
+        # have just read the old pointer; anything older is unused
+        if self._generation:
+            for name in os.listdir(self.path):
+                if name.startswith(GENERATION_PREFIX) and name < self._generation:
+                    shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    # -- export ------------------------------------------------------------
+
+    def refresh(self, full=False):
+        """Export new completed sales from the database. Returns rows added."""
+        self.load()
+        if full or not self.ready:
+            meta = {'format': FORMAT, 'last_invoice_id': 0, 'last_movement_id': 0, 'open_drafts': []}
+            columns = {name: np.empty(0, dtype) for name, dtype in {**INVOICE_COLUMNS, **ITEM_COLUMNS}.items()}
+        else:
+            meta = dict(self._meta)
+            # Copy out of the read-only memory maps
+            columns = {name: np.array(values) for name, values in self._columns.items()}
+
+        last_id = meta['last_invoice_id']
+        high = max(
+            db.session.query(db.func.max(Invoice.id)).scalar() or 0,
+            db.session.query(db.func.max(ArchivedInvoice.id)).scalar() or 0,
+            last_id
+        )
+        movement_high = db.session.query(db.func.max(StockMovement.id)).scalar() or 0
+
+        # Read open drafts before completed invoices: a draft completed in
+        # between is exported now and dropped from the list below
+        drafts = {
+            row.id for row in db.session.query(Invoice.id).filter(
+                Invoice.status == 'draft', Invoice.id <= high
+            )
+        }
+
+        # Invoices created since the last export, plus drafts that were still open then
+        new_invoices, new_items = [], []
+        for model, item_model in ((Invoice, InvoiceItem), (ArchivedInvoice, ArchivedInvoiceItem)):
+            scope = (model.id > last_id) & (model.id <= high)
+            if meta['open_drafts']:
+                scope = or_(scope, model.id.in_(meta['open_drafts']))
+            rows = db.session.query(
+                model.id, model.created_at, minor_units(model.total_amount).label('total_amount'),
+                minor_units(model.total_tax).label('total_tax'),
+                minor_units(model.discount_amount).label('discount_amount')
+            ).filter(model.status == 'completed', scope).all()
+            if not rows:
+                continue
+            new_invoices.extend(rows)
+            created = {row.id: row.created_at for row in rows}
+            items = db.session.query(
+                item_model.invoice_id, item_model.product_id, item_model.quantity,
+                minor_units(item_model.line_total).label('line_total')
+            ).filter(item_model.invoice_id.in_(list(created)))
+            new_items.extend((row, created[row.invoice_id]) for row in items)
+
+        meta['open_drafts'] = sorted(drafts - {row.id for row in new_invoices})
+        meta['last_invoice_id'] = high
+
+        if new_invoices:
+            appended = {
+                'inv_id': [row.id for row in new_invoices],
+                'inv_ts': [to_timestamp(row.created_at) for row in new_invoices],
+                'inv_total': [row.total_amount or 0 for row in new_invoices],
+                'inv_tax': [row.total_tax or 0 for row in new_invoices],
+                'inv_discount': [row.discount_amount or 0 for row in new_invoices],
+                'inv_status': [COMPLETED] * len(new_invoices),
+                'item_invoice': [row.invoice_id for row, _ in new_items],
+                'item_ts': [to_timestamp(created_at) for _, created_at in new_items],
+                'item_product': [row.product_id for row, _ in new_items],
+                'item_qty': [row.quantity for row, _ in new_items],
+                'item_revenue': [row.line_total or 0 for row, _ in new_items],
+                'item_status': [COMPLETED] * len(new_items),
+            }
+            dtypes = {**INVOICE_COLUMNS, **ITEM_COLUMNS}
+            for name, values in appended.items():
+                columns[name] = np.concatenate([columns[name], np.asarray(values, dtype=dtypes[name])])
+
+        # Completed invoices deleted since the last export leave 'return' entries in the ledger
+        voided = {
+            row.invoice_id for row in db.session.query(StockMovement.invoice_id).filter(
+                StockMovement.reason == StockMovement.RETURN,
+                StockMovement.invoice_id.isnot(None),
+                StockMovement.id > meta['last_movement_id'],
+                StockMovement.id <= movement_high
+            )
+        }
+        if voided:
+            voided_ids = np.fromiter(voided, dtype=np.int64)
+            columns['inv_status'][np.isin(columns['inv_id'], voided_ids)] = VOID
+            columns['item_status'][np.isin(columns['item_invoice'], voided_ids)] = VOID
+        meta['last_movement_id'] = max(meta['last_movement_id'], movement_high)
+
+        products = {
+            row.id: [row.name, row.barcode] for row in db.session.query(Product.id, Product.name, Product.barcode)
+        }
+        meta['refreshed_at'] = datetime.utcnow().isoformat()
+        meta['invoices'] = int(columns['inv_id'].size)
+        meta['items'] = int(columns['item_invoice'].size)
+
+        self._write(columns, meta, products)
+        self.load()
+        return len(new_invoices)
+
+    # -- queries -----------------------------------------------------------
+
+    def sales_report(self, from_date, to_date, limit=10):
+        """Totals and best sellers for completed sales in [from_date, to_date)"""
+        c = self._columns
+        lo, hi = to_timestamp(from_date), to_timestamp(to_date)
+
+        inv_mask = (c['inv_ts'] >= lo) & (c['inv_ts'] < hi) & (c['inv_status'] == COMPLETED)
+        item_mask = (c['item_ts'] >= lo) & (c['item_ts'] < hi) & (c['item_status'] == COMPLETED)
+
+        # Vectorized group-by product: product ids are small dense integers,
+        # so bincount over the id range avoids sorting
+        products = c['item_product'][item_mask]
+        quantities = np.bincount(products, weights=c['item_qty'][item_mask])
+        revenues = np.bincount(products, weights=c['item_revenue'][item_mask])
+        product_ids = np.flatnonzero(quantities)
+        ranked = product_ids[np.argsort(-quantities[product_ids], kind='stable')[:limit]]
+
+        top_products = []
+        for i in ranked:
+            name, barcode = self._products.get(int(i), ['Unknown', None])
+            top_products.append({
+                'product_id': int(i),
+                'product_name': name,
+                'sku': barcode or '',
+                'total_quantity': int(quantities[i]),
+                'total_revenue': from_minor(int(revenues[i]))
+            })
+
+        return {
+            'total_sales': from_minor(int(c['inv_total'][inv_mask].sum())),
+            'total_tax': from_minor(int(c['inv_tax'][inv_mask].sum())),
+            'total_discount': from_minor(int(c['inv_discount'][inv_mask].sum())),
+            'invoice_count': int(inv_mask.sum()),
+            'top_products': top_products
+        }
+
+    def daily_series(self, from_date, to_date):
+        """Per-day sales totals and invoice counts in [from_date, to_date)"""
+        c = self._columns
+        lo, hi = to_timestamp(from_date), to_timestamp(to_date)
+        days = max((hi - lo + 86399) // 86400, 0)
+
+        mask = (c['inv_ts'] >= lo) & (c['inv_ts'] < hi) & (c['inv_status'] == COMPLETED)
+        day_index = (c['inv_ts'][mask] - lo) // 86400
+        sales = np.bincount(day_index, weights=c['inv_total'][mask], minlength=days)
+        counts = np.bincount(day_index, minlength=days)
+
+        return [
+            {
+                'date': datetime.utcfromtimestamp(lo + i * 86400).strftime('%Y-%m-%d'),
+                'total_sales': from_minor(int(sales[i])),
+                'invoice_count': int(counts[i])
+            }
+            for i in range(days)
+        ]
+
+
+def get_store(path):
+    """Get the process-wide store for a snapshot directory"""
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = ColumnarStore(path)
+    return store.load()
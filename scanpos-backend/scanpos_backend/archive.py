@@ -0,0 +1,160 @@
+"""Invoice archival and the router that reads across hot and archived data"""
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from .extensions import db
+from .money import from_minor, minor_units
+from .models import Invoice, InvoiceItem, Product, ArchivedInvoice, ArchivedInvoiceItem
+
+
+def archive_invoices(older_than_days=None, batch_size=None):
+    """Move completed invoices older than the cutoff into the archive database.
+
+    Works in bounded batches. Each batch is first written to the archive
+    (merge, so a re-run after a crash is harmless) and only then deleted
+    from the hot tables. Returns the number of invoices archived.
+    """
+    if older_than_days is None:
+        older_than_days = current_app.config['ARCHIVE_AFTER_DAYS']
+    if batch_size is None:
+        batch_size = current_app.config['ARCHIVE_BATCH_SIZE']
+
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    archived = 0
+
+    while True:
+        invoices = Invoice.query.filter(
+            Invoice.status == 'completed',
+            Invoice.created_at < cutoff
+        ).order_by(Invoice.id).limit(batch_size).all()
+        if not invoices:
+            break
+
+        invoice_ids = [inv.id for inv in invoices]
+        items = InvoiceItem.query.options(joinedload(InvoiceItem.product)).filter(
+            InvoiceItem.invoice_id.in_(invoice_ids)
+        ).all()
+
+        # Copy into the archive first
+        for inv in invoices:
+            db.session.merge(ArchivedInvoice(
+                id=inv.id,
+                invoice_number=inv.invoice_number,
+                customer_id=inv.customer_id,
+                status=inv.status,
+                subtotal_amount=inv.subtotal_amount,
+                total_tax=inv.total_tax,
+                discount_amount=inv.discount_amount,
+                total_amount=inv.total_amount,
+                created_at=inv.created_at,
+                updated_at=inv.updated_at,
+                archive_month=inv.created_at.year * 100 + inv.created_at.month
+            ))
+        for item in items:
+            db.session.merge(ArchivedInvoiceItem(
+                id=item.id,
+                invoice_id=item.invoice_id,
+                product_id=item.product_id,
+                product_name=item.product.name if item.product else None,
+                quantity=item.quantity,
+                unit_price=item.unit_price,
+                tax_percent=item.tax_percent,
+                line_subtotal=item.line_subtotal,
+                line_tax=item.line_tax,
+                line_total=item.line_total
+            ))
+        db.session.commit()
+
+        # Then drop them from the hot tables
+        InvoiceItem.query.filter(InvoiceItem.invoice_id.in_(invoice_ids)).delete(synchronize_session=False)
+        Invoice.query.filter(Invoice.id.in_(invoice_ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+        archived += len(invoice_ids)
+
+    return archived
+
+
+def find_archived_invoice(invoice_id):
+    """Get an archived invoice by id"""
+    return db.session.get(ArchivedInvoice, invoice_id)
+
+
+def find_invoice_by_number(invoice_number):
+    """Get a live or archived invoice by its number"""
+    invoice = Invoice.query.filter_by(invoice_number=invoice_number).first()
+    if invoice:
+        return invoice
+    return ArchivedInvoice.query.filter_by(invoice_number=invoice_number).first()
+
+
+def sales_totals(from_date, to_date=None):
+    """Sum completed sales in [from_date, to_date) across live and archived invoices.
+
+    Returns (total_sales, total_tax, total_discount, invoice_count). The
+    amounts are summed as integer minor units and converted once at the end.
+    """
+    totals = [0, 0, 0, 0]
+    for model in (Invoice, ArchivedInvoice):
+        query = db.session.query(
+            func.coalesce(func.sum(minor_units(model.total_amount)), 0),
+            func.coalesce(func.sum(minor_units(model.total_tax)), 0),
+            func.coalesce(func.sum(minor_units(model.discount_amount)), 0),
+            func.count(model.id)
+        ).filter(
+            model.status == 'completed',
+            model.created_at >= from_date
+        )
+        if to_date is not None:
+            query = query.filter(model.created_at < to_date)
+        row = query.one()
+        for i, value in enumerate(row):
+            totals[i] += int(value)
+    return (from_minor(totals[0]), from_minor(totals[1]), from_minor(totals[2]), totals[3])
+
+
+def top_products(from_date, to_date, limit=10):
+    """Best sellers by quantity in [from_date, to_date) across live and archived invoices"""
+    merged = {}
+
+    live = db.session.query(
+        InvoiceItem.product_id,
+        func.sum(InvoiceItem.quantity).label('total_quantity'),
+        func.sum(minor_units(InvoiceItem.line_total)).label('total_revenue')
+    ).join(Invoice).filter(
+        Invoice.status == 'completed',
+        Invoice.created_at >= from_date,
+        Invoice.created_at < to_date
+    ).group_by(InvoiceItem.product_id)
+
+    archived = db.session.query(
+        ArchivedInvoiceItem.product_id,
+        func.sum(ArchivedInvoiceItem.quantity).label('total_quantity'),
+        func.sum(minor_units(ArchivedInvoiceItem.line_total)).label('total_revenue')
+    ).join(ArchivedInvoice).filter(
+        ArchivedInvoice.status == 'completed',
+        ArchivedInvoice.created_at >= from_date,
+        ArchivedInvoice.created_at < to_date
+    ).group_by(ArchivedInvoiceItem.product_id)
+
+    for query in (live, archived):
+        for row in query:
+            quantity, revenue = merged.get(row.product_id, (0, 0))
+            merged[row.product_id] = (quantity + row.total_quantity, revenue + int(row.total_revenue or 0))
+
+    ranked = sorted(merged.items(), key=lambda kv: kv[1][0], reverse=True)[:limit]
+    products = {
+        p.id: p for p in Product.query.filter(Product.id.in_([pid for pid, _ in ranked]))
+    }
+
+    return [
+        {
+            'product_id': product_id,
+            'product_name': products[product_id].name if product_id in products else 'Unknown',
+            'sku': (products[product_id].barcode if product_id in products else None) or '',
+            'total_quantity': int(quantity),
+            'total_revenue': from_minor(revenue)
+        }
+        for product_id, (quantity, revenue) in ranked
+    ]
@@ -0,0 +1,250 @@
+"""Online backups of the SQLite databases while the tills keep selling.
+
+`backup_databases()` copies each database (main and archive) with SQLite's
+online backup API, BACKUP_PAGES_PER_STEP pages at a time. The source's read
+lock is only held during a step, so writers wait at most one step. A commit
+by another connection between steps makes SQLite restart the copy; after
+each restart the step size grows, and after BACKUP_MAX_RESTARTS the rest is
+copied in one step so a busy store still gets its backup.
+
+Each copy is gzipped next to a manifest (`backup-<name>.json`) holding its
+SHA-256, per-table row counts and the completed invoice totals read from the
+copy itself. `verify_backup()` restores a set into a temporary directory and
+checks the checksums, SQLite's integrity check, and the counts and totals
+against the manifest. Only BACKUP_KEEP sets are kept, and older ones are
+deleted only after a new set has been verified.
+"""
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from flask import current_app
+from .extensions import db
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_PREFIX = 'backup-'
+# Seconds to wait when a step finds the source locked by a writer
+BUSY_SLEEP_SECONDS = 0.05
+# Each restart multiplies the pages copied per step by this
+STEP_GROWTH = 8
+# (invoice table, line table) pairs whose completed totals are checked on restore
+INVOICE_TABLES = (('invoices', 'invoice_items'), ('archived_invoices', 'archived_invoice_items'))
+
+
+class _Restarted(Exception):
+    """The source changed under the backup and SQLite started over"""
+
+
+def _sqlite_files():
+    """{label: absolute path} of every file-backed SQLite database of the app"""
+    files = {}
+    for engine in db.engines.values():
+        url = engine.url
+        if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+            raise ValueError(f'Only file-backed SQLite databases can be backed up, not {url.render_as_string()}')
+        path = os.path.abspath(url.database)
+        files[os.path.splitext(os.path.basename(path))[0]] = path
+    return files
+
+
+def _copy(source_path, target_path, pages, max_restarts):
+    """Online copy of a database file. Returns the number of restarts."""
+    source = sqlite3.connect(f'file:{source_path}?mode=ro', uri=True)
+    try:
+        for restarts in range(max_restarts + 1):
+            last_remaining = None
+
+            def watch(status, remaining, total):
+                nonlocal last_remaining
+                if last_remaining is not None and remaining > last_remaining:
+                    raise _Restarted()
+                last_remaining = remaining
+
+            target = sqlite3.connect(target_path)
+            try:
+                source.backup(target, pages=-1 if restarts == max_restarts else pages,
+                              progress=watch, sleep=BUSY_SLEEP_SECONDS)
+                return restarts
+            except _Restarted:
+                pages *= STEP_GROWTH
+            finally:
+                target.close()
+    finally:
+        source.close()
+
+
+def _inspect(path):
+    """Row counts per table and completed invoice totals of a database file"""
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        tables = [row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )]
+        counts = {table: connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+        totals = {}
+        for invoices, lines in INVOICE_TABLES:
+            if invoices not in counts or lines not in counts:
+                continue
+            completed, total_amount = connection.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(total_amount), 0) FROM {invoices} WHERE status = 'completed'"
+            ).fetchone()
+            line_total = connection.execute(
+                f"SELECT COALESCE(SUM(l.line_total), 0) FROM {lines} l JOIN {invoices} i ON i.id = l.invoice_id "
+                f"WHERE i.status = 'completed'"
+            ).fetchone()[0]
+            totals[invoices] = {'completed': completed, 'total_amount': total_amount, 'line_total': line_total}
+        return counts, totals
+    finally:
+        connection.close()
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifests(backup_dir):
+    """Manifest paths, oldest first (names are timestamps)"""
+    return sorted(glob.glob(os.path.join(backup_dir, MANIFEST_PREFIX + '*.json')))
+
+
+def _load_manifest(backup_dir, name=None):
+    manifests = _manifests(backup_dir)
+    if name is not None:
+        path = os.path.join(backup_dir, f'{MANIFEST_PREFIX}{name}.json')
+        if path not in manifests:
+            raise ValueError(f'No backup named {name}')
+    elif manifests:
+        path = manifests[-1]
+    else:
+        raise ValueError('No backups yet')
+    with open(path) as f:
+        return json.load(f)
+
+
+def backup_databases(backup_dir=None, verify=True):
+    """Back up every database into a new set, verify it and rotate old sets.
+
+    Returns the manifest, with the verification result and the number of
+    sets rotated out. Raises RuntimeError if the new set fails verification.
+    Without verification old sets are kept: an unchecked set never replaces
+    a verified one.
+    """
+    config = current_app.config
+    backup_dir = backup_dir or config['BACKUP_DIR']
+    os.makedirs(backup_dir, exist_ok=True)
+    name = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+    manifest_path = os.path.join(backup_dir, f'{MANIFEST_PREFIX}{name}.json')
+    if os.path.exists(manifest_path):
+        raise ValueError(f'Backup {name} already exists')
+
+    manifest = {'name': name, 'created_at': datetime.utcnow().isoformat(), 'databases': {}}
+    with tempfile.TemporaryDirectory(dir=backup_dir) as tmp:
+        for label, source_path in _sqlite_files().items():
+            started = time.monotonic()
+            copy_path = os.path.join(tmp, label + '.db')
+            restarts = _copy(source_path, copy_path, config['BACKUP_PAGES_PER_STEP'], config['BACKUP_MAX_RESTARTS'])
+            copied = time.monotonic() - started
+            counts, totals = _inspect(copy_path)
+
+            file_name = f'{label}-{name}.db.gz'
+            partial = os.path.join(tmp, file_name)
+            with open(copy_path, 'rb') as source, \
+                    gzip.open(partial, 'wb', compresslevel=config['BACKUP_COMPRESS_LEVEL']) as target:
+                shutil.copyfileobj(source, target, 1 << 20)
+            manifest['databases'][label] = {
+                'file': file_name,
+                'sha256': _sha256(partial),
+                'bytes': os.path.getsize(copy_path),
+                'compressed_bytes': os.path.getsize(partial),
+                'restarts': restarts,
+                'copy_seconds': round(copied, 3),
+                'counts': counts,
+                'totals': totals,
+            }
+            os.replace(partial, os.path.join(backup_dir, file_name))
+
+    # The manifest goes last: a set without one is incomplete and ignored
+    with open(manifest_path + '.partial', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.partial', manifest_path)
+    logger.info('Backup %s written to %s', name, backup_dir)
+
+    if verify:
+        result = verify_backup(name, backup_dir)
+        if not result['ok']:
+            raise RuntimeError(f'Backup {name} failed verification: {"; ".join(result["problems"])}')
+    manifest['verified'] = verify
+    manifest['rotated'] = rotate_backups(backup_dir) if verify else 0
+    return manifest
+
+
+def verify_backup(name=None, backup_dir=None):
+    """Restore a backup set (the latest by default) into a temporary directory and check it.
+
+    Returns {'name', 'ok', 'problems', 'databases'}.
+    """
+    backup_dir = backup_dir or current_app.config['BACKUP_DIR']
+    manifest = _load_manifest(backup_dir, name)
+    problems, checked = [], {}
+    with tempfile.TemporaryDirectory(dir=backup_dir) as tmp:
+        for label, expected in manifest['databases'].items():
+            path = os.path.join(backup_dir, expected['file'])
+            if not os.path.exists(path):
+                problems.append(f'{label}: {expected["file"]} is missing')
+                continue
+            if _sha256(path) != expected['sha256']:
+                problems.append(f'{label}: checksum mismatch')
+                continue
+
+            restored = os.path.join(tmp, label + '.db')
+            with gzip.open(path, 'rb') as source, open(restored, 'wb') as target:
+                shutil.copyfileobj(source, target, 1 << 20)
+            connection = sqlite3.connect(restored)
+            try:
+                integrity = connection.execute('PRAGMA integrity_check').fetchone()[0]
+            finally:
+                connection.close()
+            if integrity != 'ok':
+                problems.append(f'{label}: integrity check failed: {integrity}')
+                continue
+
+            counts, totals = _inspect(restored)
+            for table in sorted(set(counts) | set(expected['counts'])):
+                if counts.get(table) != expected['counts'].get(table):
+                    problems.append(f'{label}: {table} has {counts.get(table)} rows, expected '
+                                    f'{expected["counts"].get(table)}')
+            if totals != expected['totals']:
+                problems.append(f'{label}: invoice totals {totals} do not match {expected["totals"]}')
+            checked[label] = {'rows': sum(counts.values()), 'totals': totals}
+
+    return {'name': manifest['name'], 'ok': not problems, 'problems': problems, 'databases': checked}
+
+
+def rotate_backups(backup_dir=None, keep=None):
+    """Delete all but the newest `keep` backup sets. Returns the number deleted."""
+    backup_dir = backup_dir or current_app.config['BACKUP_DIR']
+    keep = current_app.config['BACKUP_KEEP'] if keep is None else keep
+    manifests = _manifests(backup_dir)
+    expired = manifests[:-keep] if keep > 0 else manifests
+    for manifest_path in expired:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        for entry in manifest['databases'].values():
+            try:
+                os.remove(os.path.join(backup_dir, entry['file']))
+            except FileNotFoundError:
+                pass
+        os.remove(manifest_path)
+    return len(expired)
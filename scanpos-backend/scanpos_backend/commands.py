@@ -0,0 +1,116 @@
+"""Maintenance commands exposed through the `flask` CLI"""
+import click
+
+
+def register_commands(app):
+    """Attach maintenance commands to the app's CLI"""
+
+    @app.cli.command('rebuild-low-stock')
+    def rebuild_low_stock_command():
+        """Recompute the low-stock alert set from current stock levels"""
+        from .inventory import rebuild_low_stock
+        count = rebuild_low_stock()
+        click.echo(f'✓ Low-stock set rebuilt: {count} products below reorder level')
+
+    @app.cli.command('compact-stock')
+    def compact_stock_command():
+        """Fold pending stock ledger entries into product snapshots"""
+        from .inventory import compact_stock_movements
+        count = compact_stock_movements()
+        click.echo(f'✓ Stock ledger compacted: {count} products updated')
+
+    @app.cli.command('archive-invoices')
+    @click.option('--older-than-days', type=int, default=None, help='Defaults to ARCHIVE_AFTER_DAYS')
+    @click.option('--batch-size', type=int, default=None, help='Defaults to ARCHIVE_BATCH_SIZE')
+    def archive_invoices_command(older_than_days, batch_size):
+        """Move old completed invoices into the archive database"""
+        from .archive import archive_invoices
+        count = archive_invoices(older_than_days=older_than_days, batch_size=batch_size)
+        click.echo(f'✓ Archived {count} invoices')
+
+    @app.cli.command('sweep-drafts')
+    @click.option('--idle-minutes', type=int, default=None, help='Defaults to DRAFT_SWEEP_IDLE_MINUTES')
+    @click.option('--action', type=click.Choice(['purge', 'cancel']), default=None, help='Defaults to DRAFT_SWEEP_ACTION')
+    @click.option('--batch-size', type=int, default=None, help='Defaults to DRAFT_SWEEP_BATCH_SIZE')
+    def sweep_drafts_command(idle_minutes, action, batch_size):
+        """Purge or cancel draft invoices abandoned at the till"""
+        from .drafts import sweep_abandoned_drafts
+        counts = sweep_abandoned_drafts(idle_minutes=idle_minutes, batch_size=batch_size, action=action)
+        verb = 'Purged' if counts['action'] == 'purge' else 'Cancelled'
+        click.echo(f'✓ {verb} {counts["drafts"]} abandoned drafts ({counts["lines"]} lines, '
+                   f'{counts["units"]} units, {counts["value"]:.2f} in value)')
+
+    @app.cli.command('analytics-refresh')
+    @click.option('--full', is_flag=True, help='Rebuild the snapshot from scratch')
+    def analytics_refresh_command(full):
+        """Export new completed sales into the columnar analytics snapshot"""
+        from .analytics import get_store
+        store = get_store(app.config['ANALYTICS_DIR'])
+        count = store.refresh(full=full)
+        click.echo(f'✓ Analytics snapshot refreshed: {count} invoices exported')
+
+    @app.cli.command('purge-idempotency-keys')
+    def purge_idempotency_keys_command():
+        """Delete expired Idempotency-Key responses"""
+        from .idempotency import purge_expired_keys
+        count = purge_expired_keys()
+        click.echo(f'✓ Purged {count} expired idempotency keys')
+
+    @app.cli.command('purge-token-revocations')
+    def purge_token_revocations_command():
+        """Delete revocations of JWTs that have expired anyway"""
+        from .revocation import purge_expired_revocations
+        count = purge_expired_revocations()
+        click.echo(f'✓ Purged {count} expired token revocations')
+
+    @app.cli.command('compact-outbox')
+    def compact_outbox_command():
+        """Drop superseded and expired change-feed events"""
+        from .outbox import compact_outbox, purge_outbox
+        compacted = compact_outbox()
+        purged = purge_outbox()
+        click.echo(f'✓ Outbox compacted: {compacted} superseded and {purged} expired events removed')
+
+    @app.cli.command('backup-db')
+    @click.option('--dir', 'backup_dir', default=None, help='Defaults to BACKUP_DIR')
+    @click.option('--no-verify', is_flag=True, help='Skip restoring the new backup to check it')
+    def backup_db_command(backup_dir, no_verify):
+        """Back up the databases online, verify the copy and rotate old backups"""
+        from .backup import backup_databases
+        try:
+            manifest = backup_databases(backup_dir=backup_dir, verify=not no_verify)
+        except (RuntimeError, ValueError) as e:
+            raise click.ClickException(str(e))
+        for label, entry in manifest['databases'].items():
+            click.echo(f'  {entry["file"]}: {entry["bytes"] / 2 ** 20:.1f} MB -> '
+                       f'{entry["compressed_bytes"] / 2 ** 20:.1f} MB, {entry["restarts"]} restarts')
+        click.echo(f'✓ Backup {manifest["name"]} written{" and verified" if manifest["verified"] else ""}, '
+                   f'{manifest["rotated"]} old backups removed')
+
+    @app.cli.command('verify-backup')
+    @click.argument('name', required=False)
+    @click.option('--dir', 'backup_dir', default=None, help='Defaults to BACKUP_DIR')
+    def verify_backup_command(name, backup_dir):
+        """Restore a backup (the latest by default) to a temp dir and check counts and totals"""
+        from .backup import verify_backup
+        try:
+            result = verify_backup(name, backup_dir=backup_dir)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        for problem in result['problems']:
+            click.echo(f'  ✗ {problem}')
+        if not result['ok']:
+            raise click.ClickException(f'Backup {result["name"]} failed verification')
+        for label, checked in result['databases'].items():
+            click.echo(f'  {label}: {checked["rows"]} rows, totals match')
+        click.echo(f'✓ Backup {result["name"]} verified')
+
+    @app.cli.command('jobs-worker')
+    @click.option('--workers', type=int, default=None, help='Defaults to JOB_MAX_WORKERS')
+    @click.option('--once', is_flag=True, help='Exit when the queue is empty')
+    def jobs_worker_command(workers, once):
+        """Run queued background jobs and scheduled maintenance"""
+        from .jobs import run_worker
+        click.echo('Job runner started (Ctrl-C to drain and stop)')
+        run_worker(app, max_workers=workers, once=once)
+        click.echo('✓ Job runner stopped')
@@ -0,0 +1,87 @@
+"""Response compression negotiated from Accept-Encoding.
+
+Buffered responses are compressed whole once they pass a size threshold;
+streamed responses are compressed chunk by chunk (with a sync flush after
+each chunk) so time-to-first-byte is unchanged. Brotli is used when the
+optional `brotli` package is installed and the client accepts it, gzip
+otherwise.
+"""
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'text/html',
+    'text/plain',
+    'text/csv',
+    'text/css',
+}
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted.quality('br') > 0:
+        return 'br'
+    if accepted.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def _new_compressor(encoding, app):
+    """Returns (compress(chunk) -> bytes, flush() -> bytes, finish() -> bytes)"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=app.config['COMPRESS_BROTLI_QUALITY'])
+        return compressor.process, compressor.flush, compressor.finish
+    # wbits=31 selects the gzip container
+    compressor = zlib.compressobj(app.config['COMPRESS_LEVEL'], zlib.DEFLATED, 31)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def _compress_stream(chunks, encoding, app):
+    compress, flush, finish = _new_compressor(encoding, app)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compress(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+def init_compression(app):
+    """Install the compression hook on the app"""
+    if not app.config['COMPRESS_ENABLED']:
+        return
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or
+                response.status_code < 200 or response.status_code in (204, 304) or
+                'Content-Encoding' in response.headers or
+                response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = _choose_encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, encoding, app)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < app.config['COMPRESS_MIN_SIZE']:
+                return response
+            compress, _, finish = _new_compressor(encoding, app)
+            response.set_data(compress(data) + finish())
+
+        response.headers['Content-Encoding'] = encoding
+        return response
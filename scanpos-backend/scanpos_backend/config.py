@@ -12,9 +12,160 @@ class Config:
         'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'scanpos.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Flask-Migrate is always loaded under the `flask` CLI; set this to load it
+    # in other entry points too
+    LOAD_MIGRATIONS = os.environ.get('LOAD_MIGRATIONS', 'false').lower() == 'true'
+    
+    # Cold storage for old completed invoices (separate SQLite file by default)
+    SQLALCHEMY_BINDS = {
+        'archive': os.environ.get('ARCHIVE_DATABASE_URL') or
+            'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'scanpos_archive.db')
+    }
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))  # Archive completed invoices older than this
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))  # Invoices moved per transaction
+    
     # JWT configuration
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=2)  # Token expires after 2 hours
+    REVOCATION_SYNC_SECONDS = float(os.environ.get('REVOCATION_SYNC_SECONDS', 2))  # Max delay before other workers see a revocation
+    
+    # Cross-worker cache invalidation
+    INVALIDATION_POLL_SECONDS = float(os.environ.get('INVALIDATION_POLL_SECONDS', 1))  # Max delay before other workers drop stale entries
+    INVALIDATION_RETENTION_SECONDS = int(os.environ.get('INVALIDATION_RETENTION_SECONDS', 3600))  # Delivered messages are purged after this
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 5000))  # Per cache, per worker
+    CACHE_TTL_SECONDS = int(os.environ.get('CACHE_TTL_SECONDS', 300))  # Upper bound on staleness if a message is missed
+    DASHBOARD_CACHE_SECONDS = int(os.environ.get('DASHBOARD_CACHE_SECONDS', 30))
+    CUSTOMER_LOOKUP_CACHE_SECONDS = int(os.environ.get('CUSTOMER_LOOKUP_CACHE_SECONDS', 60))  # Searches and the recent-customers list
+    
+    # Customers
+    PHONE_COUNTRY_CODE = os.environ.get('PHONE_COUNTRY_CODE', '91')  # Stripped from +CC/00CC numbers so lookups match local input
+    
+    # Columnar analytics snapshot for reports (requires numpy)
+    ANALYTICS_ENABLED = os.environ.get('ANALYTICS_ENABLED', 'false').lower() == 'true'
+    ANALYTICS_DIR = os.environ.get('ANALYTICS_DIR') or \
+        os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'analytics')
+    ANALYTICS_MAX_AGE_SECONDS = int(os.environ.get('ANALYTICS_MAX_AGE_SECONDS', 300))  # Older snapshots fall back to SQL
+    
+    # Inventory configuration
+    LOW_STOCK_DASHBOARD_LIMIT = int(os.environ.get('LOW_STOCK_DASHBOARD_LIMIT', 10))  # Alerts shown on the dashboard
+    
+    # Idempotency-Key support for retried scans and checkouts
+    IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 86400))  # How long responses are replayed
+    IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 60))  # In-progress claims older than this are taken over
+    
+    # Core-statement fast path for adding and updating invoice lines (same responses as the ORM path)
+    ITEM_FAST_PATH_ENABLED = os.environ.get('ITEM_FAST_PATH_ENABLED', 'true').lower() == 'true'
+    
+    # Offline sales upload (POST /api/invoices/sync)
+    SYNC_MAX_SALES = int(os.environ.get('SYNC_MAX_SALES', 500))  # Sales per batch
+    SYNC_MAX_CLOCK_SKEW_SECONDS = int(os.environ.get('SYNC_MAX_CLOCK_SKEW_SECONDS', 300))  # Sales dated further ahead are rejected
+    
+    # Abandoned draft invoices (`sweep_drafts` job, `flask sweep-drafts`)
+    DRAFT_SWEEP_IDLE_MINUTES = int(os.environ.get('DRAFT_SWEEP_IDLE_MINUTES', 240))  # Drafts untouched this long (no line or customer change) are abandoned
+    DRAFT_SWEEP_ACTION = os.environ.get('DRAFT_SWEEP_ACTION') or 'purge'  # 'purge' deletes them with their lines, 'cancel' keeps them as cancelled
+    DRAFT_SWEEP_BATCH_SIZE = int(os.environ.get('DRAFT_SWEEP_BATCH_SIZE', 200))  # Drafts per transaction
+    
+    # Outbox change feed for ERP/accounting sync (GET /api/events)
+    OUTBOX_RETENTION_HOURS = int(os.environ.get('OUTBOX_RETENTION_HOURS', 168))  # Consumers further behind must resync
+    OUTBOX_COMPACT_AFTER_SECONDS = int(os.environ.get('OUTBOX_COMPACT_AFTER_SECONDS', 3600))  # Then only the latest event per entity is kept
+    OUTBOX_MAX_BATCH = int(os.environ.get('OUTBOX_MAX_BATCH', 5000))  # Events per response
+    OUTBOX_MAX_WAIT_SECONDS = int(os.environ.get('OUTBOX_MAX_WAIT_SECONDS', 25))  # Longest ?wait= long-poll; keep under SERVER_TIMEOUT_SECONDS
+    OUTBOX_POLL_SECONDS = float(os.environ.get('OUTBOX_POLL_SECONDS', 0.5))  # How often a long-poll looks for new events
+    
+    # Admission control (per worker process; in-flight limits are capped to the worker model, see serving.admission_limits)
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+    ADMISSION_RATE_LIMITS = {  # route class: (requests per second, burst) per terminal; None = unlimited
+        'checkout': None,
+        'scan': (5, 20),
+        'reports': (1, 5),
+        'admin': (5, 20),
+        'long_poll': (1, 5),
+        'general': (20, 60),
+    }
+    ADMISSION_TERMINALS_PER_USER = int(os.environ.get('ADMISSION_TERMINALS_PER_USER', 4))  # One user's X-Terminal-Ids share this many terminals' worth of each limit
+    ADMISSION_MAX_INFLIGHT = int(os.environ.get('ADMISSION_MAX_INFLIGHT', 32))  # Concurrent requests per worker
+    ADMISSION_CHECKOUT_RESERVE = int(os.environ.get('ADMISSION_CHECKOUT_RESERVE', 4))  # Slots only checkout may use; at most a quarter
+    ADMISSION_CLASS_LIMITS = {'reports': 4, 'admin': 8, 'long_poll': 2}  # Concurrent requests per class per worker; at most half the shared slots
+    
+    # Response compression (brotli when the optional package is installed, else gzip)
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # Bytes; smaller buffered responses are sent as-is
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))  # gzip level
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+    
+    # Slow-query log
+    SLOW_QUERY_LOG_ENABLED = os.environ.get('SLOW_QUERY_LOG_ENABLED', 'true').lower() == 'true'
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+    SLOW_QUERY_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_SAMPLE_RATE', 0.2))  # Share of slow statements logged with plan
+    SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', 'true').lower() == 'true'
+    
+    # Background jobs (`flask jobs-worker`)
+    JOB_RESULTS_DIR = os.environ.get('JOB_RESULTS_DIR') or \
+        os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'job_results')
+    JOB_MAX_WORKERS = int(os.environ.get('JOB_MAX_WORKERS', 2))  # Worker processes in the pool
+    JOB_KIND_LIMITS = {  # Jobs of one kind running at once, across all runners
+        'sales_report': 2,
+        'invoices_export': 1,
+        'day_summary': 1,
+        'archive_invoices': 1,
+        'backup_databases': 1,
+        'analytics_refresh': 1,
+    }
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 60))  # Running jobs without a heartbeat this long are requeued
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))  # Interrupted runs before a job is failed
+    JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', 1.0))
+    JOB_MAX_WAIT_SECONDS = int(os.environ.get('JOB_MAX_WAIT_SECONDS', 30))  # Longest ?wait= on GET /api/jobs/<id>
+    JOB_RETENTION_HOURS = int(os.environ.get('JOB_RETENTION_HOURS', 72))  # Finished jobs and their files are then purged
+    JOB_SCHEDULE = {  # Maintenance jobs queued by the runner: kind -> interval in seconds
+        'compact_stock': 300,
+        'purge_idempotency_keys': 3600,
+        'purge_jobs': 3600,
+        'purge_token_revocations': 3600,
+        'purge_invalidations': 3600,
+        'compact_outbox': 3600,
+        'sweep_drafts': 900,
+        'backup_databases': 21600,
+        # Well inside ANALYTICS_MAX_AGE_SECONDS, so reports keep using the snapshot
+        **({'analytics_refresh': 60} if ANALYTICS_ENABLED else {}),
+    }
+    
+    # Online database backups (`flask backup-db`, `backup_databases` job)
+    BACKUP_DIR = os.environ.get('BACKUP_DIR') or \
+        os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'backups')
+    BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 14))  # Backup sets kept; older ones go once a new set is verified
+    BACKUP_PAGES_PER_STEP = int(os.environ.get('BACKUP_PAGES_PER_STEP', 256))  # Pages copied per read-lock hold (1 MB at 4 KB pages)
+    BACKUP_MAX_RESTARTS = int(os.environ.get('BACKUP_MAX_RESTARTS', 3))  # Copies restarted by writes; the last attempt is one step
+    BACKUP_COMPRESS_LEVEL = int(os.environ.get('BACKUP_COMPRESS_LEVEL', 6))  # gzip level
+    
+    # ESC/POS receipts (80 mm paper, Font A)
+    RECEIPT_WIDTH = int(os.environ.get('RECEIPT_WIDTH', 48))  # Characters per line; 42 for 72 mm print area printers
+    RECEIPT_STORE_NAME = os.environ.get('RECEIPT_STORE_NAME') or 'ScanPOS'
+    RECEIPT_HEADER_LINES = [line for line in os.environ.get('RECEIPT_HEADER', '').split('|') if line]
+    RECEIPT_FOOTER_LINES = ['Thank you for your business!']
+    RECEIPT_CURRENCY = os.environ.get('RECEIPT_CURRENCY') or 'Rs.'
+    RECEIPT_ENCODING = os.environ.get('RECEIPT_ENCODING') or 'cp437'  # Must match RECEIPT_CODEPAGE
+    RECEIPT_CODEPAGE = int(os.environ.get('RECEIPT_CODEPAGE', 0))  # ESC t n; 0 = PC437
+    RECEIPT_CACHE_SIZE = int(os.environ.get('RECEIPT_CACHE_SIZE', 512))  # Rendered receipts kept per worker
+    
+    # Production server (gunicorn -c gunicorn.conf.py)
+    SERVER_BIND = os.environ.get('SERVER_BIND') or '0.0.0.0:5000'
+    SERVER_WORKER_CLASS = os.environ.get('SERVER_WORKER_CLASS') or 'gthread'  # 'sync' (pre-fork), 'gthread' or 'gevent'
+    SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', 0)) or os.cpu_count() or 1  # Processes; default one per core
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 4))  # Requests in flight per worker (gthread)
+    SERVER_WORKER_CONNECTIONS = int(os.environ.get('SERVER_WORKER_CONNECTIONS', 100))  # Open client connections per worker (gevent)
+    SERVER_KEEPALIVE_SECONDS = int(os.environ.get('SERVER_KEEPALIVE_SECONDS', 15))  # Idle keep-alive; tills poll more often than this
+    SERVER_TIMEOUT_SECONDS = int(os.environ.get('SERVER_TIMEOUT_SECONDS', 30))  # Silent workers are killed and replaced
+    SERVER_GRACEFUL_TIMEOUT_SECONDS = int(os.environ.get('SERVER_GRACEFUL_TIMEOUT_SECONDS', 30))  # In-flight requests finish on restart
+    SERVER_MAX_REQUESTS = int(os.environ.get('SERVER_MAX_REQUESTS', 10000))  # Worker recycled after this many, contains leaks; 0 = never
+    SERVER_MAX_REQUESTS_JITTER = int(os.environ.get('SERVER_MAX_REQUESTS_JITTER', 1000))  # So workers don't recycle together
+    
+    # Database connection pools, per worker and database
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))  # 0 = requests in flight per worker, see serving.py
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 2))  # Extra connections for background threads
+    DB_POOL_TIMEOUT_SECONDS = int(os.environ.get('DB_POOL_TIMEOUT_SECONDS', 10))  # Wait for a free connection, then 500
+    
+    # Startup warmup
+    WARMUP_POOL_CONNECTIONS = int(os.environ.get('WARMUP_POOL_CONNECTIONS', 2))  # Connections opened per worker
     
     # CORS configuration
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS') or '*'
@@ -0,0 +1,114 @@
+"""Customer lookup at the till: phone-number prefix and name-token search.
+
+Both searches are index range scans that stop at the result limit: phone
+prefixes scan `customers.phone_digits`, name prefixes scan the primary key
+of `customer_name_tokens` (one row per lowercased word of the name). Call
+`index_customer()` whenever a customer's name or phone changes.
+"""
+import re
+from flask import current_app
+from .extensions import db
+from .models import Customer, CustomerNameToken, Invoice
+
+TOKEN_RE = re.compile(r'\w+')
+MAX_TOKEN_LENGTH = 50
+
+
+def normalize_phone(phone, country_code=''):
+    """Digits of a phone number without the local country code, or None.
+
+    '+91 98450-12345' and '98450 12345' both become '9845012345' with
+    country code '91', so cashiers can type the number either way.
+    """
+    phone = (phone or '').strip()
+    digits = re.sub(r'\D', '', phone)
+    if country_code and phone.startswith('+' + country_code):
+        digits = digits[len(country_code):]
+    elif country_code and phone.startswith('00' + country_code):
+        digits = digits[len(country_code) + 2:]
+    return digits or None
+
+
+def name_tokens(name):
+    """Distinct lowercased words of a name"""
+    return {token[:MAX_TOKEN_LENGTH] for token in TOKEN_RE.findall((name or '').lower())}
+
+
+def index_customer(customer):
+    """Refresh the lookup columns of a customer. The caller commits."""
+    customer.phone_digits = normalize_phone(customer.phone, current_app.config['PHONE_COUNTRY_CODE'])
+    tokens = name_tokens(customer.name)
+    current = {entry.token: entry for entry in customer.name_tokens}
+    for token in current.keys() - tokens:
+        customer.name_tokens.remove(current[token])
+    for token in tokens - current.keys():
+        customer.name_tokens.append(CustomerNameToken(token=token))
+
+
+def _prefix_range(column, prefix):
+    """column LIKE 'prefix%' as a range any B-tree index can serve"""
+    return db.and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+def _token_matches(token, cap=1000):
+    """Customers with a word starting with token, counted up to cap"""
+    matches = db.session.query(CustomerNameToken.customer_id).filter(
+        _prefix_range(CustomerNameToken.token, token)
+    ).limit(cap).subquery()
+    return db.session.query(db.func.count()).select_from(matches).scalar()
+
+
+def is_phone_query(query):
+    """Treat queries made of digits and phone punctuation as phone numbers"""
+    return bool(re.fullmatch(r'[\d\s+()\-.]+', query)) and normalize_phone(query) is not None
+
+
+def lookup_customers(query, limit=10):
+    """Customers whose phone starts with the query digits, or whose name has
+    a word starting with each query word. Returns Customer objects."""
+    if is_phone_query(query):
+        digits = normalize_phone(query, current_app.config['PHONE_COUNTRY_CODE'])
+        if not digits:
+            return []
+        return Customer.query.filter(
+            _prefix_range(Customer.phone_digits, digits)
+        ).order_by(Customer.phone_digits, Customer.id).limit(limit).all()
+
+    tokens = list(name_tokens(query))
+    if not tokens:
+        return []
+    if len(tokens) > 1:
+        tokens.sort(key=_token_matches)
+
+    # Scan the most selective word; the others must match too
+    ids = db.session.query(CustomerNameToken.customer_id).filter(
+        _prefix_range(CustomerNameToken.token, tokens[0])
+    )
+    for token in tokens[1:]:
+        other = db.aliased(CustomerNameToken)
+        ids = ids.filter(
+            db.session.query(other.customer_id).filter(
+                other.customer_id == CustomerNameToken.customer_id,
+                _prefix_range(other.token, token)
+            ).exists()
+        )
+    # One customer can match through several of its words
+    rows = ids.order_by(CustomerNameToken.token, CustomerNameToken.customer_id).limit(limit * 3)
+    matched = list(dict.fromkeys(row.customer_id for row in rows))[:limit]
+    if not matched:
+        return []
+
+    by_id = {customer.id: customer for customer in Customer.query.filter(Customer.id.in_(matched))}
+    return [by_id[customer_id] for customer_id in matched if customer_id in by_id]
+
+
+def recent_customers(limit=10, scan=500):
+    """Distinct customers of the last `scan` invoices, most recent first"""
+    # Walks the newest invoices only, so the cost does not grow with history
+    rows = db.session.query(Invoice.customer_id).order_by(Invoice.id.desc()).limit(scan)
+    recent = list(dict.fromkeys(row.customer_id for row in rows if row.customer_id is not None))[:limit]
+    if not recent:
+        return []
+
+    by_id = {customer.id: customer for customer in Customer.query.filter(Customer.id.in_(recent))}
+    return [by_id[customer_id] for customer_id in recent if customer_id in by_id]
@@ -0,0 +1,112 @@
+"""Sweeper for draft invoices abandoned at the till.
+
+Every checkout starts with a draft, and one is left behind with its lines
+whenever a customer walks away. `sweep_abandoned_drafts()` purges (or
+cancels) drafts idle for longer than DRAFT_SWEEP_IDLE_MINUTES, in batches of
+DRAFT_SWEEP_BATCH_SIZE with one short transaction each, so tills never wait
+long behind it. Drafts hold no stock (stock moves on completion), so there
+is nothing else to undo.
+
+Idle time counts from the draft's updated_at, which every change to the
+draft sets: creating it, attaching a customer and adding, editing or
+deleting a line.
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+from .extensions import db
+from .models import Invoice, InvoiceItem
+from .money import to_minor, from_minor, minor_units
+
+logger = logging.getLogger(__name__)
+
+PURGE = 'purge'
+CANCEL = 'cancel'
+ACTIONS = (PURGE, CANCEL)
+
+# Lets till writers waiting on the database lock in between batches
+BATCH_PAUSE_SECONDS = 0.05
+
+
+def validate_sweep(params):
+    """Reject bad sweep job parameters"""
+    if params.get('action') not in (None,) + ACTIONS:
+        raise ValueError(f'action must be one of: {", ".join(ACTIONS)}')
+    for name in ('idle_minutes', 'batch_size'):
+        value = params.get(name)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < 1):
+            raise ValueError(f'{name} must be a positive integer')
+
+
+def sweep_abandoned_drafts(idle_minutes=None, batch_size=None, action=None):
+    """Purge or cancel drafts idle since the cutoff.
+
+    Returns counts of what was swept: drafts, their lines, units and the
+    value of the abandoned carts.
+    """
+    if idle_minutes is None:
+        idle_minutes = current_app.config['DRAFT_SWEEP_IDLE_MINUTES']
+    if batch_size is None:
+        batch_size = current_app.config['DRAFT_SWEEP_BATCH_SIZE']
+    if action is None:
+        action = current_app.config['DRAFT_SWEEP_ACTION']
+    if action not in ACTIONS:
+        raise ValueError(f'Unknown draft sweep action: {action}')
+
+    cutoff = datetime.utcnow() - timedelta(minutes=idle_minutes)
+    # created_at <= updated_at, so the created_at bound lets ix_invoices_status_created do the range scan
+    stale = (Invoice.status == 'draft', Invoice.created_at < cutoff, Invoice.updated_at < cutoff)
+    drafts = lines = units = value = 0
+    last_id = 0
+
+    while True:
+        invoice_ids = db.session.execute(
+            select(Invoice.id).where(Invoice.id > last_id, *stale).order_by(Invoice.id).limit(batch_size)
+        ).scalars().all()
+        if not invoice_ids:
+            break
+        last_id = invoice_ids[-1]
+
+        # The writes repeat the staleness check, so a draft completed or
+        # touched since the read above is left alone
+        still_stale = select(Invoice.id).where(Invoice.id.in_(invoice_ids), *stale)
+        if action == PURGE:
+            removed = db.session.execute(
+                delete(InvoiceItem).where(InvoiceItem.invoice_id.in_(still_stale))
+                .returning(InvoiceItem.quantity, InvoiceItem.line_total)
+                .execution_options(synchronize_session=False)
+            ).all()
+            swept = db.session.execute(
+                delete(Invoice).where(Invoice.id.in_(invoice_ids), *stale)
+                .returning(Invoice.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+            line_units = sum(row.quantity for row in removed)
+            line_value = sum(to_minor(row.line_total) for row in removed)
+            line_count = len(removed)
+        else:
+            swept = db.session.execute(
+                update(Invoice).where(Invoice.id.in_(invoice_ids), *stale)
+                .values(status='cancelled', updated_at=datetime.utcnow())
+                .returning(Invoice.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+            line_count, line_units, line_value = db.session.query(
+                func.count(InvoiceItem.id),
+                func.coalesce(func.sum(InvoiceItem.quantity), 0),
+                func.coalesce(func.sum(minor_units(InvoiceItem.line_total)), 0)
+            ).filter(InvoiceItem.invoice_id.in_(swept or [0])).one()
+        db.session.commit()
+
+        drafts += len(swept)
+        lines += line_count
+        units += line_units
+        value += line_value
+        time.sleep(BATCH_PAUSE_SECONDS)
+
+    counts = {'action': action, 'drafts': drafts, 'lines': lines, 'units': units, 'value': from_minor(value)}
+    if drafts:
+        logger.info('Swept abandoned drafts idle over %s minutes: %s', idle_minutes, counts)
+    return counts
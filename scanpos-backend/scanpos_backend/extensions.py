@@ -1,10 +1,21 @@
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 
 # Initialize extensions (without app binding)
 db = SQLAlchemy()
-migrate = Migrate()
 jwt = JWTManager()
 cors = CORS()
+
+# Flask-Migrate pulls in Alembic, a large share of the startup import time,
+# and is only needed by the `flask db` commands; created on first use
+migrate = None
+
+
+def get_migrate():
+    """Get the Migrate extension, importing Flask-Migrate on first use"""
+    global migrate
+    if migrate is None:
+        from flask_migrate import Migrate
+        migrate = Migrate()
+    return migrate
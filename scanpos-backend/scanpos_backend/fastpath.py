@@ -0,0 +1,190 @@
+"""Core-level fast path for the scan hot path: adding and updating invoice lines.
+
+The ORM versions of these endpoints load an Invoice, a Product and maybe an
+InvoiceItem as full objects and flush them through the unit of work. Here the
+common case is three statements built once per dialect and executed on the
+session's connection, so SQLAlchemy reuses their compiled SQL:
+
+1. one SELECT returning the invoice status next to the product's price, tax,
+   active flag and current stock (or the line's, for an update);
+2. one INSERT .. ON CONFLICT DO UPDATE (or UPDATE) writing the line with its
+   totals computed in integer minor units, RETURNING the row;
+3. one UPDATE of the invoice's updated_at, so the draft sweeper sees the
+   cart is in use.
+
+Anything unusual (missing rows, a non-draft invoice, an inactive product,
+not enough stock, odd input) returns None, and the caller falls back to the
+ORM path, which produces the error response. The caller commits.
+"""
+from datetime import datetime
+from sqlalchemy import BigInteger, bindparam, select, update
+from .extensions import db
+from .models import Invoice, InvoiceItem, Product
+from .money import minor_units, tax_on, tax_on_sql
+
+_statements = {}
+
+
+def _returning(table):
+    return (table.c.id, table.c.product_id, table.c.quantity, table.c.unit_price, table.c.tax_percent,
+            table.c.line_subtotal, table.c.line_tax, table.c.line_total)
+
+
+def _build(dialect_name):
+    """The fast-path statements for one dialect, with bind parameters only"""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    table = InvoiceItem.__table__
+    status = select(Invoice.status).where(Invoice.id == bindparam('invoice_id')).scalar_subquery()
+    product_columns = (status.label('status'), Product.id, Product.name, minor_units(Product.price).label('price'),
+                       Product.tax_percent, Product.is_active, Product.stock_qty.label('stock_qty'))
+
+    # Prices arrive as minor units, so the Money bind conversion is skipped
+    minor = lambda name: bindparam(name, type_=BigInteger)  # noqa: E731
+    upsert = insert(table).values(
+        invoice_id=bindparam('invoice_id'),
+        product_id=bindparam('product_id'),
+        quantity=bindparam('quantity'),
+        unit_price=minor('unit_price'),
+        tax_percent=bindparam('tax_percent'),
+        line_subtotal=minor('line_subtotal'),
+        line_tax=minor('line_tax'),
+        line_total=minor('line_total')
+    )
+    new_quantity = table.c.quantity + upsert.excluded.quantity
+    new_subtotal = new_quantity * minor_units(table.c.unit_price)
+    new_tax = tax_on_sql(new_subtotal, table.c.tax_percent)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[table.c.invoice_id, table.c.product_id],
+        set_={
+            'quantity': new_quantity,
+            'line_subtotal': new_subtotal,
+            'line_tax': new_tax,
+            'line_total': new_subtotal + new_tax
+        },
+        where=new_quantity <= bindparam('stock')
+    ).returning(*_returning(table))
+
+    return {
+        'product_by_id': select(*product_columns).where(Product.id == bindparam('product_id')),
+        'product_by_barcode': select(*product_columns).where(
+            Product.barcode == bindparam('barcode'), Product.is_active == True
+        ),
+        'upsert': upsert,
+        'line': select(
+            status.label('status'), minor_units(table.c.unit_price).label('unit_price'), table.c.tax_percent,
+            Product.name, Product.stock_qty.label('stock_qty')
+        ).select_from(table.join(Product.__table__, Product.id == table.c.product_id)).where(
+            table.c.id == bindparam('item_id'), table.c.invoice_id == bindparam('invoice_id')
+        ),
+        'update': update(table).where(table.c.id == bindparam('item_id')).values(
+            quantity=bindparam('quantity'),
+            line_subtotal=minor('line_subtotal'),
+            line_tax=minor('line_tax'),
+            line_total=minor('line_total')
+        ).returning(*_returning(table)),
+        'touch': update(Invoice.__table__).where(Invoice.__table__.c.id == bindparam('invoice_id')).values(
+            updated_at=bindparam('now')
+        ),
+    }
+
+
+def line_dict(row, product_name):
+    """A RETURNING row as the API's line dict, typed like a loaded InvoiceItem"""
+    line = dict(row._mapping, product_name=product_name)
+    # SQLite's RETURNING gives tax_percent as bound (5); a loaded line has the column's REAL (5.0)
+    if line['tax_percent'] is not None:
+        line['tax_percent'] = float(line['tax_percent'])
+    return line
+
+
+def _statement(connection, name):
+    dialect_name = connection.dialect.name
+    statements = _statements.get(dialect_name)
+    if statements is None:
+        statements = _statements[dialect_name] = _build(dialect_name)
+    return statements[name]
+
+
+def _touch(connection, invoice_id):
+    connection.execute(_statement(connection, 'touch'), {'invoice_id': invoice_id, 'now': datetime.utcnow()})
+
+
+def _quantity(data, default=None):
+    """A positive int quantity from the request body, or None"""
+    quantity = data.get('quantity', default)
+    if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity <= 0:
+        return None
+    return quantity
+
+
+def add_item(invoice_id, data):
+    """Add a product to a draft invoice. Returns the line dict, or None to use the ORM path."""
+    if not isinstance(data, dict):
+        return None
+    quantity = _quantity(data, 1)
+    if quantity is None:
+        return None
+    connection = db.session.connection()
+
+    if 'product_id' in data:
+        if isinstance(data['product_id'], bool) or not isinstance(data['product_id'], int):
+            return None
+        product = connection.execute(_statement(connection, 'product_by_id'),
+                                     {'invoice_id': invoice_id, 'product_id': data['product_id']}).first()
+    elif isinstance(data.get('barcode'), str):
+        product = connection.execute(_statement(connection, 'product_by_barcode'),
+                                     {'invoice_id': invoice_id, 'barcode': data['barcode']}).first()
+    else:
+        return None
+    if (product is None or product.status != 'draft' or not product.is_active or
+            product.stock_qty < quantity):
+        return None
+
+    subtotal = quantity * product.price
+    tax = tax_on(subtotal, product.tax_percent)
+    row = connection.execute(_statement(connection, 'upsert'), {
+        'invoice_id': invoice_id,
+        'product_id': product.id,
+        'quantity': quantity,
+        'unit_price': product.price,
+        'tax_percent': product.tax_percent,
+        'line_subtotal': subtotal,
+        'line_tax': tax,
+        'line_total': subtotal + tax,
+        'stock': product.stock_qty,
+    }).first()
+    if row is None:
+        # Nothing was written; the ORM path reports what is in the cart
+        return None
+    _touch(connection, invoice_id)
+    return line_dict(row, product.name)
+
+
+def update_item(invoice_id, item_id, data):
+    """Set a line's quantity. Returns the line dict, or None to use the ORM path."""
+    if not isinstance(data, dict):
+        return None
+    quantity = _quantity(data)
+    if quantity is None:
+        return None
+    connection = db.session.connection()
+
+    line = connection.execute(_statement(connection, 'line'),
+                              {'invoice_id': invoice_id, 'item_id': item_id}).first()
+    if line is None or line.status != 'draft' or line.stock_qty < quantity:
+        return None
+
+    subtotal = quantity * line.unit_price
+    tax = tax_on(subtotal, line.tax_percent)
+    row = connection.execute(_statement(connection, 'update'), {
+        'item_id': item_id,
+        'quantity': quantity,
+        'line_subtotal': subtotal,
+        'line_tax': tax,
+        'line_total': subtotal + tax,
+    }).first()
+    _touch(connection, invoice_id)
+    return line_dict(row, line.name)
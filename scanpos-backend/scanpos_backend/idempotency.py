@@ -0,0 +1,144 @@
+"""Idempotency-Key handling so clients can safely retry writes"""
+import hashlib
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, g, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+from .extensions import db
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def _fingerprint():
+    """Hash of what makes two requests "the same request\""""
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.path.encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _claim(key, user_id, fingerprint):
+    """Insert an in-progress record for the key, or return the existing one"""
+    now = datetime.utcnow()
+    record = IdempotencyKey(
+        key=key,
+        user_id=user_id,
+        request_hash=fingerprint,
+        expires_at=now + timedelta(seconds=current_app.config['IDEMPOTENCY_TTL_SECONDS'])
+    )
+    db.session.add(record)
+    try:
+        db.session.commit()
+        return record, True
+    except IntegrityError:
+        db.session.rollback()
+
+    existing = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+    if existing is None:
+        # Deleted between our insert and lookup; try once more
+        return _claim(key, user_id, fingerprint)
+
+    lock_expired = (
+        existing.status_code is None and
+        existing.created_at < now - timedelta(seconds=current_app.config['IDEMPOTENCY_LOCK_SECONDS'])
+    )
+    if existing.expires_at < now or lock_expired:
+        # Expired response, or a claim whose worker died: take it over
+        db.session.delete(existing)
+        db.session.commit()
+        return _claim(key, user_id, fingerprint)
+
+    return existing, False
+
+
+def idempotent(view):
+    """Replay the stored response when a request is retried with the same Idempotency-Key.
+
+    Must be applied under @jwt_required(); keys are scoped per user.
+    Requests without the header run normally. The view commits with
+    commit_writes(), so its changes and the stored response are committed
+    together.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 100:
+            return jsonify({'message': 'Idempotency-Key must be at most 100 characters'}), 400
+
+        fingerprint = _fingerprint()
+        record, claimed = _claim(key, int(get_jwt_identity()), fingerprint)
+
+        if not claimed:
+            if record.request_hash != fingerprint:
+                return jsonify({'message': 'Idempotency-Key was already used for a different request'}), 422
+            if record.status_code is None:
+                response = jsonify({'message': 'A request with this Idempotency-Key is still in progress'})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            response = make_response(record.response_body, record.status_code)
+            response.mimetype = 'application/json'
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        record_id = record.id
+        g.idempotency_key_id = record_id
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            _release(record_id)
+            raise
+        finally:
+            g.pop('idempotency_key_id', None)
+
+        if response.status_code >= 500:
+            # Let the client retry server errors for real
+            db.session.rollback()
+            _release(record_id)
+            return response
+
+        # The view's writes are still uncommitted: a retry either replays this
+        # response or finds nothing done
+        record = db.session.get(IdempotencyKey, record_id)
+        if record is not None:
+            record.status_code = response.status_code
+            record.response_body = response.get_data(as_text=True)
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            _release(record_id)
+            raise
+        return response
+
+    return wrapper
+
+
+def commit_writes():
+    """Commit the view's changes, or under an Idempotency-Key only flush them
+    for @idempotent to commit with the stored response"""
+    if g.get('idempotency_key_id') is None:
+        db.session.commit()
+    else:
+        db.session.flush()
+
+
+def _release(record_id):
+    record = db.session.get(IdempotencyKey, record_id)
+    if record is not None:
+        db.session.delete(record)
+        db.session.commit()
+
+
+def purge_expired_keys():
+    """Delete expired idempotency records. Returns the number removed."""
+    count = IdempotencyKey.query.filter(
+        IdempotencyKey.expires_at < datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return count
@@ -0,0 +1,253 @@
+"""Cross-worker cache invalidation over a polled DB table.
+
+Writers call `publish(topic, key)` inside their transaction: it adds a row
+to cache_invalidations and, once the session commits, invalidates the local
+caches at once (nothing is published if the transaction rolls back). Every
+worker runs a daemon thread that reads rows above the last id it has seen
+every INVALIDATION_POLL_SECONDS and dispatches them to its subscribers, so a
+change reaches all workers within that delay. No external service needed.
+
+Topics are entity types ('products', 'users', 'reports', 'customers'); the key is the
+entity id as a string, or None for "everything in this topic".
+"""
+import logging
+import os
+import secrets
+import socket
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import event, func
+from .extensions import db
+from .models import CacheInvalidation
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS = 'products'
+USERS = 'users'
+REPORTS = 'reports'
+CUSTOMERS = 'customers'
+
+
+class InvalidatingCache:
+    """Thread-safe LRU with a TTL, emptied by invalidation messages.
+
+    Entries carry tags (usually entity ids) so one message can drop every
+    entry derived from that entity, whatever the entry's own key is.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires, value, tags)
+        self._by_tag = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, tags=()):
+        tags = tuple(str(tag) for tag in tags)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value, tags)
+            for tag in tags:
+                self._by_tag[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, tag=None):
+        """Drop entries tagged with tag, or everything if tag is None"""
+        with self._lock:
+            if tag is None:
+                self._entries.clear()
+                self._by_tag.clear()
+                return
+            for key in list(self._by_tag.get(tag, ())):
+                self._drop(key)
+
+    def _drop(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class InvalidationBus:
+    """Per-process subscriber registry and poller"""
+
+    def __init__(self, poll_seconds, retention_seconds):
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self.version = None  # Highest CacheInvalidation.id dispatched
+        self.origin = None
+        self._subscribers = defaultdict(list)
+        self._pid = None
+        self._lock = threading.Lock()
+        self._last_poll = time.monotonic()
+
+    def subscribe(self, topic, callback):
+        """Call callback(key) whenever topic is invalidated; key None means all"""
+        self._subscribers[topic].append(callback)
+
+    def publish(self, topic, key=None):
+        """Queue an invalidation in the current transaction. The caller commits."""
+        key = None if key is None else str(key)
+        pending = db.session.info.setdefault('pending_invalidations', [])
+        if (topic, key) in pending:
+            return
+        db.session.add(CacheInvalidation(topic=topic, key=key, origin=self.origin))
+        pending.append((topic, key))
+
+    def dispatch(self, topic, key):
+        for callback in self._subscribers.get(topic, ()):
+            try:
+                callback(key)
+            except Exception:
+                logger.exception('Invalidation subscriber failed for %s:%s', topic, key)
+
+    def dispatch_all(self):
+        for topic in list(self._subscribers):
+            self.dispatch(topic, None)
+
+    def poll(self):
+        """Dispatch invalidations published by other workers"""
+        if self.version is None:
+            # Nothing before this process started can be in its caches
+            self.version = db.session.query(func.max(CacheInvalidation.id)).scalar() or 0
+            db.session.remove()
+            return 0
+
+        rows = db.session.query(
+            CacheInvalidation.id, CacheInvalidation.topic, CacheInvalidation.key, CacheInvalidation.origin
+        ).filter(CacheInvalidation.id > self.version).order_by(CacheInvalidation.id).all()
+        db.session.remove()
+
+        # After a long stall, rows this worker never saw may have been purged
+        stalled = time.monotonic() - self._last_poll > self.retention_seconds / 2
+        self._last_poll = time.monotonic()
+        if stalled:
+            logger.warning('Invalidation poller stalled; flushing all caches')
+            self.dispatch_all()
+        else:
+            for row in rows:
+                if row.origin != self.origin:
+                    self.dispatch(row.topic, row.key)
+        if rows:
+            self.version = rows[-1].id
+        return len(rows)
+
+    def ensure_started(self, app):
+        """Start the poller once per process (safe across fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.origin = f'{socket.gethostname()}:{self._pid}:{secrets.token_hex(4)}'
+        # A forked worker may hold entries cached before the fork
+        self.dispatch_all()
+        with app.app_context():
+            self.poll()
+        thread = threading.Thread(target=self._run, args=(app,), name='cache-invalidation-poll', daemon=True)
+        thread.start()
+
+    def _run(self, app):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.poll_seconds)
+            try:
+                with app.app_context():
+                    self.poll()
+            except Exception:
+                logger.exception('Cache invalidation poll failed')
+
+
+def get_bus():
+    """The invalidation bus of the current app"""
+    return current_app.extensions['invalidation']
+
+
+def get_cache(name):
+    """A named cache registered with init_invalidation"""
+    return current_app.extensions['caches'][name]
+
+
+def publish(topic, key=None):
+    """Queue an invalidation in the current transaction. The caller commits."""
+    get_bus().publish(topic, key)
+
+
+def purge_invalidations(older_than_seconds=None):
+    """Delete delivered invalidations. Returns the number removed."""
+    if older_than_seconds is None:
+        older_than_seconds = current_app.config['INVALIDATION_RETENTION_SECONDS']
+    count = CacheInvalidation.query.filter(
+        CacheInvalidation.created_at < datetime.utcnow() - timedelta(seconds=older_than_seconds)
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def _after_commit(session):
+    pending = session.info.pop('pending_invalidations', None)
+    if pending and has_app_context():
+        bus = current_app.extensions.get('invalidation')
+        if bus is not None:
+            for topic, key in pending:
+                bus.dispatch(topic, key)
+
+
+def _after_rollback(session):
+    session.info.pop('pending_invalidations', None)
+
+
+def init_invalidation(app):
+    """Create the bus and the shared caches, and start polling on first request"""
+    bus = app.extensions['invalidation'] = InvalidationBus(
+        app.config['INVALIDATION_POLL_SECONDS'], app.config['INVALIDATION_RETENTION_SECONDS']
+    )
+    max_entries, ttl = app.config['CACHE_MAX_ENTRIES'], app.config['CACHE_TTL_SECONDS']
+    caches = app.extensions['caches'] = {
+        'products_by_barcode': InvalidatingCache(max_entries, ttl),  # tagged by product id
+        'users': InvalidatingCache(max_entries, ttl),  # keyed by user id
+        'dashboard': InvalidatingCache(1, app.config['DASHBOARD_CACHE_SECONDS']),
+        'customers': InvalidatingCache(max_entries, ttl),  # keyed and tagged by customer id
+        'customer_lookups': InvalidatingCache(max_entries, app.config['CUSTOMER_LOOKUP_CACHE_SECONDS']),
+    }
+    bus.subscribe(PRODUCTS, caches['products_by_barcode'].invalidate)
+    bus.subscribe(USERS, caches['users'].invalidate)
+    # The dashboard shows sales and low stock: any change to either empties it
+    bus.subscribe(REPORTS, lambda key: caches['dashboard'].invalidate())
+    bus.subscribe(PRODUCTS, lambda key: caches['dashboard'].invalidate())
+    bus.subscribe(CUSTOMERS, caches['customers'].invalidate)
+    # Any new or renamed customer can change any search result
+    bus.subscribe(CUSTOMERS, lambda key: caches['customer_lookups'].invalidate())
+    bus.subscribe(CUSTOMERS, lambda key: caches['dashboard'].invalidate())
+    bus.subscribe(REPORTS, lambda key: caches['customer_lookups'].invalidate('recent'))
+
+    if not event.contains(db.session, 'after_commit', _after_commit):
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
+
+    @app.before_request
+    def start_invalidation_poller():
+        bus.ensure_started(app)
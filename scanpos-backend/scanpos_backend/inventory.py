@@ -0,0 +1,137 @@
+"""Inventory helpers shared by the product and invoice routes"""
+from datetime import datetime
+from sqlalchemy import exists, func, insert, literal, select, update
+from .extensions import db
+from .models import Product, LowStockAlert, StockMovement
+from .invalidation import PRODUCTS, publish
+
+
+def record_movement(product, quantity, reason, invoice_id=None, user_id=None, note=None):
+    """Append a stock change to the ledger.
+
+    Writers only insert, so concurrent sales of the same product never
+    update a shared row. The caller commits.
+    """
+    movement = StockMovement(
+        product_id=product.id,
+        quantity=quantity,
+        reason=reason,
+        invoice_id=invoice_id,
+        user_id=user_id,
+        note=note
+    )
+    db.session.add(movement)
+    # Reload current stock on next access
+    db.session.expire(product, ['stock_qty'])
+    publish(PRODUCTS, product.id)
+    return movement
+
+
+def take_stock(product, quantity, reason, invoice_id=None, user_id=None, note=None):
+    """Append a decrement to the ledger only if the product has that much stock.
+
+    The check and the append are a single INSERT ... SELECT, which SQLite runs
+    under the database write lock, so two concurrent sales cannot both pass
+    the check. Returns False, recording nothing, when stock is short; the
+    caller then rolls back any lines it already took. The caller commits.
+    """
+    result = db.session.execute(
+        insert(StockMovement).from_select(
+            ['product_id', 'quantity', 'reason', 'invoice_id', 'user_id', 'note', 'created_at'],
+            select(
+                Product.id, literal(-quantity), literal(reason), literal(invoice_id),
+                literal(user_id), literal(note), literal(datetime.utcnow())
+            ).where(Product.id == product.id, Product.stock_qty >= quantity)
+        )
+    )
+    if not result.rowcount:
+        return False
+    # Reload current stock on next access
+    db.session.expire(product, ['stock_qty'])
+    publish(PRODUCTS, product.id)
+    return True
+
+
+def stock_at(product, at):
+    """Get a product's stock level at a point in time"""
+    later = db.session.query(
+        func.coalesce(func.sum(StockMovement.quantity), 0)
+    ).filter(
+        StockMovement.product_id == product.id,
+        StockMovement.created_at > at
+    ).scalar()
+    return product.stock_qty - later
+
+
+def compact_stock_movements():
+    """Fold pending ledger entries into the product snapshots.
+
+    Runs as one set-based UPDATE touching only products with pending
+    entries. Returns the number of products compacted.
+    """
+    high = db.session.query(func.max(StockMovement.id)).scalar()
+    if not high:
+        return 0
+
+    in_range = (
+        StockMovement.product_id == Product.id,
+        StockMovement.id > Product.stock_watermark,
+        StockMovement.id <= high
+    )
+    delta = select(
+        func.coalesce(func.sum(StockMovement.quantity), 0)
+    ).where(*in_range).correlate(Product).scalar_subquery()
+
+    result = db.session.execute(
+        update(Product)
+        .where(exists().where(*in_range).correlate(Product))
+        .values({
+            Product.stock_snapshot: Product.stock_snapshot + delta,
+            Product.stock_watermark: high
+        })
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def is_low_stock(product):
+    """Check if an active product has dropped below its reorder level"""
+    return bool(product.is_active) and product.stock_qty < product.reorder_level
+
+
+def sync_low_stock(products):
+    """Add or remove low-stock alerts for products whose stock just changed.
+
+    Only the given products are touched, so the cost is proportional to the
+    number of products in the change, not the catalog size. The caller commits.
+    """
+    products = [p for p in products if p is not None]
+    if not products:
+        return
+
+    product_ids = [p.id for p in products]
+    existing = {
+        alert.product_id: alert
+        for alert in LowStockAlert.query.filter(LowStockAlert.product_id.in_(product_ids))
+    }
+
+    for product in products:
+        alert = existing.get(product.id)
+        if is_low_stock(product):
+            if alert is None:
+                db.session.add(LowStockAlert(product_id=product.id))
+        elif alert is not None:
+            db.session.delete(alert)
+
+
+def rebuild_low_stock():
+    """Rebuild the whole low-stock set from the products table"""
+    LowStockAlert.query.delete()
+    low_ids = db.session.query(Product.id).filter(
+        Product.is_active == True,
+        Product.stock_qty < Product.reorder_level
+    ).all()
+    db.session.add_all([LowStockAlert(product_id=row.id) for row in low_ids])
+    db.session.commit()
+    return len(low_ids)
@@ -0,0 +1,518 @@
+"""Background jobs: a DB-backed queue and a process-pool runner.
+
+Requests submit a job row and return at once; `flask jobs-worker` claims
+queued jobs by priority, runs them in a pool of worker processes and records
+the outcome. Result files are written under JOB_RESULTS_DIR/<job id>/.
+The runner heartbeats the jobs it holds; a job whose heartbeat stops (the
+runner was killed or the box restarted) is requeued by the next runner and
+runs again from the start, so job kinds must be safe to re-run.
+"""
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from .extensions import db
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Registered job kinds: name -> {'run', 'validate', 'priority', 'admin_only'}
+JOB_KINDS = {}
+
+ACTIVE = (Job.QUEUED, Job.RUNNING)
+
+
+def job_kind(name, priority=0, admin_only=False, validate=None):
+    """Register a job function.
+
+    The function is called in a worker process, inside an app context, as
+    `run(params, output_dir)` and returns a dict with an optional result
+    'file' (written into output_dir), its 'mimetype' and a JSON 'summary'.
+    `validate(params)` runs at submit time and raises ValueError on bad input.
+    """
+    def register(run):
+        JOB_KINDS[name] = {'run': run, 'validate': validate, 'priority': priority, 'admin_only': admin_only}
+        return run
+    return register
+
+
+def submit_job(kind, params=None, user_id=None, priority=None):
+    """Queue a job and commit. Raises ValueError for unknown kinds or bad params."""
+    spec = JOB_KINDS.get(kind)
+    if spec is None:
+        raise ValueError(f'Unknown job kind: {kind}')
+    params = params or {}
+    if spec['validate']:
+        spec['validate'](params)
+
+    job = Job(
+        kind=kind,
+        params=json.dumps(params),
+        priority=spec['priority'] if priority is None else priority,
+        user_id=user_id
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def cancel_job(job):
+    """Cancel a queued job. Returns False if it already started."""
+    updated = Job.query.filter_by(id=job.id, status=Job.QUEUED).update(
+        {'status': Job.CANCELLED, 'finished_at': datetime.utcnow()}, synchronize_session=False
+    )
+    db.session.commit()
+    db.session.refresh(job)
+    return bool(updated)
+
+
+def result_path(job):
+    """Absolute path of a completed job's result file, or None"""
+    if not job.result_file:
+        return None
+    return os.path.join(current_app.config['JOB_RESULTS_DIR'], str(job.id), job.result_file)
+
+
+def purge_finished_jobs(older_than_hours=None):
+    """Delete finished jobs and their result files. Returns the number removed."""
+    if older_than_hours is None:
+        older_than_hours = current_app.config['JOB_RETENTION_HOURS']
+    cutoff = datetime.utcnow() - timedelta(hours=older_than_hours)
+
+    jobs = Job.query.filter(~Job.status.in_(ACTIVE), Job.finished_at < cutoff).all()
+    for job in jobs:
+        shutil.rmtree(os.path.join(current_app.config['JOB_RESULTS_DIR'], str(job.id)), ignore_errors=True)
+        db.session.delete(job)
+    db.session.commit()
+    return len(jobs)
+
+
+# -- worker processes --------------------------------------------------------
+
+_worker_app = None
+
+
+def _init_process(config):
+    """Pool initializer: each worker process builds its own app and engine"""
+    global _worker_app
+    # Ctrl-C goes to the whole process group; let the runner drain instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from . import create_app
+    from .config import Config
+    _worker_app = create_app(type('JobConfig', (Config,), config))
+
+
+def _execute(job_id):
+    """Run one job in a worker process"""
+    with _worker_app.app_context():
+        job = db.session.get(Job, job_id)
+        output_dir = os.path.join(current_app.config['JOB_RESULTS_DIR'], str(job_id))
+        # A resumed job starts over from an empty directory
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.makedirs(output_dir)
+        try:
+            return JOB_KINDS[job.kind]['run'](json.loads(job.params or '{}'), output_dir) or {}
+        finally:
+            db.session.remove()
+
+
+# -- runner ------------------------------------------------------------------
+
+class JobRunner:
+    """Claims queued jobs and runs them in a process pool"""
+
+    def __init__(self, app, max_workers=None):
+        self.app = app
+        self.config = app.config
+        self.max_workers = max_workers or self.config['JOB_MAX_WORKERS']
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.running = {}  # job id -> future
+        self.stopping = False
+        self._executor = None
+        self._last_heartbeat = 0.0
+        self._next_due = {}
+
+    def _start_pool(self):
+        from .config import Config
+        config = {key: self.config[key] for key in dir(Config) if key.isupper() and key in self.config}
+        # spawn, not fork: workers must not share the runner's DB connections
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_process,
+            initargs=(config,)
+        )
+
+    def run(self, once=False):
+        """Process jobs until stopped, or until the queue is empty if once=True"""
+        self._start_pool()
+        try:
+            while True:
+                self.requeue_stale()
+                if not self.stopping:
+                    self.schedule_due()
+                    self.claim_jobs()
+                self.collect()
+                self.heartbeat()
+                if not self.running and (self.stopping or (once and not self._has_queued())):
+                    break
+                time.sleep(self.config['JOB_POLL_SECONDS'])
+        finally:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def stop(self, *args):
+        """Stop claiming new jobs; running ones finish first"""
+        self.stopping = True
+
+    def _has_queued(self):
+        return db.session.query(Job.id).filter(Job.status == Job.QUEUED).first() is not None
+
+    def claim_jobs(self):
+        """Start queued jobs while there are free workers and kind limits allow"""
+        while len(self.running) < self.max_workers:
+            job = self._claim_next()
+            if job is None:
+                return
+            try:
+                self.running[job.id] = self._executor.submit(_execute, job.id)
+            except BrokenProcessPool:
+                self._requeue(job, 'Worker process died')
+                self._restart_pool()
+                return
+
+    def _claim_next(self):
+        limits = self.config['JOB_KIND_LIMITS']
+        running = dict(
+            db.session.query(Job.kind, func.count(Job.id)).filter(Job.status == Job.RUNNING).group_by(Job.kind)
+        )
+        blocked = [kind for kind, limit in limits.items() if running.get(kind, 0) >= limit]
+
+        while True:
+            candidate = db.session.query(Job.id).filter(
+                Job.status == Job.QUEUED, Job.kind.in_(list(JOB_KINDS)), ~Job.kind.in_(blocked)
+            ).order_by(Job.priority.desc(), Job.id).first()
+            if candidate is None:
+                return None
+
+            # Another runner may claim the same row; only one UPDATE wins
+            now = datetime.utcnow()
+            claimed = Job.query.filter_by(id=candidate.id, status=Job.QUEUED).update({
+                'status': Job.RUNNING,
+                'worker': self.name,
+                'attempts': Job.attempts + 1,
+                'started_at': now,
+                'heartbeat_at': now,
+                'error': None
+            }, synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                return db.session.get(Job, candidate.id)
+
+    def collect(self):
+        """Record the outcome of finished jobs"""
+        broken = False
+        for job_id, future in list(self.running.items()):
+            if not future.done():
+                continue
+            del self.running[job_id]
+            job = db.session.get(Job, job_id)
+            if job is None or job.status != Job.RUNNING or job.worker != self.name:
+                continue  # Deleted, or requeued and taken over by another runner
+
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                # A worker process died; the job is retried like after a restart
+                broken = True
+                self._requeue(job, 'Worker process died')
+                continue
+            except Exception as e:
+                logger.exception('Job %s (%s) failed', job.id, job.kind)
+                job.status = Job.FAILED
+                job.error = f'{type(e).__name__}: {e}'
+            else:
+                job.status = Job.COMPLETED
+                job.result_file = result.get('file')
+                job.result_type = result.get('mimetype')
+                job.summary = json.dumps(result['summary']) if result.get('summary') is not None else None
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+        if broken:
+            self._restart_pool()
+
+    def _restart_pool(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for job_id in list(self.running):
+            job = db.session.get(Job, job_id)
+            if job is not None and job.status == Job.RUNNING:
+                self._requeue(job, 'Worker process died')
+        self.running.clear()
+        self._start_pool()
+
+    def _requeue(self, job, reason):
+        if job.attempts >= self.config['JOB_MAX_ATTEMPTS']:
+            job.status = Job.FAILED
+            job.error = f'{reason} ({job.attempts} attempts)'
+            job.finished_at = datetime.utcnow()
+        else:
+            job.status = Job.QUEUED
+            job.error = reason
+        job.worker = None
+        db.session.commit()
+
+    def heartbeat(self):
+        """Extend the lease on the jobs this runner holds"""
+        now = time.monotonic()
+        if not self.running or now - self._last_heartbeat < self.config['JOB_LEASE_SECONDS'] / 4:
+            return
+        Job.query.filter(Job.id.in_(list(self.running)), Job.worker == self.name).update(
+            {'heartbeat_at': datetime.utcnow()}, synchronize_session=False
+        )
+        db.session.commit()
+        self._last_heartbeat = now
+
+    def requeue_stale(self):
+        """Requeue running jobs whose runner stopped heartbeating"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.config['JOB_LEASE_SECONDS'])
+        stale = Job.query.filter(Job.status == Job.RUNNING, Job.heartbeat_at < cutoff).all()
+        for job in stale:
+            logger.warning('Requeueing job %s (%s) abandoned by %s', job.id, job.kind, job.worker)
+            self._requeue(job, f'Interrupted on {job.worker}')
+
+    def schedule_due(self):
+        """Queue scheduled maintenance jobs whose interval has passed"""
+        now = time.monotonic()
+        for kind, interval in self.config['JOB_SCHEDULE'].items():
+            if kind not in JOB_KINDS or self._next_due.get(kind, 0) > now:
+                continue
+            last = Job.query.filter_by(kind=kind).order_by(Job.created_at.desc()).first()
+            if last is not None and last.status in ACTIVE:
+                self._next_due[kind] = now + interval
+                continue
+            age = (datetime.utcnow() - last.created_at).total_seconds() if last else interval
+            if age >= interval:
+                submit_job(kind)
+                age = 0
+            self._next_due[kind] = now + interval - age
+
+
+def run_worker(app, max_workers=None, once=False):
+    """Run the job runner in the foreground; SIGTERM and Ctrl-C drain it"""
+    runner = JobRunner(app, max_workers=max_workers)
+    signal.signal(signal.SIGTERM, runner.stop)
+    try:
+        runner.run(once=once)
+    except KeyboardInterrupt:
+        runner.stop()
+        runner.run(once=True)
+    return runner
+
+
+# -- job kinds ---------------------------------------------------------------
+
+def _parse_day(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid {name} format. Use YYYY-MM-DD')
+
+
+def _validate_range(params):
+    _parse_day(params.get('from'), 'from date')
+    _parse_day(params.get('to'), 'to date')
+
+
+def _write_json(output_dir, name, payload):
+    tmp = os.path.join(output_dir, name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp, os.path.join(output_dir, name))
+
+
+@job_kind('sales_report', priority=10, validate=_validate_range)
+def sales_report_job(params, output_dir):
+    """Sales report over any date range, as JSON"""
+    from .routes.reports import sales_report_data
+    report = sales_report_data(
+        _parse_day(params['from'], 'from date'), _parse_day(params['to'], 'to date'),
+        limit=int(params.get('limit', 10))
+    )
+    _write_json(output_dir, 'sales_report.json', report)
+    return {
+        'file': 'sales_report.json',
+        'mimetype': 'application/json',
+        'summary': {key: report[key] for key in ('total_sales', 'invoice_count')}
+    }
+
+
+@job_kind('invoices_export', priority=5, validate=_validate_range)
+def invoices_export_job(params, output_dir):
+    """Live and archived invoices in a date range, as CSV"""
+    from .models import Invoice, ArchivedInvoice
+    from_date = _parse_day(params['from'], 'from date')
+    to_date = _parse_day(params['to'], 'to date') + timedelta(days=1)
+    status = params.get('status')
+
+    name = f"invoices_{params['from']}_{params['to']}.csv"
+    tmp = os.path.join(output_dir, name + '.tmp')
+    rows = 0
+    with open(tmp, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['invoice_number', 'created_at', 'status', 'customer_id',
+                         'subtotal_amount', 'total_tax', 'discount_amount', 'total_amount'])
+        for model in (ArchivedInvoice, Invoice):
+            query = db.session.query(
+                model.invoice_number, model.created_at, model.status, model.customer_id,
+                model.subtotal_amount, model.total_tax, model.discount_amount, model.total_amount
+            ).filter(model.created_at >= from_date, model.created_at < to_date)
+            if status:
+                query = query.filter(model.status == status)
+            for row in query.order_by(model.created_at).yield_per(1000):
+                writer.writerow([row[0], row[1].isoformat(), *row[2:]])
+                rows += 1
+    os.replace(tmp, os.path.join(output_dir, name))
+    return {'file': name, 'mimetype': 'text/csv', 'summary': {'rows': rows}}
+
+
+@job_kind('day_summary', priority=5, validate=lambda params: _parse_day(params.get('date'), 'date'))
+def day_summary_job(params, output_dir):
+    """End-of-day summary: totals, hourly counts and best sellers, as JSON"""
+    from .archive import sales_totals, top_products
+    from .models import Invoice, StockMovement
+    day = _parse_day(params['date'], 'date')
+    day_end = day + timedelta(days=1)
+
+    total_sales, total_tax, total_discount, invoice_count = sales_totals(day, day_end)
+    hourly = [0] * 24
+    for (created_at,) in db.session.query(Invoice.created_at).filter(
+        Invoice.status == 'completed', Invoice.created_at >= day, Invoice.created_at < day_end
+    ):
+        hourly[created_at.hour] += 1
+    voided = db.session.query(func.count(func.distinct(StockMovement.invoice_id))).filter(
+        StockMovement.reason == StockMovement.RETURN,
+        StockMovement.created_at >= day, StockMovement.created_at < day_end
+    ).scalar()
+    drafts = Invoice.query.filter(
+        Invoice.status == 'draft', Invoice.created_at >= day, Invoice.created_at < day_end
+    ).count()
+
+    summary = {
+        'date': params['date'],
+        'total_sales': float(total_sales),
+        'total_tax': float(total_tax),
+        'total_discount': float(total_discount),
+        'invoice_count': invoice_count,
+        'voided_count': voided,
+        'open_drafts': drafts,
+        'hourly_invoice_count': hourly,
+        'top_products': top_products(day, day_end, limit=20)
+    }
+    _write_json(output_dir, f"day_summary_{params['date']}.json", summary)
+    return {
+        'file': f"day_summary_{params['date']}.json",
+        'mimetype': 'application/json',
+        'summary': {key: summary[key] for key in ('total_sales', 'invoice_count', 'voided_count')}
+    }
+
+
+# Maintenance, mirroring the `flask` CLI commands
+
+@job_kind('compact_stock', admin_only=True)
+def compact_stock_job(params, output_dir):
+    from .inventory import compact_stock_movements
+    return {'summary': {'products': compact_stock_movements()}}
+
+
+@job_kind('rebuild_low_stock', admin_only=True)
+def rebuild_low_stock_job(params, output_dir):
+    from .inventory import rebuild_low_stock
+    return {'summary': {'low_stock': rebuild_low_stock()}}
+
+
+@job_kind('archive_invoices', admin_only=True)
+def archive_invoices_job(params, output_dir):
+    from .archive import archive_invoices
+    return {'summary': {'archived': archive_invoices(
+        older_than_days=params.get('older_than_days'), batch_size=params.get('batch_size')
+    )}}
+
+
+@job_kind('analytics_refresh', admin_only=True)
+def analytics_refresh_job(params, output_dir):
+    from .analytics import get_store
+    store = get_store(current_app.config['ANALYTICS_DIR'])
+    return {'summary': {'exported': store.refresh(full=bool(params.get('full')))}}
+
+
+@job_kind('purge_idempotency_keys', admin_only=True)
+def purge_idempotency_keys_job(params, output_dir):
+    from .idempotency import purge_expired_keys
+    return {'summary': {'purged': purge_expired_keys()}}
+
+
+@job_kind('purge_token_revocations', admin_only=True)
+def purge_token_revocations_job(params, output_dir):
+    from .revocation import purge_expired_revocations
+    return {'summary': {'purged': purge_expired_revocations()}}
+
+
+@job_kind('purge_invalidations', admin_only=True)
+def purge_invalidations_job(params, output_dir):
+    from .invalidation import purge_invalidations
+    return {'summary': {'purged': purge_invalidations()}}
+
+
+def _validate_sweep(params):
+    from .drafts import validate_sweep
+    validate_sweep(params)
+
+
+@job_kind('sweep_drafts', admin_only=True, validate=_validate_sweep)
+def sweep_drafts_job(params, output_dir):
+    from .drafts import sweep_abandoned_drafts
+    return {'summary': sweep_abandoned_drafts(
+        idle_minutes=params.get('idle_minutes'), batch_size=params.get('batch_size'), action=params.get('action')
+    )}
+
+
+@job_kind('backup_databases', admin_only=True)
+def backup_databases_job(params, output_dir):
+    from .backup import backup_databases
+    manifest = backup_databases()
+    return {'summary': {
+        'name': manifest['name'],
+        'rotated': manifest['rotated'],
+        'databases': {label: {key: entry[key] for key in ('file', 'bytes', 'compressed_bytes', 'restarts')}
+                      for label, entry in manifest['databases'].items()}
+    }}
+
+
+@job_kind('verify_backup', admin_only=True)
+def verify_backup_job(params, output_dir):
+    from .backup import verify_backup
+    result = verify_backup(params.get('name'))
+    if not result['ok']:
+        raise RuntimeError(f'Backup {result["name"]} failed verification: {"; ".join(result["problems"])}')
+    return {'summary': result}
+
+
+@job_kind('compact_outbox', admin_only=True)
+def compact_outbox_job(params, output_dir):
+    from .outbox import compact_outbox, purge_outbox
+    return {'summary': {'compacted': compact_outbox(), 'purged': purge_outbox()}}
+
+
+@job_kind('purge_jobs', admin_only=True)
+def purge_jobs_job(params, output_dir):
+    return {'summary': {'purged': purge_finished_jobs()}}
@@ -1,5 +1,8 @@
+import json
 from .extensions import db
+from .money import Money, to_minor, from_minor, tax_on
 from datetime import datetime
+from sqlalchemy import func, select
 from werkzeug.security import generate_password_hash, check_password_hash
 
 
@@ -35,6 +38,65 @@ class User(db.Model):
         }
 
 
+class TokenRevocation(db.Model):
+    """Revoked JWTs: one token by jti, or every token of a user issued up to a time"""
+    __tablename__ = 'token_revocations'
+    
+    # The id doubles as the denylist version workers sync from, so it must never be reused
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(64), nullable=True, unique=True)
+    user_id = db.Column(db.Integer, nullable=True)
+    issued_until = db.Column(db.Integer, nullable=True)  # Epoch seconds; user tokens with iat <= this are revoked
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # When the entry stops mattering
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = {'sqlite_autoincrement': True}
+
+
+class CacheInvalidation(db.Model):
+    """Entity-level cache invalidations, polled by every worker"""
+    __tablename__ = 'cache_invalidations'
+    
+    # The id is the bus version workers poll from, so it must never be reused
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(50), nullable=False)  # 'products', 'users', 'reports'
+    key = db.Column(db.String(100), nullable=True)  # Entity id; null invalidates the whole topic
+    origin = db.Column(db.String(100), nullable=True)  # host:pid:nonce of the publishing worker
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    __table_args__ = {'sqlite_autoincrement': True}
+
+
+class OutboxEvent(db.Model):
+    """Change event for downstream systems, written in the transaction that made the change"""
+    __tablename__ = 'outbox_events'
+    
+    # The id is the feed sequence consumers resume from, so it must never be reused
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(50), nullable=False)  # e.g. 'invoice.completed', 'product.updated'
+    entity = db.Column(db.String(20), nullable=False)  # 'invoice' or 'product'
+    entity_id = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON snapshot of the entity after the change
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    __table_args__ = (
+        # Compaction looks for a later event of the same entity
+        db.Index('ix_outbox_events_entity', 'entity', 'entity_id', 'id'),
+        {'sqlite_autoincrement': True}
+    )
+    
+    def to_dict(self):
+        """Convert event to dictionary"""
+        return {
+            'seq': self.id,
+            'type': self.event_type,
+            'entity': self.entity,
+            'entity_id': self.entity_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'data': json.loads(self.payload)
+        }
+
+
 class Product(db.Model):
     """Product model for inventory management"""
     __tablename__ = 'products'
@@ -42,11 +104,21 @@ class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     barcode = db.Column(db.String(100), unique=True, nullable=True, index=True)
-    price = db.Column(db.Float, nullable=False)
+    price = db.Column(Money, nullable=False)
     tax_percent = db.Column(db.Float, default=0.0)
-    stock_qty = db.Column(db.Integer, default=0)
+    # Compacted stock level; current stock (`stock_qty`) adds the pending ledger
+    # entries on top, see StockMovement below
+    stock_snapshot = db.Column('stock_qty', db.Integer, default=0)
+    stock_watermark = db.Column(db.Integer, nullable=False, default=0)  # last stock_movements.id folded into the snapshot
+    reorder_level = db.Column(db.Integer, nullable=False, default=10)  # low stock when stock_qty < reorder_level
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Catalog version: set from a global counter on every insert and catalog
+    # change (not on stock changes), so terminals can sync deltas
+    row_version = db.Column(db.Integer, nullable=True, unique=True, index=True)
+    
+    # Fields terminals mirror; changing any of them bumps row_version
+    CATALOG_FIELDS = ('name', 'barcode', 'price', 'tax_percent', 'reorder_level', 'is_active')
     
     # Relationship to invoice items
     invoice_items = db.relationship('InvoiceItem', back_populates='product', lazy='dynamic')
@@ -60,11 +132,161 @@ class Product(db.Model):
             'price': self.price,
             'tax_percent': self.tax_percent,
             'stock_qty': self.stock_qty,
+            'reorder_level': self.reorder_level,
             'is_active': self.is_active,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
 
+class LowStockAlert(db.Model):
+    """Products currently below their reorder level, maintained as stock changes"""
+    __tablename__ = 'low_stock_alerts'
+    
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    product = db.relationship('Product')
+
+
+class StockMovement(db.Model):
+    """Append-only inventory ledger: one row per stock change"""
+    __tablename__ = 'stock_movements'
+    
+    SALE = 'sale'
+    RETURN = 'return'
+    ADJUSTMENT = 'adjustment'
+    IMPORT = 'import'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)  # signed delta: negative for sales
+    reason = db.Column(db.String(20), nullable=False)  # 'sale', 'return', 'adjustment', 'import'
+    invoice_id = db.Column(db.Integer, nullable=True, index=True)  # no FK, entries outlive deleted invoices
+    user_id = db.Column(db.Integer, nullable=True)
+    note = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Pending-delta sums per product (covering)
+        db.Index('ix_stock_movements_product_id', 'product_id', 'id', 'quantity'),
+        # Point-in-time stock per product (covering)
+        db.Index('ix_stock_movements_product_time', 'product_id', 'created_at', 'quantity'),
+    )
+    
+    def to_dict(self):
+        """Convert stock movement to dictionary"""
+        return {
+            'id': self.id,
+            'product_id': self.product_id,
+            'quantity': self.quantity,
+            'reason': self.reason,
+            'invoice_id': self.invoice_id,
+            'user_id': self.user_id,
+            'note': self.note,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+def _next_catalog_version():
+    # Evaluated inside the INSERT/UPDATE, i.e. under SQLite's write lock, so
+    # versions are handed out in commit order
+    return select(func.coalesce(func.max(Product.row_version), 0) + 1).scalar_subquery()
+
+
+@db.event.listens_for(Product, 'before_insert')
+def _version_new_product(mapper, connection, target):
+    target.row_version = _next_catalog_version()
+
+
+@db.event.listens_for(Product, 'before_update')
+def _version_changed_product(mapper, connection, target):
+    state = db.inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in Product.CATALOG_FIELDS):
+        target.row_version = _next_catalog_version()
+
+
+# Current stock = compacted snapshot + ledger entries recorded after the watermark.
+# Loaded with the product in the same SELECT, so reads stay a single query.
+Product.stock_qty = db.column_property(
+    Product.stock_snapshot + select(
+        func.coalesce(func.sum(StockMovement.quantity), 0)
+    ).where(
+        StockMovement.product_id == Product.id,
+        StockMovement.id > Product.stock_watermark
+    ).correlate_except(StockMovement).scalar_subquery()
+)
+
+
+class IdempotencyKey(db.Model):
+    """Stored response for a client-supplied Idempotency-Key"""
+    __tablename__ = 'idempotency_keys'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(100), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)  # method, path and body fingerprint
+    status_code = db.Column(db.Integer, nullable=True)  # None while the request is in progress
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_keys_user_key'),
+    )
+
+
+class Job(db.Model):
+    """Background job run by the `flask jobs-worker` process pool"""
+    __tablename__ = 'jobs'
+    
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=True)  # JSON
+    status = db.Column(db.String(20), nullable=False, default=QUEUED)
+    priority = db.Column(db.Integer, nullable=False, default=0)  # Higher runs first
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # None for scheduled jobs
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker = db.Column(db.String(100), nullable=True)  # host:pid of the runner holding the lease
+    result_file = db.Column(db.String(255), nullable=True)  # Name inside the job's result directory
+    result_type = db.Column(db.String(100), nullable=True)
+    summary = db.Column(db.Text, nullable=True)  # JSON
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_jobs_status_priority', 'status', 'priority', 'id'),
+        db.Index('ix_jobs_kind_created', 'kind', 'created_at'),
+        db.Index('ix_jobs_user_id', 'user_id'),
+    )
+    
+    def to_dict(self):
+        """Convert job to dictionary"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'params': json.loads(self.params) if self.params else {},
+            'status': self.status,
+            'priority': self.priority,
+            'user_id': self.user_id,
+            'attempts': self.attempts,
+            'summary': json.loads(self.summary) if self.summary else None,
+            'error': self.error,
+            'result_url': f'/api/jobs/{self.id}/result' if self.result_file and self.status == self.COMPLETED else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
 class Customer(db.Model):
     """Customer model (optional for v1)"""
     __tablename__ = 'customers'
@@ -72,11 +294,14 @@ class Customer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(20), nullable=True)
+    # Digits of `phone` only, for indexed prefix lookups at the till
+    phone_digits = db.Column(db.String(20), nullable=True, index=True)
     address = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationship to invoices
     invoices = db.relationship('Invoice', back_populates='customer', lazy='dynamic')
+    name_tokens = db.relationship('CustomerNameToken', cascade='all, delete-orphan')
     
     def to_dict(self):
         """Convert customer to dictionary"""
@@ -89,30 +314,67 @@ class Customer(db.Model):
         }
 
 
+class CustomerNameToken(db.Model):
+    """Lowercased words of a customer's name, for indexed name-prefix lookups"""
+    __tablename__ = 'customer_name_tokens'
+    
+    # The primary key is the lookup index: token prefix range, then customer
+    token = db.Column(db.String(50), primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id', ondelete='CASCADE'), primary_key=True)
+    
+    __table_args__ = (
+        db.Index('ix_customer_name_tokens_customer', 'customer_id', 'token'),
+    )
+
+
 class Invoice(db.Model):
     """Invoice model for billing"""
     __tablename__ = 'invoices'
     
     id = db.Column(db.Integer, primary_key=True)
     invoice_number = db.Column(db.String(50), unique=True, nullable=False, index=True)
+    # invoice_number reversed, so suffix searches ("...-0042") are index prefix ranges
+    number_reversed = db.Column(
+        db.String(50), nullable=True, index=True,
+        default=lambda context: context.get_current_parameters()['invoice_number'][::-1]
+    )
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=True)
+    # Terminal-generated id of a sale uploaded after going offline, for deduplication
+    client_id = db.Column(db.String(64), nullable=True, unique=True, index=True)
     status = db.Column(db.String(20), default='draft')  # 'draft', 'completed', 'cancelled'
-    subtotal_amount = db.Column(db.Float, default=0.0)
-    total_tax = db.Column(db.Float, default=0.0)
-    discount_amount = db.Column(db.Float, default=0.0)
-    total_amount = db.Column(db.Float, default=0.0)
+    subtotal_amount = db.Column(Money, default=0.0)
+    total_tax = db.Column(Money, default=0.0)
+    discount_amount = db.Column(Money, default=0.0)
+    total_amount = db.Column(Money, default=0.0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # Listing and report filters; the money columns make the report sums index-only
+        db.Index('ix_invoices_status_created', 'status', 'created_at',
+                 'total_amount', 'total_tax', 'discount_amount'),
+        # Unfiltered listing, newest first
+        db.Index('ix_invoices_created_at', 'created_at'),
+        # Search by customer or by amount range, newest first
+        db.Index('ix_invoices_customer_created', 'customer_id', 'created_at'),
+        db.Index('ix_invoices_total_created', 'total_amount', 'created_at'),
+        # Never reuse ids: archived invoices keep theirs in the archive database
+        {'sqlite_autoincrement': True}
+    )
+    
     # Relationships
     customer = db.relationship('Customer', back_populates='invoices')
     items = db.relationship('InvoiceItem', back_populates='invoice', lazy='dynamic', cascade='all, delete-orphan')
     
     def calculate_totals(self):
         """Calculate and update invoice totals from items"""
-        self.subtotal_amount = sum(item.line_subtotal for item in self.items)
-        self.total_tax = sum(item.line_tax for item in self.items)
-        self.total_amount = self.subtotal_amount + self.total_tax - self.discount_amount
+        # Summed in minor units so the totals match the SQL SUMs exactly
+        items = self.items.all()
+        subtotal = sum(to_minor(item.line_subtotal) for item in items)
+        tax = sum(to_minor(item.line_tax) for item in items)
+        self.subtotal_amount = from_minor(subtotal)
+        self.total_tax = from_minor(tax)
+        self.total_amount = from_minor(subtotal + tax - to_minor(self.discount_amount or 0))
     
     def to_dict(self, include_items=False):
         """Convert invoice to dictionary"""
@@ -143,11 +405,21 @@ class InvoiceItem(db.Model):
     invoice_id = db.Column(db.Integer, db.ForeignKey('invoices.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False, default=1)
-    unit_price = db.Column(db.Float, nullable=False)
+    unit_price = db.Column(Money, nullable=False)
     tax_percent = db.Column(db.Float, default=0.0)
-    line_subtotal = db.Column(db.Float, default=0.0)
-    line_tax = db.Column(db.Float, default=0.0)
-    line_total = db.Column(db.Float, default=0.0)
+    line_subtotal = db.Column(Money, default=0.0)
+    line_tax = db.Column(Money, default=0.0)
+    line_total = db.Column(Money, default=0.0)
+    
+    __table_args__ = (
+        # One line per product per invoice; adding a product again is an upsert
+        db.Index('uq_invoice_items_invoice_product', 'invoice_id', 'product_id', unique=True),
+        # Lets the report join read items without touching the table
+        db.Index('ix_invoice_items_invoice_cover', 'invoice_id', 'product_id', 'quantity', 'line_total'),
+        db.Index('ix_invoice_items_product_id', 'product_id'),
+        # Never reuse ids: archived lines keep theirs in the archive database
+        {'sqlite_autoincrement': True}
+    )
     
     # Relationships
     invoice = db.relationship('Invoice', back_populates='items')
@@ -155,9 +427,11 @@ class InvoiceItem(db.Model):
     
     def calculate_line_totals(self):
         """Calculate line item totals"""
-        self.line_subtotal = self.quantity * self.unit_price
-        self.line_tax = self.line_subtotal * (self.tax_percent / 100)
-        self.line_total = self.line_subtotal + self.line_tax
+        subtotal = self.quantity * to_minor(self.unit_price)
+        tax = tax_on(subtotal, self.tax_percent)
+        self.line_subtotal = from_minor(subtotal)
+        self.line_tax = from_minor(tax)
+        self.line_total = from_minor(subtotal + tax)
     
     def to_dict(self):
         """Convert invoice item to dictionary"""
@@ -175,3 +449,81 @@ class InvoiceItem(db.Model):
         if self.product:
             data['product'] = self.product.to_dict()
         return data
+
+
+class ArchivedInvoice(db.Model):
+    """Completed invoice moved out of the hot tables into the archive database"""
+    __bind_key__ = 'archive'
+    __tablename__ = 'archived_invoices'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # same id as the original invoice
+    invoice_number = db.Column(db.String(50), unique=True, nullable=False, index=True)
+    customer_id = db.Column(db.Integer, nullable=True)
+    status = db.Column(db.String(20), nullable=False)
+    subtotal_amount = db.Column(Money, default=0.0)
+    total_tax = db.Column(Money, default=0.0)
+    discount_amount = db.Column(Money, default=0.0)
+    total_amount = db.Column(Money, default=0.0)
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    archive_month = db.Column(db.Integer, nullable=False, index=True)  # YYYYMM partition of created_at
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_archived_invoices_status_created', 'status', 'created_at'),
+    )
+    
+    items = db.relationship('ArchivedInvoiceItem', back_populates='invoice', lazy='dynamic',
+                            cascade='all, delete-orphan')
+    
+    def to_dict(self, include_items=False):
+        """Convert archived invoice to dictionary (same shape as a live invoice)"""
+        data = {
+            'id': self.id,
+            'invoice_number': self.invoice_number,
+            'customer_id': self.customer_id,
+            'status': self.status,
+            'subtotal_amount': self.subtotal_amount,
+            'total_tax': self.total_tax,
+            'discount_amount': self.discount_amount,
+            'total_amount': self.total_amount,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'archived': True
+        }
+        if include_items:
+            data['items'] = [item.to_dict() for item in self.items]
+        return data
+
+
+class ArchivedInvoiceItem(db.Model):
+    """Line item of an archived invoice"""
+    __bind_key__ = 'archive'
+    __tablename__ = 'archived_invoice_items'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('archived_invoices.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, nullable=False, index=True)  # products live in the main database
+    product_name = db.Column(db.String(200), nullable=True)  # snapshot, no cross-database join
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(Money, nullable=False)
+    tax_percent = db.Column(db.Float, default=0.0)
+    line_subtotal = db.Column(Money, default=0.0)
+    line_tax = db.Column(Money, default=0.0)
+    line_total = db.Column(Money, default=0.0)
+    
+    invoice = db.relationship('ArchivedInvoice', back_populates='items')
+    
+    def to_dict(self):
+        """Convert archived invoice item to dictionary"""
+        return {
+            'id': self.id,
+            'product_id': self.product_id,
+            'product_name': self.product_name or 'Unknown',
+            'quantity': self.quantity,
+            'unit_price': self.unit_price,
+            'tax_percent': self.tax_percent,
+            'line_subtotal': self.line_subtotal,
+            'line_tax': self.line_tax,
+            'line_total': self.line_total
+        }
@@ -0,0 +1,66 @@
+"""Money stored as integer minor units (paise/cents).
+
+Money columns hold integers in the database, so SUMs are exact and run on
+integer arithmetic. The ORM still exposes amounts in major units (rupees)
+as floats, which keeps the API JSON unchanged: `Money` converts on the way
+in (rounding half up to the paisa) and on the way out. Arithmetic on
+amounts should go through `to_minor()` and back through `from_minor()`,
+and tax through `tax_on()`, so no float ever accumulates drift.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import BigInteger, Integer, cast, func, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+MINOR_UNITS = 100  # paise per rupee
+_QUANT = Decimal(1)
+
+
+def to_minor(amount):
+    """Amount in major units (float, str, Decimal) as integer minor units"""
+    if amount is None:
+        return None
+    if isinstance(amount, int):
+        return amount * MINOR_UNITS
+    # str() first: Decimal(0.1) would carry the float's binary error
+    value = Decimal(str(amount)) * MINOR_UNITS
+    return int(value.quantize(_QUANT, rounding=ROUND_HALF_UP))
+
+
+def from_minor(minor):
+    """Integer minor units as a float in major units"""
+    if minor is None:
+        return None
+    return minor / MINOR_UNITS
+
+
+def basis_points(percent):
+    """A tax rate in percent as integer hundredths of a percent"""
+    return int(round((percent or 0) * 100))
+
+
+def tax_on(minor, percent):
+    """Tax on an amount in minor units, rounded half up to the minor unit"""
+    return (minor * basis_points(percent) + 5000) // 10000
+
+
+def tax_on_sql(minor, percent):
+    """SQL version of `tax_on()` for a minor-unit expression and a percent column"""
+    return (minor * cast(func.round(percent * 100), Integer) + 5000) // 10000
+
+
+def minor_units(column):
+    """A Money column read as its raw integer, e.g. inside SUM()"""
+    return type_coerce(column, BigInteger)
+
+
+class Money(TypeDecorator):
+    """Amount in major units, stored as an integer count of minor units"""
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return to_minor(value)
+
+    def process_result_value(self, value, dialect):
+        # int(): SQLite returns REAL from expressions such as ROUND()
+        return from_minor(int(value)) if value is not None else None
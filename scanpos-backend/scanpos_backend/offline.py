@@ -0,0 +1,307 @@
+"""Upload of completed sales rung up while a terminal was offline.
+
+`apply_offline_sales()` takes a batch of fully formed sales and writes the
+new ones in the caller's transaction with a fixed number of statements: one
+bulk INSERT each for invoices, line items, stock movements and change-feed
+events, whatever the batch size. Sales are deduplicated by the terminal's
+client id, so a batch can be resent after a lost response. A sale that
+already happened is never refused for business reasons: stock gone
+negative, a price that changed since the terminal's catalog sync or an
+unknown customer are recorded and reported as conflicts for review. Only
+malformed sales are rejected.
+"""
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import insert, or_
+from .extensions import db
+from .inventory import sync_low_stock
+from .invalidation import PRODUCTS, REPORTS, publish
+from .models import Invoice, InvoiceItem, Product, Customer, StockMovement, ArchivedInvoice
+from .money import to_minor, from_minor, tax_on
+from .outbox import INVOICE_COMPLETED, invoice_item_payload, record_events
+
+MAX_CLIENT_ID_LENGTH = 64
+
+
+def _parse_time(value):
+    """ISO 8601 timestamp as naive UTC, or None"""
+    try:
+        moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _parse_amount(value, name):
+    """Non-negative amount in minor units; raises ValueError with a message"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f'{name} must be a number')
+    try:
+        minor = to_minor(value)
+    except ArithmeticError:
+        raise ValueError(f'{name} must be a number')
+    if minor < 0:
+        raise ValueError(f'{name} cannot be negative')
+    return minor
+
+
+def _parse_sale(sale, latest):
+    """Validate one sale. Returns (sale dict, None) or (None, error message)."""
+    if not isinstance(sale, dict):
+        return None, 'Sale must be an object'
+    created_at = _parse_time(sale.get('created_at'))
+    if created_at is None:
+        return None, 'created_at must be an ISO 8601 timestamp'
+    if created_at > latest:
+        return None, 'created_at is in the future'
+    try:
+        discount = _parse_amount(sale.get('discount_amount'), 'discount_amount') or 0
+        total = _parse_amount(sale.get('total_amount'), 'total_amount')
+    except ValueError as e:
+        return None, str(e)
+
+    if not isinstance(sale.get('customer_id') or 0, int):
+        return None, 'customer_id must be an integer'
+
+    items = sale.get('items')
+    if not isinstance(items, list) or not items:
+        return None, 'Sale must have items'
+    lines = []
+    for item in items:
+        if not isinstance(item, dict) or not (item.get('product_id') or item.get('barcode')):
+            return None, 'Each item needs a product_id or barcode'
+        if not isinstance(item.get('product_id') or 0, int) or not isinstance(item.get('barcode') or '', str):
+            return None, 'product_id must be an integer and barcode a string'
+        quantity = item.get('quantity', 1)
+        if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 1:
+            return None, 'Item quantity must be a positive integer'
+        try:
+            unit_price = _parse_amount(item.get('unit_price'), 'unit_price')
+        except ValueError as e:
+            return None, str(e)
+        tax_percent = item.get('tax_percent')
+        if tax_percent is not None and (isinstance(tax_percent, bool) or not isinstance(tax_percent, (int, float))
+                                        or tax_percent < 0):
+            return None, 'tax_percent must be a non-negative number'
+        lines.append({
+            'product_id': item.get('product_id'),
+            'barcode': item.get('barcode'),
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'tax_percent': tax_percent,
+        })
+
+    return {
+        'client_id': sale['client_id'],
+        'created_at': created_at,
+        'customer_id': sale.get('customer_id'),
+        'discount': discount,
+        'total': total,
+        'lines': lines,
+    }, None
+
+
+def _last_sequences(days):
+    """Last invoice sequence number used on each day, live or archived"""
+    last = {}
+    for day in days:
+        prefix = f'INV-{day}-'
+        numbers = [
+            model.query.with_entities(model.invoice_number).filter(
+                model.invoice_number.like(prefix + '%')
+            ).order_by(model.id.desc()).first()
+            for model in (Invoice, ArchivedInvoice)
+        ]
+        last[day] = max([int(row.invoice_number.split('-')[-1]) for row in numbers if row] or [0])
+    return last
+
+
+def apply_offline_sales(sales, user_id):
+    """Record a batch of offline sales. The caller commits.
+
+    Returns {'accepted', 'duplicates', 'rejected', 'conflicts'}; accepted
+    and duplicate sales carry the server invoice id and number.
+    """
+    result = {'accepted': [], 'duplicates': [], 'rejected': [], 'conflicts': []}
+    latest = datetime.utcnow() + timedelta(seconds=current_app.config['SYNC_MAX_CLOCK_SKEW_SECONDS'])
+
+    # Validate, and drop repeats of a client id within the batch
+    parsed, seen = [], set()
+    for sale in sales:
+        client_id = sale.get('client_id') if isinstance(sale, dict) else None
+        if not isinstance(client_id, str) or not client_id or len(client_id) > MAX_CLIENT_ID_LENGTH:
+            result['rejected'].append({'client_id': client_id,
+                                       'message': f'client_id must be a string of 1-{MAX_CLIENT_ID_LENGTH} characters'})
+            continue
+        if client_id in seen:
+            continue
+        seen.add(client_id)
+        entry, error = _parse_sale(sale, latest)
+        if error:
+            result['rejected'].append({'client_id': client_id, 'message': error})
+        else:
+            parsed.append(entry)
+
+    # Sales uploaded before
+    if parsed:
+        existing = {
+            row.client_id: row for row in db.session.query(
+                Invoice.client_id, Invoice.id, Invoice.invoice_number
+            ).filter(Invoice.client_id.in_([sale['client_id'] for sale in parsed]))
+        }
+        for sale in parsed:
+            row = existing.get(sale['client_id'])
+            if row is not None:
+                result['duplicates'].append({'client_id': row.client_id, 'invoice_id': row.id,
+                                             'invoice_number': row.invoice_number})
+        parsed = [sale for sale in parsed if sale['client_id'] not in existing]
+    if not parsed:
+        return result
+
+    # Resolve products (with current stock) and customers in one query each
+    product_ids = {line['product_id'] for sale in parsed for line in sale['lines'] if line['product_id']}
+    barcodes = {line['barcode'] for sale in parsed for line in sale['lines'] if not line['product_id']}
+    products = Product.query.filter(or_(Product.id.in_(product_ids), Product.barcode.in_(barcodes))).all()
+    by_id = {product.id: product for product in products}
+    by_barcode = {product.barcode: product for product in products if product.barcode}
+    customer_ids = {sale['customer_id'] for sale in parsed if sale['customer_id']}
+    known_customers = {
+        row.id for row in db.session.query(Customer.id).filter(Customer.id.in_(customer_ids))
+    } if customer_ids else set()
+
+    # Build every row in client time order, so stock runs down in the order goods left the shelf
+    parsed.sort(key=lambda sale: sale['created_at'])
+    sequences = _last_sequences({sale['created_at'].strftime('%Y%m%d') for sale in parsed})
+    stock = {product.id: product.stock_qty for product in products}
+    now = datetime.utcnow()
+    invoices, lines_by_sale, conflicts = [], [], []
+    for sale in parsed:
+        lines, sale_conflicts, error = {}, [], None
+        for line in sale['lines']:
+            product = by_id.get(line['product_id']) if line['product_id'] else by_barcode.get(line['barcode'])
+            if product is None:
+                error = f'Product not found: {line["product_id"] or line["barcode"]}'
+                break
+            catalog_price = to_minor(product.price)
+            unit_price = catalog_price if line['unit_price'] is None else line['unit_price']
+            tax_percent = (product.tax_percent if line['tax_percent'] is None else line['tax_percent']) or 0.0
+            merged = lines.get(product.id)
+            if merged is not None:
+                if (merged['unit_price'], merged['tax_percent']) != (unit_price, tax_percent):
+                    error = f'Product {product.id} is listed twice with different prices'
+                    break
+                merged['quantity'] += line['quantity']
+                continue
+            lines[product.id] = {'product': product, 'quantity': line['quantity'],
+                                 'unit_price': unit_price, 'tax_percent': tax_percent}
+            if unit_price != catalog_price:
+                sale_conflicts.append({'kind': 'price_changed', 'product_id': product.id,
+                                       'sold_price': from_minor(unit_price), 'catalog_price': product.price})
+            if not product.is_active:
+                sale_conflicts.append({'kind': 'inactive_product', 'product_id': product.id})
+        if error:
+            result['rejected'].append({'client_id': sale['client_id'], 'message': error})
+            continue
+
+        customer_id = sale['customer_id']
+        if customer_id and customer_id not in known_customers:
+            sale_conflicts.append({'kind': 'unknown_customer', 'customer_id': customer_id})
+            customer_id = None
+
+        subtotal = tax = 0
+        for line in lines.values():
+            line['subtotal'] = line['quantity'] * line['unit_price']
+            line['tax'] = tax_on(line['subtotal'], line['tax_percent'])
+            subtotal += line['subtotal']
+            tax += line['tax']
+            stock[line['product'].id] -= line['quantity']
+            if stock[line['product'].id] < 0:
+                sale_conflicts.append({'kind': 'negative_stock', 'product_id': line['product'].id,
+                                       'stock_qty': stock[line['product'].id]})
+        total = subtotal + tax - sale['discount']
+        if sale['total'] is not None and sale['total'] != total:
+            sale_conflicts.append({'kind': 'total_mismatch', 'client_total': from_minor(sale['total']),
+                                   'server_total': from_minor(total)})
+
+        day = sale['created_at'].strftime('%Y%m%d')
+        sequences[day] += 1
+        invoice_number = f'INV-{day}-{sequences[day]:04d}'
+        invoices.append({
+            'invoice_number': invoice_number,
+            'number_reversed': invoice_number[::-1],
+            'client_id': sale['client_id'],
+            'customer_id': customer_id,
+            'status': 'completed',
+            'subtotal_amount': from_minor(subtotal),
+            'total_tax': from_minor(tax),
+            'discount_amount': from_minor(sale['discount']),
+            'total_amount': from_minor(total),
+            'created_at': sale['created_at'],
+            'updated_at': now,
+        })
+        lines_by_sale.append((sale, lines))
+        conflicts.append(sale_conflicts)
+    if not invoices:
+        return result
+
+    # Bulk INSERTs; the ledger rows are the stock decrements
+    invoice_ids = db.session.execute(
+        insert(Invoice).returning(Invoice.id, sort_by_parameter_order=True), invoices
+    ).scalars().all()
+    items, movements, events = [], [], []
+    for invoice_id, invoice, (sale, lines) in zip(invoice_ids, invoices, lines_by_sale):
+        for product_id, line in lines.items():
+            items.append({
+                'invoice_id': invoice_id,
+                'product_id': product_id,
+                'quantity': line['quantity'],
+                'unit_price': from_minor(line['unit_price']),
+                'tax_percent': line['tax_percent'],
+                'line_subtotal': from_minor(line['subtotal']),
+                'line_tax': from_minor(line['tax']),
+                'line_total': from_minor(line['subtotal'] + line['tax']),
+            })
+            movements.append({
+                'product_id': product_id,
+                'quantity': -line['quantity'],
+                'reason': StockMovement.SALE,
+                'invoice_id': invoice_id,
+                'user_id': user_id,
+                'note': 'offline sale',
+                'created_at': sale['created_at'],
+            })
+        events.append((INVOICE_COMPLETED, invoice_id, {
+            'id': invoice_id,
+            **{key: value for key, value in invoice.items() if key != 'number_reversed'},
+            'created_at': invoice['created_at'].isoformat(),
+            'updated_at': invoice['updated_at'].isoformat(),
+            'items': [
+                invoice_item_payload(product_id, line['product'].name, line['quantity'],
+                                     from_minor(line['unit_price']), line['tax_percent'],
+                                     from_minor(line['subtotal']), from_minor(line['tax']),
+                                     from_minor(line['subtotal'] + line['tax']))
+                for product_id, line in lines.items()
+            ]
+        }))
+    db.session.execute(insert(InvoiceItem), items)
+    db.session.execute(insert(StockMovement), movements)
+    record_events(events)
+
+    # Reload stock of the touched products in one SELECT for the low-stock set
+    touched = list({product_id for _, lines in lines_by_sale for product_id in lines})
+    sync_low_stock(Product.query.filter(Product.id.in_(touched)).populate_existing().all())
+    for product_id in touched:
+        publish(PRODUCTS, product_id)
+    publish(REPORTS)
+
+    for invoice_id, invoice, sale_conflicts in zip(invoice_ids, invoices, conflicts):
+        result['accepted'].append({'client_id': invoice['client_id'], 'invoice_id': invoice_id,
+                                   'invoice_number': invoice['invoice_number'],
+                                   'total_amount': invoice['total_amount']})
+        for conflict in sale_conflicts:
+            result['conflicts'].append({'client_id': invoice['client_id'], 'invoice_id': invoice_id, **conflict})
+    return result
@@ -0,0 +1,156 @@
+"""Transactional outbox: change events for ERP and accounting sync.
+
+Writers call `record_event()` before they commit, so an event exists exactly
+when its change does. `GET /api/events` tails the table by id. Ids come from
+an AUTOINCREMENT key assigned under SQLite's write lock, i.e. in commit
+order, so a consumer that resumes after the last id it processed never
+misses an event.
+
+Payloads are full snapshots of the entity after the change, so only the
+latest event of an entity matters: `compact_outbox()` drops events that a
+later event of the same entity supersedes once they are older than
+OUTBOX_COMPACT_AFTER_SECONDS, and `purge_outbox()` deletes events older than
+OUTBOX_RETENTION_HOURS. Consumers further behind than that get a 410 from
+the feed and resync from the list endpoints.
+"""
+import json
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import exists, func, insert
+from sqlalchemy.orm import aliased
+from .extensions import db
+from .models import OutboxEvent
+
+INVOICE_COMPLETED = 'invoice.completed'
+INVOICE_DELETED = 'invoice.deleted'  # Only completed invoices; drafts never appear in the feed
+PRODUCT_CREATED = 'product.created'
+PRODUCT_UPDATED = 'product.updated'
+PRODUCT_DELETED = 'product.deleted'  # Soft delete: the payload has is_active false
+
+# Rows deleted per transaction by compaction and retention
+PURGE_BATCH_SIZE = 1000
+
+
+def _row(event_type, entity_id, payload):
+    return {
+        'event_type': event_type,
+        'entity': event_type.split('.', 1)[0],
+        'entity_id': entity_id,
+        'payload': json.dumps(payload, separators=(',', ':')),
+        'created_at': datetime.utcnow(),
+    }
+
+
+def record_event(event_type, entity_id, payload):
+    """Queue an event in the current transaction. The caller commits."""
+    db.session.add(OutboxEvent(**_row(event_type, entity_id, payload)))
+
+
+def record_events(events):
+    """Queue (event_type, entity_id, payload) events with one INSERT. The caller commits."""
+    if events:
+        db.session.execute(insert(OutboxEvent), [_row(*event) for event in events])
+
+
+def invoice_item_payload(product_id, product_name, quantity, unit_price, tax_percent,
+                         line_subtotal, line_tax, line_total):
+    """One line of an invoice event"""
+    return {
+        'product_id': product_id,
+        'product_name': product_name,
+        'quantity': quantity,
+        'unit_price': unit_price,
+        'tax_percent': tax_percent,
+        'line_subtotal': line_subtotal,
+        'line_tax': line_tax,
+        'line_total': line_total
+    }
+
+
+def invoice_payload(invoice):
+    """Snapshot of an invoice and its lines"""
+    return {
+        'id': invoice.id,
+        'invoice_number': invoice.invoice_number,
+        'client_id': invoice.client_id,
+        'customer_id': invoice.customer_id,
+        'status': invoice.status,
+        'subtotal_amount': invoice.subtotal_amount,
+        'total_tax': invoice.total_tax,
+        'discount_amount': invoice.discount_amount,
+        'total_amount': invoice.total_amount,
+        'created_at': invoice.created_at.isoformat() if invoice.created_at else None,
+        'updated_at': invoice.updated_at.isoformat() if invoice.updated_at else None,
+        'items': [
+            invoice_item_payload(item.product_id, item.product.name if item.product else 'Unknown', item.quantity,
+                                 item.unit_price, item.tax_percent, item.line_subtotal, item.line_tax,
+                                 item.line_total)
+            for item in invoice.items
+        ]
+    }
+
+
+def product_payload(product):
+    """Snapshot of a product's catalog fields (stock changes are not events)"""
+    return {
+        'id': product.id,
+        'name': product.name,
+        'barcode': product.barcode,
+        'price': product.price,
+        'tax_percent': product.tax_percent,
+        'reorder_level': product.reorder_level,
+        'is_active': product.is_active
+    }
+
+
+def event_bounds():
+    """(oldest, latest) event id still stored; (None, 0) before the first event"""
+    oldest, latest = db.session.query(func.min(OutboxEvent.id), func.max(OutboxEvent.id)).one()
+    return oldest, latest or 0
+
+
+def _delete_in_batches(*criteria):
+    """Delete matching events a batch per transaction, oldest first. Returns the number removed."""
+    removed, last_id = 0, 0
+    while True:
+        ids = [row.id for row in db.session.query(OutboxEvent.id).filter(
+            OutboxEvent.id > last_id, *criteria
+        ).order_by(OutboxEvent.id).limit(PURGE_BATCH_SIZE)]
+        if not ids:
+            return removed
+        OutboxEvent.query.filter(OutboxEvent.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        removed += len(ids)
+        last_id = ids[-1]
+
+
+def compact_outbox(older_than_seconds=None):
+    """Delete old events superseded by a later event of the same entity. Returns the number removed."""
+    if older_than_seconds is None:
+        older_than_seconds = current_app.config['OUTBOX_COMPACT_AFTER_SECONDS']
+    oldest, _ = event_bounds()
+    if oldest is None:
+        return 0
+    later = aliased(OutboxEvent)
+    return _delete_in_batches(
+        # The oldest event stays, so a gap before it always means retention dropped events
+        OutboxEvent.id > oldest,
+        OutboxEvent.created_at < datetime.utcnow() - timedelta(seconds=older_than_seconds),
+        exists().where(
+            later.entity == OutboxEvent.entity,
+            later.entity_id == OutboxEvent.entity_id,
+            later.id > OutboxEvent.id
+        )
+    )
+
+
+def purge_outbox(older_than_hours=None):
+    """Delete events past the retention period. Returns the number removed."""
+    if older_than_hours is None:
+        older_than_hours = current_app.config['OUTBOX_RETENTION_HOURS']
+    _, latest = event_bounds()
+    return _delete_in_batches(
+        # The latest event stays, so consumers can still tell their position is valid
+        OutboxEvent.id < latest,
+        OutboxEvent.created_at < datetime.utcnow() - timedelta(hours=older_than_hours)
+    )
@@ -0,0 +1,160 @@
+"""Slow-query log with query-plan capture.
+
+Every statement is timed through SQLAlchemy engine events. Statements over
+SLOW_QUERY_THRESHOLD_MS are aggregated per fingerprint (the statement with
+literals and IN-lists normalized). A sampled share of them is also written
+to the log together with bound parameters, the calling route and the
+database's query plan. Aggregates are per worker process.
+"""
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+EXPLAIN_PREFIX = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+
+
+def normalize(statement):
+    """Reduce a statement to its shape so identical queries group together"""
+    statement = _STRING.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _IN_LIST.sub('(...)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+class SlowQueryLog:
+    """Per-process aggregate of slow statements"""
+
+    def __init__(self, threshold_ms, sample_rate, explain, max_fingerprints=500):
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.explain = explain
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def attach(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before)
+        event.listen(engine, 'after_cursor_execute', self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        # Kept on the statement's execution context, not the connection, so a
+        # statement that fails (and never reaches _after) leaves nothing behind
+        if context is not None:
+            context._query_start = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_query_start', None)
+        if start is None:
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms < self.threshold_ms:
+            return
+
+        route = request.endpoint if has_request_context() else None
+        shape = normalize(statement)
+        key = fingerprint(shape)
+        sampled = random.random() < self.sample_rate
+        plan = None
+        if sampled and self.explain and not executemany:
+            plan = self._explain(conn, statement, parameters)
+
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    # Forget the least expensive fingerprint
+                    cheapest = min(self._stats, key=lambda k: self._stats[k]['total_ms'])
+                    del self._stats[cheapest]
+                entry = self._stats[key] = {
+                    'fingerprint': key, 'statement': shape, 'count': 0,
+                    'total_ms': 0.0, 'max_ms': 0.0, 'routes': {}, 'plan': None,
+                    'last_parameters': None, 'last_seen': None,
+                }
+            entry['count'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['last_seen'] = datetime.utcnow().isoformat()
+            entry['routes'][route or '-'] = entry['routes'].get(route or '-', 0) + 1
+            if elapsed_ms >= entry['max_ms']:
+                entry['max_ms'] = elapsed_ms
+                entry['last_parameters'] = repr(parameters)[:500]
+            if plan is not None:
+                entry['plan'] = plan
+
+        if sampled:
+            logger.warning(
+                'Slow query %.1fms [%s] route=%s params=%s\n%s%s',
+                elapsed_ms, key, route or '-', repr(parameters)[:500], statement,
+                ('\nPlan:\n' + '\n'.join(plan)) if plan else ''
+            )
+
+    def _explain(self, conn, statement, parameters):
+        prefix = EXPLAIN_PREFIX.get(conn.dialect.name)
+        if prefix is None or not statement.lstrip().upper().startswith(('SELECT', 'WITH', 'UPDATE', 'DELETE')):
+            return None
+        try:
+            # Raw DBAPI cursor: bypasses the engine events, so no recursion
+            cursor = conn.connection.dbapi_connection.cursor()
+            try:
+                cursor.execute(prefix + statement, parameters)
+                # The plan text is the last column on every supported dialect
+                return [str(row[-1]) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+        except Exception as e:
+            return [f'(plan unavailable: {e})']
+
+    def top(self, limit=10, sort='max_ms'):
+        """Top fingerprints by max_ms, total_ms or count"""
+        with self._lock:
+            entries = [dict(entry, routes=dict(entry['routes'])) for entry in self._stats.values()]
+        entries.sort(key=lambda entry: entry[sort], reverse=True)
+        for entry in entries:
+            entry['avg_ms'] = entry['total_ms'] / entry['count']
+        return entries[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def init_query_log(app):
+    """Attach the slow-query log to every engine of the app"""
+    if not app.config['SLOW_QUERY_LOG_ENABLED']:
+        return
+
+    from .extensions import db
+    query_log = SlowQueryLog(
+        threshold_ms=app.config['SLOW_QUERY_THRESHOLD_MS'],
+        sample_rate=app.config['SLOW_QUERY_SAMPLE_RATE'],
+        explain=app.config['SLOW_QUERY_EXPLAIN'],
+    )
+    with app.app_context():
+        for engine in db.engines.values():
+            query_log.attach(engine)
+    app.extensions['slow_query_log'] = query_log
+
+
+def get_query_log():
+    """The slow-query log of the current app, or None if disabled"""
+    return current_app.extensions.get('slow_query_log')
@@ -0,0 +1,205 @@
+"""ESC/POS rendering of completed invoices for 80 mm thermal printers.
+
+The fixed parts of a receipt (printer setup, store header, column titles,
+footer, cut) are encoded to bytes once per layout, and every variable row
+goes through a precompiled format string, so rendering a receipt is a few
+string formats and one bytes join. Completed invoices never change, so
+their rendered bytes are kept in a small per-process LRU cache.
+"""
+import threading
+from collections import OrderedDict
+from flask import current_app
+from .extensions import db
+from .models import Invoice, InvoiceItem, Product, ArchivedInvoiceItem
+
+# ESC/POS commands
+ESC_INIT = b'\x1b@'
+ESC_ALIGN_LEFT = b'\x1ba\x00'
+ESC_ALIGN_CENTER = b'\x1ba\x01'
+ESC_BOLD_ON = b'\x1bE\x01'
+ESC_BOLD_OFF = b'\x1bE\x00'
+GS_SIZE_NORMAL = b'\x1d!\x00'
+GS_SIZE_DOUBLE = b'\x1d!\x11'  # Double width and height
+GS_SIZE_TALL = b'\x1d!\x01'  # Double height only, keeps the column grid
+GS_FEED_AND_CUT = b'\x1dVB\x03'  # Feed 3 lines, then partial cut
+
+
+def esc_codepage(n):
+    """ESC t n: select character code table n"""
+    return b'\x1bt' + bytes([n])
+
+
+class ReceiptTemplate:
+    """Receipt layout for one paper width, with the static parts pre-encoded"""
+
+    def __init__(self, width, store_name, header_lines, footer_lines, currency, encoding, codepage):
+        self.width = width
+        self.encoding = encoding
+        self.currency = currency
+        # Item column widths: name | qty | amount
+        self.qty_width = 5
+        self.amount_width = 11
+        self.name_width = width - self.qty_width - self.amount_width
+
+        rule = self._encode('-' * width + '\n')
+        self.rule = rule
+        self.head = b''.join([
+            ESC_INIT,
+            esc_codepage(codepage),
+            ESC_ALIGN_CENTER,
+            GS_SIZE_DOUBLE, self._encode(store_name[:width // 2] + '\n'), GS_SIZE_NORMAL,
+            self._encode(''.join(line[:width] + '\n' for line in header_lines)),
+            ESC_ALIGN_LEFT,
+        ])
+        self.columns = b''.join([
+            rule,
+            ESC_BOLD_ON,
+            self._encode(f'{"Item":<{self.name_width}}{"Qty":>{self.qty_width}}{"Amount":>{self.amount_width}}\n'),
+            ESC_BOLD_OFF,
+            rule,
+        ])
+        self.tail = b''.join([
+            rule,
+            ESC_ALIGN_CENTER,
+            self._encode(''.join(line[:width] + '\n' for line in footer_lines)),
+            GS_FEED_AND_CUT,
+        ])
+
+        # Row formats, built once per layout (%-formatting is the cheapest per call)
+        self.info_format = '%%-10s%%%ds\n' % (width - 10)
+        self.item_format = '%%-%d.%ds%%%dd%%%d.2f\n' % (
+            self.name_width, self.name_width, self.qty_width, self.amount_width)
+        self.wrap_format = '  %%.%ds\n' % (width - 2)
+        self.detail_format = '  @ %.2f + %g%% tax\n'
+        self.total_format = '%%-20s%%%d.2f\n' % (width - 20)
+        self.grand_format = '%%-8s%%%ds\n' % (width - 8)
+
+    def _encode(self, text):
+        # Receipt text is almost always ASCII, which every code page shares;
+        # the charmap codecs are much slower, so only fall back to them
+        try:
+            return text.encode('ascii')
+        except UnicodeEncodeError:
+            return text.encode(self.encoding, errors='replace')
+
+    def render(self, invoice, items):
+        """Render an invoice dict and its item dicts to ESC/POS bytes"""
+        lines = [
+            self.info_format % ('Invoice', invoice['invoice_number']),
+            self.info_format % ('Date', invoice['created_at'].strftime('%Y-%m-%d %H:%M')),
+        ]
+        body = []
+        for item in items:
+            name = item['product_name'] or 'Unknown'
+            body.append(self.item_format % (name, item['quantity'], item['line_total']))
+            # Long names continue on the next lines
+            for start in range(self.name_width, len(name), self.width - 2):
+                body.append(self.wrap_format % name[start:])
+            body.append(self.detail_format % (item['unit_price'], item['tax_percent']))
+
+        totals = [
+            self.total_format % ('Subtotal', invoice['subtotal_amount']),
+            self.total_format % ('Tax', invoice['total_tax']),
+        ]
+        if invoice['discount_amount']:
+            totals.append(self.total_format % ('Discount', -invoice['discount_amount']))
+        grand = self.grand_format % ('TOTAL', '%s%.2f' % (self.currency, invoice['total_amount']))
+
+        return b''.join([
+            self.head,
+            self._encode(''.join(lines)),
+            self.columns,
+            self._encode(''.join(body)),
+            self.rule,
+            self._encode(''.join(totals)),
+            ESC_BOLD_ON, GS_SIZE_TALL, self._encode(grand), GS_SIZE_NORMAL, ESC_BOLD_OFF,
+            self.tail,
+        ])
+
+
+class ReceiptCache:
+    """Thread-safe LRU of rendered receipts"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _get_template(app):
+    template = app.extensions.get('receipt_template')
+    if template is None:
+        config = app.config
+        template = app.extensions['receipt_template'] = ReceiptTemplate(
+            width=config['RECEIPT_WIDTH'],
+            store_name=config['RECEIPT_STORE_NAME'],
+            header_lines=config['RECEIPT_HEADER_LINES'],
+            footer_lines=config['RECEIPT_FOOTER_LINES'],
+            currency=config['RECEIPT_CURRENCY'],
+            encoding=config['RECEIPT_ENCODING'],
+            codepage=config['RECEIPT_CODEPAGE'],
+        )
+    return template
+
+
+def _get_cache(app):
+    cache = app.extensions.get('receipt_cache')
+    if cache is None:
+        cache = app.extensions['receipt_cache'] = ReceiptCache(app.config['RECEIPT_CACHE_SIZE'])
+    return cache
+
+
+def receipt_key(invoice):
+    """Cache key and ETag for a completed invoice"""
+    updated = invoice.updated_at or invoice.created_at
+    return f'{invoice.id}-{updated:%Y%m%d%H%M%S%f}'
+
+
+def render_receipt(invoice):
+    """ESC/POS bytes for a completed live or archived invoice, cached"""
+    app = current_app._get_current_object()
+    cache = _get_cache(app)
+    key = receipt_key(invoice)
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    if isinstance(invoice, Invoice):
+        # Column query: product names without loading whole products
+        rows = db.session.query(
+            Product.name.label('product_name'), InvoiceItem.quantity, InvoiceItem.unit_price,
+            InvoiceItem.tax_percent, InvoiceItem.line_total
+        ).outerjoin(Product, Product.id == InvoiceItem.product_id).filter(
+            InvoiceItem.invoice_id == invoice.id
+        ).order_by(InvoiceItem.id)
+    else:
+        rows = db.session.query(
+            ArchivedInvoiceItem.product_name, ArchivedInvoiceItem.quantity, ArchivedInvoiceItem.unit_price,
+            ArchivedInvoiceItem.tax_percent, ArchivedInvoiceItem.line_total
+        ).filter(ArchivedInvoiceItem.invoice_id == invoice.id).order_by(ArchivedInvoiceItem.id)
+    items = [row._asdict() for row in rows]
+
+    data = _get_template(app).render({
+        'invoice_number': invoice.invoice_number,
+        'created_at': invoice.created_at,
+        'subtotal_amount': invoice.subtotal_amount or 0.0,
+        'total_tax': invoice.total_tax or 0.0,
+        'discount_amount': invoice.discount_amount or 0.0,
+        'total_amount': invoice.total_amount or 0.0,
+    }, items)
+    cache.put(key, data)
+    return data
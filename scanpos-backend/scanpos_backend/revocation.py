@@ -0,0 +1,155 @@
+"""JWT revocation backed by the token_revocations table.
+
+Each worker mirrors the table in memory: a dict of revoked jtis and a dict
+of user id -> cutoff for "revoke every token of this user". Row ids are the
+version counter: a daemon thread fetches rows above the last id it has seen
+every REVOCATION_SYNC_SECONDS, so the check on each request is two dict
+lookups and never touches the database. Revocations made in a worker apply
+to it at once and reach the other workers within the sync interval.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from .extensions import db, jwt
+from .models import TokenRevocation
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationList:
+    """In-process mirror of the token_revocations table"""
+
+    def __init__(self, sync_seconds):
+        self.sync_seconds = sync_seconds
+        self.version = 0  # Highest TokenRevocation.id applied
+        self.jtis = {}  # jti -> expires_at
+        self.users = {}  # user id -> (issued_until, expires_at)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._last_prune = time.monotonic()
+
+    def is_revoked(self, payload):
+        """Check a decoded token; no I/O"""
+        if payload.get('jti') in self.jtis:
+            return True
+        cutoff = self.users.get(payload.get('sub'))
+        return cutoff is not None and payload.get('iat', 0) <= cutoff[0]
+
+    def apply(self, rows, synced=True):
+        """Merge revocation rows into the mirror.
+
+        Rows this worker just wrote are applied with synced=False: they must
+        not advance the version past rows other workers wrote before them.
+        """
+        with self._lock:
+            for row in rows:
+                if row.jti:
+                    self.jtis[row.jti] = row.expires_at
+                if row.issued_until is not None:
+                    user = str(row.user_id)
+                    current = self.users.get(user)
+                    if current is None or row.issued_until > current[0]:
+                        self.users[user] = (row.issued_until, row.expires_at)
+                if synced:
+                    self.version = max(self.version, row.id)
+
+    def sync(self):
+        """Fetch rows added since the last sync. Returns how many were applied."""
+        rows = TokenRevocation.query.filter(
+            TokenRevocation.id > self.version
+        ).order_by(TokenRevocation.id).all()
+        self.apply(rows)
+        db.session.remove()
+
+        if time.monotonic() - self._last_prune > 60:
+            self.prune()
+        return len(rows)
+
+    def prune(self):
+        """Forget entries whose tokens have expired anyway"""
+        now = datetime.utcnow()
+        with self._lock:
+            self.jtis = {jti: expires for jti, expires in self.jtis.items() if expires > now}
+            self.users = {user: entry for user, entry in self.users.items() if entry[1] > now}
+        self._last_prune = time.monotonic()
+
+    def ensure_started(self, app):
+        """Load the list and start the sync thread once per process (safe across fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # A forked worker inherits the parent's dicts but not its thread
+            self._pid = os.getpid()
+        with app.app_context():
+            self.sync()
+        thread = threading.Thread(target=self._run, args=(app,), name='token-revocation-sync', daemon=True)
+        thread.start()
+
+    def _run(self, app):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.sync_seconds)
+            try:
+                with app.app_context():
+                    self.sync()
+            except Exception:
+                logger.exception('Token revocation sync failed')
+
+
+def _get_list():
+    return current_app.extensions['token_revocations']
+
+
+def revoke_token(payload):
+    """Revoke one decoded token (logout) and commit"""
+    revocation = TokenRevocation(
+        jti=payload['jti'],
+        user_id=int(payload['sub']),
+        expires_at=datetime.utcfromtimestamp(payload['exp'])
+    )
+    db.session.add(revocation)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Already revoked
+        db.session.rollback()
+        return
+    _get_list().apply([revocation], synced=False)
+
+
+def revoke_user_tokens(user_id):
+    """Revoke every token issued to a user so far and commit"""
+    revocation = TokenRevocation(
+        user_id=user_id,
+        issued_until=int(time.time()),
+        expires_at=datetime.utcnow() + current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+    )
+    db.session.add(revocation)
+    db.session.commit()
+    _get_list().apply([revocation], synced=False)
+
+
+def purge_expired_revocations():
+    """Delete revocations whose tokens have expired. Returns the number removed."""
+    count = TokenRevocation.query.filter(
+        TokenRevocation.expires_at < datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def init_revocation(app):
+    """Check every JWT against the in-process revocation list"""
+    app.extensions['token_revocations'] = RevocationList(app.config['REVOCATION_SYNC_SECONDS'])
+
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        revocations = _get_list()
+        revocations.ensure_started(current_app._get_current_object())
+        return revocations.is_revoked(jwt_payload)
@@ -23,3 +23,16 @@ from .reports import reports_bp
 
 # Import and expose users blueprint
 from .users import users_bp
+
+# Import and expose admin blueprint
+from .admin import admin_bp
+
+# Import and expose jobs blueprint
+from .jobs import jobs_bp
+
+# Import and expose customers blueprint
+from .customers import customers_bp
+
+
+# Import and expose events blueprint
+from .events import events_bp
\ No newline at end of file
@@ -0,0 +1,60 @@
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required
+from scanpos_backend.admission import get_admission_stats
+from scanpos_backend.querylog import get_query_log
+from scanpos_backend.routes.users import require_admin
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
+
+
+@admin_bp.route('/admission', methods=['GET'])
+@jwt_required()
+def admission_stats():
+    """Get live admission-control counters for this worker (admin only)"""
+    admin_check = require_admin()
+    if admin_check:
+        return admin_check
+    
+    stats = get_admission_stats()
+    if stats is None:
+        return jsonify({'enabled': False}), 200
+    
+    return jsonify({'enabled': True, **stats}), 200
+
+
+@admin_bp.route('/slow-queries', methods=['GET'])
+@jwt_required()
+def slow_queries():
+    """Get the top-N slowest statement fingerprints for this worker (admin only)"""
+    admin_check = require_admin()
+    if admin_check:
+        return admin_check
+    
+    query_log = get_query_log()
+    if query_log is None:
+        return jsonify({'enabled': False, 'queries': []}), 200
+    
+    limit = request.args.get('limit', 10, type=int)
+    sort = request.args.get('sort', 'max_ms')
+    if sort not in ('max_ms', 'total_ms', 'count'):
+        return jsonify({'message': 'sort must be one of max_ms, total_ms, count'}), 400
+    
+    return jsonify({
+        'enabled': True,
+        'threshold_ms': query_log.threshold_ms,
+        'queries': query_log.top(limit=limit, sort=sort)
+    }), 200
+
+
+@admin_bp.route('/slow-queries', methods=['DELETE'])
+@jwt_required()
+def reset_slow_queries():
+    """Clear the slow-query aggregates for this worker (admin only)"""
+    admin_check = require_admin()
+    if admin_check:
+        return admin_check
+    
+    query_log = get_query_log()
+    if query_log is not None:
+        query_log.reset()
+    return jsonify({'message': 'Slow-query log cleared'}), 200
@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
 from scanpos_backend.extensions import db
 from scanpos_backend.models import User
+from scanpos_backend.revocation import revoke_token, revoke_user_tokens
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
@@ -52,6 +53,9 @@ def login():
     if not user or not user.check_password(data['password']):
         return jsonify({'message': 'Invalid email or password'}), 401
     
+    if not user.is_active:
+        return jsonify({'message': 'Account is deactivated'}), 403
+    
     # Create access token (identity must be string)
     access_token = create_access_token(identity=str(user.id))
     
@@ -61,6 +65,22 @@ def login():
     }), 200
 
 
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    """Revoke the token used for this request"""
+    revoke_token(get_jwt())
+    return jsonify({'message': 'Logged out successfully'}), 200
+
+
+@auth_bp.route('/logout-all', methods=['POST'])
+@jwt_required()
+def logout_all():
+    """Revoke every token of the current user (all terminals)"""
+    revoke_user_tokens(int(get_jwt_identity()))
+    return jsonify({'message': 'Logged out of all sessions'}), 200
+
+
 @auth_bp.route('/me', methods=['GET'])
 @jwt_required()
 def get_current_user():
@@ -0,0 +1,175 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from scanpos_backend.extensions import db
+from scanpos_backend.models import Customer, Invoice, ArchivedInvoice
+from scanpos_backend.customers import index_customer, lookup_customers, recent_customers, normalize_phone
+from scanpos_backend.invalidation import CUSTOMERS, publish, get_cache
+from scanpos_backend.routes.users import require_admin
+
+customers_bp = Blueprint('customers', __name__, url_prefix='/api/customers')
+
+
+def _get_customer_dict(customer_id):
+    """Customer dict by id through the per-worker cache, or None"""
+    cache = get_cache('customers')
+    data = cache.get(customer_id)
+    if data is None:
+        customer = db.session.get(Customer, customer_id)
+        if not customer:
+            return None
+        data = customer.to_dict()
+        cache.set(customer_id, data, tags=[customer_id])
+    return data
+
+
+def _validate(data, partial=False):
+    """Return an error message for bad customer fields, or None"""
+    if not partial or 'name' in data:
+        if not (data.get('name') or '').strip():
+            return 'Name is required'
+        if len(data['name']) > 100:
+            return 'Name is too long'
+    if data.get('phone'):
+        if len(data['phone']) > 20:
+            return 'Phone is too long'
+        if not normalize_phone(data['phone']):
+            return 'Phone must contain digits'
+    return None
+
+
+@customers_bp.route('', methods=['GET'])
+@jwt_required()
+def search_customers():
+    """Look up customers by phone prefix or name words (?q=), newest first without q"""
+    q = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    
+    if not q:
+        customers = Customer.query.order_by(Customer.id.desc()).limit(limit).all()
+        return jsonify({'customers': [c.to_dict() for c in customers]}), 200
+    
+    if len(q) < 2:
+        return jsonify({'message': 'Search needs at least 2 characters'}), 400
+    
+    # The same few regulars are looked up all day
+    cache = get_cache('customer_lookups')
+    key = f'q:{q.lower()}:{limit}'
+    results = cache.get(key)
+    if results is None:
+        results = [c.to_dict() for c in lookup_customers(q, limit)]
+        cache.set(key, results)
+    
+    return jsonify({'customers': results}), 200
+
+
+@customers_bp.route('/recent', methods=['GET'])
+@jwt_required()
+def get_recent_customers():
+    """Customers of the latest invoices, for one-tap attach at the till"""
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    
+    cache = get_cache('customer_lookups')
+    key = f'recent:{limit}'
+    results = cache.get(key)
+    if results is None:
+        results = [c.to_dict() for c in recent_customers(limit)]
+        cache.set(key, results, tags=['recent'])
+    
+    return jsonify({'customers': results}), 200
+
+
+@customers_bp.route('', methods=['POST'])
+@jwt_required()
+def create_customer():
+    """Create a customer"""
+    data = request.get_json() or {}
+    
+    error = _validate(data)
+    if error:
+        return jsonify({'message': error}), 400
+    
+    customer = Customer(
+        name=data['name'].strip(),
+        phone=(data.get('phone') or '').strip() or None,
+        address=data.get('address')
+    )
+    index_customer(customer)
+    db.session.add(customer)
+    db.session.flush()
+    publish(CUSTOMERS, customer.id)
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Customer created successfully',
+        'customer': customer.to_dict()
+    }), 201
+
+
+@customers_bp.route('/<int:id>', methods=['GET'])
+@jwt_required()
+def get_customer(id):
+    """Get a single customer by ID"""
+    data = _get_customer_dict(id)
+    
+    if data is None:
+        return jsonify({'message': 'Customer not found'}), 404
+    
+    return jsonify(data), 200
+
+
+@customers_bp.route('/<int:id>', methods=['PUT'])
+@jwt_required()
+def update_customer(id):
+    """Update a customer"""
+    customer = db.session.get(Customer, id)
+    
+    if not customer:
+        return jsonify({'message': 'Customer not found'}), 404
+    
+    data = request.get_json() or {}
+    
+    error = _validate(data, partial=True)
+    if error:
+        return jsonify({'message': error}), 400
+    
+    if 'name' in data:
+        customer.name = data['name'].strip()
+    if 'phone' in data:
+        customer.phone = (data['phone'] or '').strip() or None
+    if 'address' in data:
+        customer.address = data['address']
+    
+    index_customer(customer)
+    publish(CUSTOMERS, customer.id)
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Customer updated successfully',
+        'customer': customer.to_dict()
+    }), 200
+
+
+@customers_bp.route('/<int:id>', methods=['DELETE'])
+@jwt_required()
+def delete_customer(id):
+    """Delete a customer without invoices (admin only)"""
+    admin_check = require_admin()
+    if admin_check:
+        return admin_check
+    
+    customer = db.session.get(Customer, id)
+    
+    if not customer:
+        return jsonify({'message': 'Customer not found'}), 404
+    
+    # Archived invoices keep the customer id too
+    has_invoices = Invoice.query.filter_by(customer_id=id).first() is not None or \
+        ArchivedInvoice.query.filter_by(customer_id=id).first() is not None
+    if has_invoices:
+        return jsonify({'message': 'Customer has invoices and cannot be deleted'}), 409
+    
+    db.session.delete(customer)
+    publish(CUSTOMERS, id)
+    db.session.commit()
+    
+    return jsonify({'message': 'Customer deleted successfully'}), 200
@@ -0,0 +1,64 @@
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import jwt_required
+from scanpos_backend.extensions import db
+from scanpos_backend.models import OutboxEvent
+from scanpos_backend.outbox import event_bounds
+from scanpos_backend.routes.users import require_admin
+from scanpos_backend.streaming import stream_ndjson, CHUNK_ITEMS
+import json
+import time
+
+events_bp = Blueprint('events', __name__)
+
+
+@events_bp.route('/api/events', methods=['GET'])
+@jwt_required()
+def get_events():
+    """Stream change events after ?after=<seq> as NDJSON, oldest first (admin only).
+
+    Each line is {"seq", "type", "entity", "entity_id", "created_at", "data"}.
+    Consumers keep the last `seq` they applied and pass it as `after`. With
+    ?wait=N and nothing new, the request is held up to N seconds until an
+    event arrives; an empty body means nothing happened. X-Events-Latest
+    tells whether more events are waiting beyond `limit`.
+    """
+    admin_check = require_admin()
+    if admin_check:
+        return admin_check
+    
+    after = max(request.args.get('after', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 1000, type=int), 1), current_app.config['OUTBOX_MAX_BATCH'])
+    wait = min(max(request.args.get('wait', 0, type=float), 0), current_app.config['OUTBOX_MAX_WAIT_SECONDS'])
+    
+    oldest, latest = event_bounds()
+    if after > latest:
+        # The consumer synced against another database (e.g. before a restore)
+        return jsonify({'message': 'Unknown event sequence, resync and start from after=0', 'latest': latest}), 410
+    if after and oldest is not None and after < oldest - 1:
+        return jsonify({'message': 'Events after this sequence have been purged, resync and start from after=0',
+                        'oldest': oldest, 'latest': latest}), 410
+    
+    deadline = time.monotonic() + wait
+    while latest <= after and time.monotonic() < deadline:
+        time.sleep(current_app.config['OUTBOX_POLL_SECONDS'])
+        # End the read transaction so new commits are visible
+        db.session.rollback()
+        _, latest = event_bounds()
+    
+    rows = db.session.query(
+        OutboxEvent.id, OutboxEvent.event_type, OutboxEvent.entity, OutboxEvent.entity_id,
+        OutboxEvent.created_at, OutboxEvent.payload
+    ).filter(OutboxEvent.id > after).order_by(OutboxEvent.id).limit(limit).yield_per(CHUNK_ITEMS)
+    
+    # The payload is stored as JSON already; splice it in instead of decoding it
+    lines = (
+        json.dumps({
+            'seq': row.id,
+            'type': row.event_type,
+            'entity': row.entity,
+            'entity_id': row.entity_id,
+            'created_at': row.created_at.isoformat() if row.created_at else None
+        }, separators=(',', ':'))[:-1] + ',"data":' + row.payload + '}'
+        for row in rows
+    )
+    return stream_ndjson(lines, headers={'X-Events-Latest': str(latest)})
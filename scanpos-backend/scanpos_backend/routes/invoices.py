@@ -1,12 +1,34 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from scanpos_backend.extensions import db
-from scanpos_backend.models import Invoice, InvoiceItem, Product, Customer
-from datetime import datetime
-from sqlalchemy import or_
+from scanpos_backend.models import Invoice, InvoiceItem, Product, Customer, StockMovement
+from scanpos_backend.inventory import record_movement, take_stock, sync_low_stock
+from scanpos_backend.invalidation import REPORTS, publish
+from scanpos_backend.archive import find_archived_invoice, find_invoice_by_number
+from scanpos_backend.idempotency import idempotent, commit_writes
+from scanpos_backend.receipts import render_receipt, receipt_key
+from scanpos_backend.streaming import stream_json
+from scanpos_backend.offline import apply_offline_sales
+from scanpos_backend.outbox import INVOICE_COMPLETED, INVOICE_DELETED, invoice_payload, record_event
+from scanpos_backend import fastpath
+from scanpos_backend.money import to_minor, from_minor, tax_on, tax_on_sql, minor_units
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_, tuple_
+from sqlalchemy.exc import IntegrityError
+import base64
+import binascii
+import math
 
 invoices_bp = Blueprint('invoices', __name__)
 
+def _dialect_insert(table):
+    """INSERT with ON CONFLICT support for the configured database"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
 @invoices_bp.route('/api/invoices', methods=['POST'])
 @jwt_required()
 def create_invoice():
@@ -14,6 +36,9 @@ def create_invoice():
     try:
         data = request.get_json() or {}
         
+        if data.get('customer_id') and not db.session.get(Customer, data['customer_id']):
+            return jsonify({'message': 'Customer not found'}), 400
+        
         # Generate invoice number
         # Format: INV-YYYYMMDD-XXXX (e.g., INV-20231129-0001)
         today = datetime.utcnow().strftime('%Y%m%d')
@@ -64,14 +89,8 @@ def create_invoice():
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
 
-@invoices_bp.route('/api/invoices/<int:invoice_id>', methods=['GET'])
-@jwt_required()
-def get_invoice(invoice_id):
-    """Get invoice with all items"""
-    invoice = Invoice.query.get(invoice_id)
-    if not invoice:
-        return jsonify({'message': 'Invoice not found'}), 404
-    
+def _invoice_response(invoice):
+    """Build the get-invoice response for a live invoice"""
     items = []
     for item in invoice.items:
         items.append({
@@ -102,10 +121,66 @@ def get_invoice(invoice_id):
         }
     }), 200
 
+@invoices_bp.route('/api/invoices/<int:invoice_id>', methods=['GET'])
+@jwt_required()
+def get_invoice(invoice_id):
+    """Get invoice with all items"""
+    invoice = Invoice.query.get(invoice_id)
+    if not invoice:
+        # Fall back to cold storage for old invoices
+        archived = find_archived_invoice(invoice_id)
+        if not archived:
+            return jsonify({'message': 'Invoice not found'}), 404
+        return jsonify({'invoice': archived.to_dict(include_items=True)}), 200
+    
+    return _invoice_response(invoice)
+
+@invoices_bp.route('/api/invoices/<int:invoice_id>/receipt.escpos', methods=['GET'])
+@jwt_required()
+def get_invoice_receipt(invoice_id):
+    """Get a completed invoice as a raw ESC/POS byte stream for thermal printers"""
+    invoice = Invoice.query.get(invoice_id) or find_archived_invoice(invoice_id)
+    if not invoice:
+        return jsonify({'message': 'Invoice not found'}), 404
+    
+    if invoice.status != 'completed':
+        return jsonify({'message': 'Receipts are only available for completed invoices'}), 400
+    
+    etag = receipt_key(invoice)
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={'ETag': f'"{etag}"'})
+    
+    return Response(render_receipt(invoice), mimetype='application/octet-stream', headers={
+        'ETag': f'"{etag}"',
+        'Cache-Control': 'private, max-age=86400',
+        'Content-Disposition': f'inline; filename="{invoice.invoice_number}.escpos"'
+    })
+
+@invoices_bp.route('/api/invoices/by-number/<invoice_number>', methods=['GET'])
+@jwt_required()
+def get_invoice_by_number(invoice_number):
+    """Get live or archived invoice by invoice number"""
+    invoice = find_invoice_by_number(invoice_number)
+    if not invoice:
+        return jsonify({'message': 'Invoice not found'}), 404
+    
+    if isinstance(invoice, Invoice):
+        return _invoice_response(invoice)
+    return jsonify({'invoice': invoice.to_dict(include_items=True)}), 200
+
 @invoices_bp.route('/api/invoices/<int:invoice_id>/items', methods=['POST'])
 @jwt_required()
+@idempotent
 def add_invoice_item(invoice_id):
     """Add item to invoice by product_id or barcode"""
+    if current_app.config['ITEM_FAST_PATH_ENABLED']:
+        # Three Core statements for the common case; anything else takes the ORM path below
+        data = request.get_json(silent=True)
+        item_data = fastpath.add_item(invoice_id, data)
+        if item_data is not None:
+            commit_writes()
+            return _item_added_response(item_data, data.get('quantity', 1))
+    
     invoice = Invoice.query.get(invoice_id)
     if not invoice:
         return jsonify({'message': 'Invoice not found'}), 404
@@ -136,74 +211,80 @@ def add_invoice_item(invoice_id):
     if product.stock_qty < quantity:
         return jsonify({'message': f'Insufficient stock. Available: {product.stock_qty}'}), 400
     
-    # Check if product already exists in invoice
-    existing_item = InvoiceItem.query.filter_by(
+    # Insert the line, or add to the quantity of the existing one, in one
+    # statement; the WHERE keeps the combined quantity within stock
+    table = InvoiceItem.__table__
+    subtotal = quantity * to_minor(product.price)
+    tax = tax_on(subtotal, product.tax_percent)
+    insert = _dialect_insert(table).values(
         invoice_id=invoice_id,
-        product_id=product.id
-    ).first()
-    
-    if existing_item:
-        # Check if new total quantity exceeds stock
-        new_total_qty = existing_item.quantity + quantity
-        if product.stock_qty < new_total_qty:
-            return jsonify({'message': f'Insufficient stock. Available: {product.stock_qty}, Already in cart: {existing_item.quantity}'}), 400
-        
-        # Update quantity
-        existing_item.quantity = new_total_qty
-        existing_item.calculate_line_totals()
-        db.session.commit()
-        
-        item_data = {
-            'id': existing_item.id,
-            'product_id': existing_item.product_id,
-            'product_name': product.name,
-            'quantity': existing_item.quantity,
-            'unit_price': existing_item.unit_price,
-            'tax_percent': existing_item.tax_percent,
-            'line_subtotal': existing_item.line_subtotal,
-            'line_tax': existing_item.line_tax,
-            'line_total': existing_item.line_total
-        }
-        
-        return jsonify({
-            'message': 'Item quantity updated',
-            'item': item_data
-        }), 200
-    else:
-        # Create new item
-        item = InvoiceItem(
-            invoice_id=invoice_id,
-            product_id=product.id,
-            quantity=quantity,
-            unit_price=product.price,
-            tax_percent=product.tax_percent
-        )
-        item.calculate_line_totals()
-        
-        db.session.add(item)
-        db.session.commit()
-        
-        item_data = {
-            'id': item.id,
-            'product_id': item.product_id,
-            'product_name': product.name,
-            'quantity': item.quantity,
-            'unit_price': item.unit_price,
-            'tax_percent': item.tax_percent,
-            'line_subtotal': item.line_subtotal,
-            'line_tax': item.line_tax,
-            'line_total': item.line_total
-        }
-        
+        product_id=product.id,
+        quantity=quantity,
+        unit_price=product.price,
+        tax_percent=product.tax_percent,
+        line_subtotal=from_minor(subtotal),
+        line_tax=from_minor(tax),
+        line_total=from_minor(subtotal + tax)
+    )
+    # Same integer math as calculate_line_totals(), on the stored minor units
+    new_quantity = table.c.quantity + insert.excluded.quantity
+    new_subtotal = new_quantity * minor_units(table.c.unit_price)
+    new_tax = tax_on_sql(new_subtotal, table.c.tax_percent)
+    upsert = insert.on_conflict_do_update(
+        index_elements=[table.c.invoice_id, table.c.product_id],
+        set_={
+            'quantity': new_quantity,
+            'line_subtotal': new_subtotal,
+            'line_tax': new_tax,
+            'line_total': new_subtotal + new_tax
+        },
+        where=new_quantity <= product.stock_qty
+    ).returning(
+        table.c.id, table.c.product_id, table.c.quantity, table.c.unit_price, table.c.tax_percent,
+        table.c.line_subtotal, table.c.line_tax, table.c.line_total
+    )
+    row = db.session.execute(upsert).first()
+    
+    if row is None:
+        # The line exists and the combined quantity exceeds stock
+        in_cart = db.session.query(InvoiceItem.quantity).filter_by(
+            invoice_id=invoice_id, product_id=product.id
+        ).scalar()
+        db.session.rollback()
+        return jsonify({'message': f'Insufficient stock. Available: {product.stock_qty}, Already in cart: {in_cart}'}), 400
+    
+    invoice.updated_at = datetime.utcnow()
+    commit_writes()
+    
+    return _item_added_response(fastpath.line_dict(row, product.name), quantity)
+
+def _item_added_response(item_data, quantity):
+    """201 for a new line, 200 when the quantity was added to an existing one"""
+    # A fresh line holds exactly the requested quantity
+    if item_data['quantity'] == quantity:
         return jsonify({
             'message': 'Item added successfully',
             'item': item_data
         }), 201
+    
+    return jsonify({
+        'message': 'Item quantity updated',
+        'item': item_data
+    }), 200
 
 @invoices_bp.route('/api/invoices/<int:invoice_id>/items/<int:item_id>', methods=['PUT'])
 @jwt_required()
 def update_invoice_item(invoice_id, item_id):
     """Update invoice item quantity"""
+    if current_app.config['ITEM_FAST_PATH_ENABLED']:
+        item_data = fastpath.update_item(invoice_id, item_id, request.get_json(silent=True))
+        if item_data is not None:
+            db.session.commit()
+            return jsonify({
+                'message': 'Item updated successfully',
+                'item': item_data
+            }), 200
+    
     invoice = Invoice.query.get(invoice_id)
     if not invoice:
         return jsonify({'message': 'Invoice not found'}), 404
@@ -224,6 +305,7 @@ def update_invoice_item(invoice_id, item_id):
     if quantity <= 0:
         # Delete item if quantity is 0 or negative
         db.session.delete(item)
+        invoice.updated_at = datetime.utcnow()
         db.session.commit()
         return jsonify({'message': 'Item removed'}), 200
     
@@ -234,6 +316,7 @@ def update_invoice_item(invoice_id, item_id):
     
     item.quantity = quantity
     item.calculate_line_totals()
+    invoice.updated_at = datetime.utcnow()
     db.session.commit()
     
     return jsonify({
@@ -267,12 +350,44 @@ def delete_invoice_item(invoice_id, item_id):
         return jsonify({'message': 'Item not found'}), 404
     
     db.session.delete(item)
+    invoice.updated_at = datetime.utcnow()
     db.session.commit()
     
     return jsonify({'message': 'Item deleted successfully'}), 200
 
+@invoices_bp.route('/api/invoices/sync', methods=['POST'])
+@jwt_required()
+@idempotent
+def sync_offline_sales():
+    """Record a batch of completed sales made while a terminal was offline"""
+    data = request.get_json(silent=True) or {}
+    sales = data.get('sales')
+    
+    if not isinstance(sales, list) or not sales:
+        return jsonify({'message': 'sales must be a non-empty list'}), 400
+    
+    max_sales = current_app.config['SYNC_MAX_SALES']
+    if len(sales) > max_sales:
+        return jsonify({'message': f'At most {max_sales} sales per batch'}), 400
+    
+    user_id = int(get_jwt_identity())
+    for attempt in range(3):
+        try:
+            result = apply_offline_sales(sales, user_id)
+            commit_writes()
+            break
+        except IntegrityError:
+            # A concurrent upload of the same sales, or an invoice number
+            # taken meanwhile: the retry sees it and dedups or renumbers
+            db.session.rollback()
+    else:
+        return jsonify({'message': 'Could not record the batch, please retry'}), 503
+    
+    return jsonify(result), 200
+
 @invoices_bp.route('/api/invoices/<int:invoice_id>/complete', methods=['POST'])
 @jwt_required()
+@idempotent
 def complete_invoice(invoice_id):
     """Complete invoice and calculate final totals"""
     invoice = Invoice.query.get(invoice_id)
@@ -291,26 +406,27 @@ def complete_invoice(invoice_id):
     if discount < 0:
         return jsonify({'message': 'Discount cannot be negative'}), 400
     
-    # Validate stock availability for all items before completing
+    # Reduce stock quantities; each decrement checks availability atomically,
+    # and a short line undoes the ones already taken
+    user_id = int(get_jwt_identity())
     for item in invoice.items:
         product = item.product
-        if product and product.stock_qty < item.quantity:
-            return jsonify({'message': f'Insufficient stock for {product.name}. Available: {product.stock_qty}'}), 400
-    
-    # Reduce stock quantities
-    for item in invoice.items:
-        product = item.product
-        if product:
-            product.stock_qty -= item.quantity
+        if product and not take_stock(product, item.quantity, StockMovement.SALE,
+                                      invoice_id=invoice.id, user_id=user_id):
+            name = product.name
+            db.session.rollback()
+            return jsonify({'message': f'Insufficient stock for {name}. Available: {product.stock_qty}'}), 400
+    sync_low_stock([item.product for item in invoice.items])
     
     # Calculate totals
-    invoice.calculate_totals()
     invoice.discount_amount = discount
-    invoice.total_amount = invoice.subtotal_amount + invoice.total_tax - discount
+    invoice.calculate_totals()
     invoice.status = 'completed'
     invoice.updated_at = datetime.utcnow()
+    publish(REPORTS)
+    record_event(INVOICE_COMPLETED, invoice.id, invoice_payload(invoice))
     
-    db.session.commit()
+    commit_writes()
     
     items = []
     for item in invoice.items:
@@ -343,6 +459,37 @@ def complete_invoice(invoice_id):
         }
     }), 200
 
+@invoices_bp.route('/api/invoices/<int:invoice_id>/customer', methods=['PUT'])
+@jwt_required()
+def set_invoice_customer(invoice_id):
+    """Attach a customer to a draft invoice, or detach with customer_id null"""
+    invoice = Invoice.query.get(invoice_id)
+    if not invoice:
+        return jsonify({'message': 'Invoice not found'}), 404
+    
+    if invoice.status != 'draft':
+        return jsonify({'message': 'Cannot modify non-draft invoice'}), 400
+    
+    data = request.get_json() or {}
+    if 'customer_id' not in data:
+        return jsonify({'message': 'customer_id is required'}), 400
+    
+    customer = None
+    if data['customer_id'] is not None:
+        customer = db.session.get(Customer, data['customer_id'])
+        if not customer:
+            return jsonify({'message': 'Customer not found'}), 404
+    
+    invoice.customer_id = customer.id if customer else None
+    invoice.updated_at = datetime.utcnow()
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Customer attached' if customer else 'Customer removed',
+        'invoice_id': invoice.id,
+        'customer': customer.to_dict() if customer else None
+    }), 200
+
 @invoices_bp.route('/api/invoices/<int:invoice_id>', methods=['DELETE'])
 @jwt_required()
 def delete_invoice(invoice_id):
@@ -354,10 +501,15 @@ def delete_invoice(invoice_id):
     try:
         # If deleting a completed invoice, restore stock quantities
         if invoice.status == 'completed':
+            user_id = int(get_jwt_identity())
             for item in invoice.items:
                 product = item.product
                 if product:
-                    product.stock_qty += item.quantity
+                    record_movement(product, item.quantity, StockMovement.RETURN,
+                                    invoice_id=invoice.id, user_id=user_id)
+            sync_low_stock([item.product for item in invoice.items])
+            publish(REPORTS)
+            record_event(INVOICE_DELETED, invoice.id, invoice_payload(invoice))
         
         # Delete all items first
         InvoiceItem.query.filter_by(invoice_id=invoice_id).delete()
@@ -406,11 +558,18 @@ def list_invoices():
     query = query.order_by(Invoice.created_at.desc())
     
     # Paginate
-    pagination = query.paginate(page=page, per_page=page_size, error_out=False)
-    
-    invoices = []
-    for invoice in pagination.items:
-        invoices.append({
+    page = max(page, 1)
+    page_size = max(page_size, 1)
+    total = query.order_by(None).count()
+    
+    # Item counts come from a correlated subquery instead of one query per invoice
+    items_count = db.session.query(func.count(InvoiceItem.id)).filter(
+        InvoiceItem.invoice_id == Invoice.id
+    ).correlate(Invoice).scalar_subquery()
+    rows = query.add_columns(items_count).limit(page_size).offset((page - 1) * page_size).yield_per(50)
+    
+    invoices = (
+        {
             'id': invoice.id,
             'invoice_number': invoice.invoice_number,
             'customer_id': invoice.customer_id,
@@ -421,13 +580,131 @@ def list_invoices():
             'total_amount': invoice.total_amount,
             'created_at': invoice.created_at.isoformat(),
             'updated_at': invoice.updated_at.isoformat() if invoice.updated_at else None,
-            'items_count': invoice.items.count()
-        })
+            'items_count': count
+        }
+        for invoice, count in rows
+    )
     
-    return jsonify({
-        'invoices': invoices,
+    return stream_json({
         'page': page,
         'page_size': page_size,
-        'total': pagination.total,
-        'pages': pagination.pages
-    }), 200
+        'total': total,
+        'pages': math.ceil(total / page_size)
+    }, 'invoices', invoices)
+
+
+def _encode_cursor(created_at, invoice_id):
+    """Opaque keyset cursor for the row after which the next page starts"""
+    raw = f'{created_at.isoformat()}|{invoice_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """(created_at, id) from a cursor; raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, invoice_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(invoice_id)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(str(e))
+
+
+@invoices_bp.route('/api/invoices/search', methods=['GET'])
+@jwt_required()
+def search_invoices():
+    """Search invoices by number suffix, product, amount range, customer and date, newest first.
+
+    Pages are keyset-based: pass the returned `next_cursor` as `cursor` to
+    get the next one. Every filter is served by an index, so a page costs
+    the same however deep it is.
+    """
+    args = request.args
+    limit = min(max(args.get('limit', 20, type=int), 1), 100)
+    
+    query = db.session.query(Invoice, Customer.name.label('customer_name')).outerjoin(
+        Customer, Customer.id == Invoice.customer_id
+    )
+    
+    number = args.get('number', '').strip().upper()
+    if number:
+        # Suffix match: a prefix range on the reversed number
+        reversed_number = number[::-1]
+        query = query.filter(
+            Invoice.number_reversed >= reversed_number,
+            Invoice.number_reversed < reversed_number[:-1] + chr(ord(reversed_number[-1]) + 1)
+        )
+    
+    product_id = args.get('product_id', type=int)
+    if product_id is not None:
+        lines = db.session.query(InvoiceItem.invoice_id).filter(InvoiceItem.product_id == product_id)
+        quantity = args.get('quantity', type=int)
+        if quantity is not None:
+            lines = lines.filter(InvoiceItem.quantity == quantity)
+        query = query.filter(Invoice.id.in_(lines))
+    
+    customer_id = args.get('customer_id', type=int)
+    if customer_id is not None:
+        query = query.filter(Invoice.customer_id == customer_id)
+    
+    min_total = args.get('min_total', type=float)
+    max_total = args.get('max_total', type=float)
+    if min_total is not None:
+        query = query.filter(Invoice.total_amount >= min_total)
+    if max_total is not None:
+        query = query.filter(Invoice.total_amount <= max_total)
+    
+    status = args.get('status')
+    if status:
+        query = query.filter(Invoice.status == status)
+    
+    try:
+        if args.get('from'):
+            query = query.filter(Invoice.created_at >= datetime.strptime(args['from'], '%Y-%m-%d'))
+        if args.get('to'):
+            # Include the entire to date
+            query = query.filter(
+                Invoice.created_at < datetime.strptime(args['to'], '%Y-%m-%d') + timedelta(days=1)
+            )
+    except ValueError:
+        return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    
+    cursor = args.get('cursor')
+    if cursor:
+        try:
+            after_created, after_id = _decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'message': 'Invalid cursor'}), 400
+        query = query.filter(tuple_(Invoice.created_at, Invoice.id) < tuple_(after_created, after_id))
+    
+    items_count = db.session.query(func.count(InvoiceItem.id)).filter(
+        InvoiceItem.invoice_id == Invoice.id
+    ).correlate(Invoice).scalar_subquery()
+    # One extra row tells whether there is a next page
+    rows = query.add_columns(items_count).order_by(
+        Invoice.created_at.desc(), Invoice.id.desc()
+    ).limit(limit + 1).all()
+    
+    invoices = [
+        {
+            'id': invoice.id,
+            'invoice_number': invoice.invoice_number,
+            'customer_id': invoice.customer_id,
+            'customer_name': customer_name,
+            'status': invoice.status,
+            'subtotal_amount': invoice.subtotal_amount,
+            'total_tax': invoice.total_tax,
+            'discount_amount': invoice.discount_amount,
+            'total_amount': invoice.total_amount,
+            'created_at': invoice.created_at.isoformat(),
+            'updated_at': invoice.updated_at.isoformat() if invoice.updated_at else None,
+            'items_count': count
+        }
+        for invoice, customer_name, count in rows[:limit]
+    ]
+    
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1][0]
+        next_cursor = _encode_cursor(last.created_at, last.id)
+    
+    return jsonify({'invoices': invoices, 'next_cursor': next_cursor}), 200
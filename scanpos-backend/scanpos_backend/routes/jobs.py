@@ -0,0 +1,125 @@
+from flask import Blueprint, jsonify, request, current_app, send_file
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from scanpos_backend.extensions import db
+from scanpos_backend.models import Job, User
+from scanpos_backend.jobs import JOB_KINDS, ACTIVE, submit_job, cancel_job, result_path
+import os
+import time
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+def _current_user():
+    return User.query.get(int(get_jwt_identity()))
+
+
+def _get_visible_job(job_id):
+    """Get a job owned by the current user (admins see all), or None"""
+    job = db.session.get(Job, job_id)
+    if not job:
+        return None
+    user = _current_user()
+    if job.user_id != user.id and user.role != 'admin':
+        return None
+    return job
+
+
+@jobs_bp.route('/api/jobs', methods=['POST'])
+@jwt_required()
+def create_job():
+    """Queue a background job"""
+    data = request.get_json() or {}
+    kind = data.get('kind')
+    
+    spec = JOB_KINDS.get(kind)
+    if not spec:
+        return jsonify({'message': f'Unknown job kind. Use one of: {", ".join(sorted(JOB_KINDS))}'}), 400
+    
+    user = _current_user()
+    if spec['admin_only'] and user.role != 'admin':
+        return jsonify({'message': 'Admin access required'}), 403
+    
+    priority = data.get('priority')
+    if priority is not None:
+        try:
+            priority = int(priority)
+        except (TypeError, ValueError):
+            return jsonify({'message': 'priority must be an integer'}), 400
+        # Only admins may jump the queue
+        if user.role != 'admin':
+            priority = min(priority, spec['priority'])
+    
+    try:
+        job = submit_job(kind, data.get('params') or {}, user_id=user.id, priority=priority)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    return jsonify({'job': job.to_dict()}), 202, {'Location': f'/api/jobs/{job.id}'}
+
+
+@jobs_bp.route('/api/jobs', methods=['GET'])
+@jwt_required()
+def list_jobs():
+    """List the current user's recent jobs (admins see all)"""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    status = request.args.get('status')
+    
+    query = Job.query
+    user = _current_user()
+    if user.role != 'admin':
+        query = query.filter(Job.user_id == user.id)
+    if status:
+        query = query.filter(Job.status == status)
+    
+    jobs = query.order_by(Job.id.desc()).limit(limit).all()
+    return jsonify({'jobs': [job.to_dict() for job in jobs]}), 200
+
+
+@jobs_bp.route('/api/jobs/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Get job status; ?wait=N holds the request up to N seconds until it finishes"""
+    job = _get_visible_job(job_id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    
+    wait = min(request.args.get('wait', 0, type=float), current_app.config['JOB_MAX_WAIT_SECONDS'])
+    deadline = time.monotonic() + wait
+    while job.status in ACTIVE and time.monotonic() < deadline:
+        time.sleep(0.5)
+        # End the read transaction so the runner's update is visible
+        db.session.rollback()
+    
+    return jsonify({'job': job.to_dict()}), 200
+
+
+@jobs_bp.route('/api/jobs/<int:job_id>/result', methods=['GET'])
+@jwt_required()
+def download_job_result(job_id):
+    """Download a completed job's result file"""
+    job = _get_visible_job(job_id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    
+    if job.status != Job.COMPLETED:
+        return jsonify({'message': f'Job is {job.status}'}), 409
+    
+    path = result_path(job)
+    if not path or not os.path.exists(path):
+        return jsonify({'message': 'Job has no result file'}), 404
+    
+    return send_file(path, mimetype=job.result_type, as_attachment=True, download_name=job.result_file)
+
+
+@jobs_bp.route('/api/jobs/<int:job_id>', methods=['DELETE'])
+@jwt_required()
+def delete_job(job_id):
+    """Cancel a queued job"""
+    job = _get_visible_job(job_id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    
+    if not cancel_job(job):
+        return jsonify({'message': f'Job is {job.status} and can no longer be cancelled'}), 409
+    
+    return jsonify({'message': 'Job cancelled', 'job': job.to_dict()}), 200
@@ -1,8 +1,13 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from scanpos_backend.extensions import db
-from scanpos_backend.models import Product
-from sqlalchemy import or_
+from scanpos_backend.models import Product, LowStockAlert, StockMovement
+from scanpos_backend.inventory import record_movement, stock_at, sync_low_stock
+from scanpos_backend.invalidation import PRODUCTS, publish, get_cache
+from scanpos_backend.outbox import PRODUCT_CREATED, PRODUCT_UPDATED, PRODUCT_DELETED, product_payload, record_event
+from scanpos_backend.streaming import stream_page, stream_json, CHUNK_ITEMS
+from datetime import datetime
+from sqlalchemy import func, or_
 
 products_bp = Blueprint('products', __name__, url_prefix='/api/products')
 
@@ -33,19 +38,9 @@ def get_products():
     if not show_inactive:
         query = query.filter(Product.is_active == True)
     
-    # Apply pagination
-    pagination = query.order_by(Product.created_at.desc()).paginate(
-        page=page, 
-        per_page=page_size, 
-        error_out=False
-    )
-    
-    return jsonify({
-        'products': [product.to_dict() for product in pagination.items],
-        'total': pagination.total,
-        'pages': pagination.pages,
-        'current_page': page
-    }), 200
+    # Apply pagination, streaming the page out as rows are read
+    return stream_page(query.order_by(Product.created_at.desc()), page, page_size, 'products',
+                       lambda product: product.to_dict())
 
 
 @products_bp.route('', methods=['POST'])
@@ -70,11 +65,22 @@ def create_product():
         barcode=data.get('barcode'),
         price=float(data['price']),
         tax_percent=float(data.get('tax_percent', 0)),
-        stock_qty=int(data.get('stock_qty', 0)),
+        stock_snapshot=0,
+        reorder_level=int(data.get('reorder_level', 10)),
         is_active=data.get('is_active', True)
     )
     
     db.session.add(product)
+    db.session.flush()
+    
+    # Opening stock goes through the ledger like any other change
+    opening_stock = int(data.get('stock_qty', 0))
+    if opening_stock:
+        record_movement(product, opening_stock, StockMovement.IMPORT,
+                        user_id=int(get_jwt_identity()), note='Opening stock')
+    sync_low_stock([product])
+    publish(PRODUCTS, product.id)
+    record_event(PRODUCT_CREATED, product.id, product_payload(product))
     db.session.commit()
     
     return jsonify({
@@ -83,6 +89,59 @@ def create_product():
     }), 201
 
 
+# Row layout of the changes feed; tombstones are just [id, row_version]
+CHANGE_COLUMNS = ['id', 'row_version', 'barcode', 'name', 'price', 'tax_percent']
+
+
+@products_bp.route('/changes', methods=['GET'])
+@jwt_required()
+def get_catalog_changes():
+    """Catalog rows created, changed or deactivated after ?since=<row_version>, oldest first.
+    
+    Terminals keep a local barcode catalog: start with since=0 (active
+    products only), then pass the returned `version` as `since`. When
+    `has_more` is true, call again straight away. Stock is not included;
+    it is checked at the till on add and complete.
+    """
+    since = max(request.args.get('since', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 5000, type=int), 1), 50000)
+    
+    latest = db.session.query(func.max(Product.row_version)).scalar() or 0
+    if since > latest:
+        # The terminal synced against another database (e.g. before a restore)
+        return jsonify({'message': 'Unknown catalog version, sync again from since=0', 'version': latest}), 410
+    
+    # Upper bound of this batch: the limit-th change, or the latest one
+    upper = db.session.query(Product.row_version).filter(
+        Product.row_version > since
+    ).order_by(Product.row_version).offset(limit - 1).limit(1).scalar()
+    if upper is None:
+        upper = latest
+    
+    query = db.session.query(
+        Product.id, Product.row_version, Product.barcode, Product.name, Product.price,
+        Product.tax_percent, Product.is_active
+    ).filter(
+        Product.row_version > since,
+        Product.row_version <= upper
+    ).order_by(Product.row_version)
+    if since == 0:
+        # A fresh catalog has nothing to delete
+        query = query.filter(Product.is_active == True)
+    
+    rows = (
+        [row.id, row.row_version, row.barcode, row.name, row.price, row.tax_percent]
+        if row.is_active else [row.id, row.row_version]
+        for row in query.yield_per(CHUNK_ITEMS)
+    )
+    return stream_json({
+        'since': since,
+        'version': upper if upper > since else since,
+        'has_more': upper < latest,
+        'columns': CHANGE_COLUMNS
+    }, 'changes', rows)
+
+
 @products_bp.route('/<int:id>', methods=['GET'])
 @jwt_required()
 def get_product(id):
@@ -113,6 +172,7 @@ def update_product(id):
             return jsonify({'message': 'Barcode already exists'}), 400
     
     # Update fields
+    before = product_payload(product)
     if 'name' in data:
         product.name = data['name']
     if 'barcode' in data:
@@ -122,10 +182,24 @@ def update_product(id):
     if 'tax_percent' in data:
         product.tax_percent = float(data['tax_percent'])
     if 'stock_qty' in data:
-        product.stock_qty = int(data['stock_qty'])
+        # Record the difference as an adjustment instead of overwriting stock
+        delta = int(data['stock_qty']) - product.stock_qty
+        if delta:
+            record_movement(product, delta, StockMovement.ADJUSTMENT,
+                            user_id=int(get_jwt_identity()), note=data.get('stock_note'))
+    if 'reorder_level' in data:
+        product.reorder_level = int(data['reorder_level'])
     if 'is_active' in data:
         product.is_active = data['is_active']
     
+    if 'stock_qty' in data or 'reorder_level' in data or 'is_active' in data:
+        sync_low_stock([product])
+    
+    # Stock adjustments alone are not catalog changes
+    after = product_payload(product)
+    if after != before:
+        record_event(PRODUCT_UPDATED, product.id, after)
+    publish(PRODUCTS, product.id)
     db.session.commit()
     
     return jsonify({
@@ -145,18 +219,91 @@ def delete_product(id):
     
     # Soft delete
     product.is_active = False
+    sync_low_stock([product])
+    publish(PRODUCTS, product.id)
+    record_event(PRODUCT_DELETED, product.id, product_payload(product))
     db.session.commit()
     
     return jsonify({'message': 'Product deleted successfully'}), 200
 
 
+@products_bp.route('/low-stock', methods=['GET'])
+@jwt_required()
+def get_low_stock_products():
+    """Get products below their reorder level, most urgent first"""
+    page = request.args.get('page', 1, type=int)
+    page_size = request.args.get('page_size', 20, type=int)
+    
+    # Walk the alert set rather than the catalog
+    query = Product.query.join(LowStockAlert, LowStockAlert.product_id == Product.id)
+    return stream_page(query.order_by(Product.stock_qty.asc(), Product.id.asc()), page, page_size,
+                       'products', lambda product: product.to_dict())
+
+
+@products_bp.route('/<int:id>/stock-movements', methods=['GET'])
+@jwt_required()
+def get_stock_movements(id):
+    """Get the stock ledger for a product, newest first"""
+    product = Product.query.get(id)
+    
+    if not product:
+        return jsonify({'message': 'Product not found'}), 404
+    
+    page = request.args.get('page', 1, type=int)
+    page_size = request.args.get('page_size', 20, type=int)
+    
+    pagination = StockMovement.query.filter_by(product_id=id).order_by(
+        StockMovement.id.desc()
+    ).paginate(page=page, per_page=page_size, error_out=False)
+    
+    return jsonify({
+        'movements': [movement.to_dict() for movement in pagination.items],
+        'total': pagination.total,
+        'pages': pagination.pages,
+        'current_page': page
+    }), 200
+
+
+@products_bp.route('/<int:id>/stock', methods=['GET'])
+@jwt_required()
+def get_product_stock(id):
+    """Get current stock, or stock at a point in time with ?at=<ISO datetime>"""
+    product = Product.query.get(id)
+    
+    if not product:
+        return jsonify({'message': 'Product not found'}), 404
+    
+    at = request.args.get('at')
+    if not at:
+        return jsonify({'product_id': product.id, 'stock_qty': product.stock_qty, 'at': None}), 200
+    
+    try:
+        at_dt = datetime.fromisoformat(at.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return jsonify({'message': 'Invalid at format. Use ISO format'}), 400
+    
+    return jsonify({
+        'product_id': product.id,
+        'stock_qty': stock_at(product, at_dt),
+        'at': at_dt.isoformat()
+    }), 200
+
+
 @products_bp.route('/by-barcode/<barcode>', methods=['GET'])
 @jwt_required()
 def get_product_by_barcode(barcode):
     """Get a product by barcode"""
+    # Scans hit the same few barcodes all day; entries are dropped on any change to the product
+    cache = get_cache('products_by_barcode')
+    cached = cache.get(barcode)
+    if cached is not None:
+        return jsonify(cached), 200
+    
     product = Product.query.filter_by(barcode=barcode, is_active=True).first()
     
     if not product:
         return jsonify({'message': 'Product not found'}), 404
     
-    return jsonify(product.to_dict()), 200
+    data = product.to_dict()
+    cache.set(barcode, data, tags=[product.id])
+    return jsonify(data), 200
@@ -1,9 +1,10 @@
-from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required
+from flask import Blueprint, jsonify, request, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from scanpos_backend.extensions import db
-from scanpos_backend.models import Invoice, InvoiceItem, Product
+from scanpos_backend.models import Invoice, Product, LowStockAlert, Customer
+from scanpos_backend.archive import sales_totals, top_products
+from scanpos_backend.invalidation import get_cache
 from datetime import datetime, timedelta
-from sqlalchemy import func, desc
 
 reports_bp = Blueprint('reports', __name__)
 
@@ -41,59 +42,38 @@ def sales_report():
         except (ValueError, AttributeError):
             return jsonify({'message': 'Invalid from date format. Use YYYY-MM-DD or ISO format'}), 400
     
+    # Long ranges can be run in the background instead
+    if request.args.get('async', 'false').lower() == 'true':
+        from scanpos_backend.jobs import submit_job
+        job = submit_job('sales_report', {
+            'from': from_date.strftime('%Y-%m-%d'),
+            'to': to_date.strftime('%Y-%m-%d')
+        }, user_id=int(get_jwt_identity()))
+        return jsonify({'job': job.to_dict()}), 202, {'Location': f'/api/jobs/{job.id}'}
+    
+    return jsonify(sales_report_data(from_date, to_date)), 200
+
+
+def sales_report_data(from_date, to_date, limit=10):
+    """Sales totals and best sellers from from_date through the whole of to_date"""
     # Add one day to include the entire to_date
     to_date_end = to_date + timedelta(days=1)
     
-    # Get completed invoices in date range
-    invoices = Invoice.query.filter(
-        Invoice.status == 'completed',
-        Invoice.created_at >= from_date,
-        Invoice.created_at < to_date_end
-    ).all()
-    
-    # Calculate totals
-    total_sales = sum(inv.total_amount for inv in invoices)
-    total_tax = sum(inv.total_tax for inv in invoices)
-    total_discount = sum(inv.discount_amount for inv in invoices)
-    invoice_count = len(invoices)
-    
-    # Get top selling products
-    top_products = db.session.query(
-        Product.id,
-        Product.name,
-        func.sum(InvoiceItem.quantity).label('total_quantity'),
-        func.sum(InvoiceItem.line_total).label('total_revenue')
-    ).join(InvoiceItem).join(Invoice).filter(
-        Invoice.status == 'completed',
-        Invoice.created_at >= from_date,
-        Invoice.created_at < to_date_end
-    ).group_by(Product.id, Product.name).order_by(desc('total_quantity')).limit(10).all()
-    
-    # Get top selling products
-    top_products_data = db.session.query(
-        Product.id,
-        Product.name,
-        Product.barcode,
-        func.sum(InvoiceItem.quantity).label('total_quantity'),
-        func.sum(InvoiceItem.line_total).label('total_revenue')
-    ).join(InvoiceItem).join(Invoice).filter(
-        Invoice.status == 'completed',
-        Invoice.created_at >= from_date,
-        Invoice.created_at < to_date_end
-    ).group_by(Product.id, Product.name, Product.barcode).order_by(desc('total_quantity')).limit(10).all()
-    
-    top_products_list = [
-        {
-            'product_id': p.id,
-            'product_name': p.name,
-            'sku': p.barcode or '',
-            'total_quantity': int(p.total_quantity),
-            'total_revenue': float(p.total_revenue)
+    # Answer from the columnar snapshot when it is fresh enough
+    store = _analytics_store()
+    if store is not None:
+        report = store.sales_report(from_date, to_date_end, limit=limit)
+        return {
+            'from_date': from_date.strftime('%Y-%m-%d'),
+            'to_date': to_date.strftime('%Y-%m-%d'),
+            **report
         }
-        for p in top_products_data
-    ]
     
-    return jsonify({
+    # Totals and best sellers across live and archived invoices
+    total_sales, total_tax, total_discount, invoice_count = sales_totals(from_date, to_date_end)
+    top_products_list = top_products(from_date, to_date_end, limit=limit)
+    
+    return {
         'from_date': from_date.strftime('%Y-%m-%d'),
         'to_date': to_date.strftime('%Y-%m-%d'),
         'total_sales': float(total_sales),
@@ -101,47 +81,80 @@ def sales_report():
         'total_discount': float(total_discount),
         'invoice_count': invoice_count,
         'top_products': top_products_list
+    }
+
+
+@reports_bp.route('/api/reports/sales/daily', methods=['GET'])
+@jwt_required()
+def daily_sales_report():
+    """Get per-day sales totals for a date range (columnar snapshot only)"""
+    store = _analytics_store()
+    if store is None:
+        return jsonify({'message': 'Analytics snapshot is not available'}), 503
+    
+    try:
+        to_date = datetime.strptime(request.args['to'], '%Y-%m-%d') if request.args.get('to') \
+            else datetime(*datetime.utcnow().timetuple()[:3])
+        from_date = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') \
+            else to_date - timedelta(days=30)
+    except ValueError:
+        return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    
+    return jsonify({
+        'from_date': from_date.strftime('%Y-%m-%d'),
+        'to_date': to_date.strftime('%Y-%m-%d'),
+        'days': store.daily_series(from_date, to_date + timedelta(days=1))
     }), 200
 
 
+def _analytics_store():
+    """Get the columnar snapshot if enabled and fresh, else None"""
+    if not current_app.config['ANALYTICS_ENABLED']:
+        return None
+    
+    # Imported lazily so numpy is only loaded when analytics is enabled
+    from scanpos_backend.analytics import get_store
+    store = get_store(current_app.config['ANALYTICS_DIR'])
+    if not store.ready or store.age_seconds > current_app.config['ANALYTICS_MAX_AGE_SECONDS']:
+        return None
+    return store
+
+
 @reports_bp.route('/api/reports/dashboard', methods=['GET'])
 @jwt_required()
 def dashboard_stats():
     """Get dashboard statistics"""
     now = datetime.utcnow()
+    
+    # Every terminal polls the dashboard; serve one computation per day key
+    # until a sale or stock change invalidates it
+    cache = get_cache('dashboard')
+    cache_key = now.date().isoformat()
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached), 200
+    
     today_start = datetime(now.year, now.month, now.day)
     week_start = today_start - timedelta(days=today_start.weekday())
     month_start = datetime(now.year, now.month, 1)
     
     # Today's sales
-    today_invoices = Invoice.query.filter(
-        Invoice.status == 'completed',
-        Invoice.created_at >= today_start
-    ).all()
-    today_sales = sum(inv.total_amount for inv in today_invoices)
-    today_count = len(today_invoices)
+    today_sales, _, _, today_count = sales_totals(today_start)
     
     # This week's sales
-    week_invoices = Invoice.query.filter(
-        Invoice.status == 'completed',
-        Invoice.created_at >= week_start
-    ).all()
-    week_sales = sum(inv.total_amount for inv in week_invoices)
-    week_count = len(week_invoices)
+    week_sales, _, _, week_count = sales_totals(week_start)
     
     # This month's sales
-    month_invoices = Invoice.query.filter(
-        Invoice.status == 'completed',
-        Invoice.created_at >= month_start
-    ).all()
-    month_sales = sum(inv.total_amount for inv in month_invoices)
-    month_count = len(month_invoices)
+    month_sales, _, _, month_count = sales_totals(month_start)
     
-    # Total products and low stock alerts
+    # Total products and low stock alerts (read from the maintained alert set,
+    # the full list is paginated at /api/products/low-stock)
     total_products = Product.query.filter_by(is_active=True).count()
-    low_stock_products = Product.query.filter(
-        Product.is_active == True,
-        Product.stock_qty < 10
+    low_stock_count = LowStockAlert.query.count()
+    low_stock_products = Product.query.join(
+        LowStockAlert, LowStockAlert.product_id == Product.id
+    ).order_by(Product.stock_qty.asc(), Product.id.asc()).limit(
+        current_app.config['LOW_STOCK_DASHBOARD_LIMIT']
     ).all()
     
     low_stock_list = [
@@ -150,13 +163,17 @@ def dashboard_stats():
             'name': p.name,
             'sku': p.barcode or '',
             'stock_qty': p.stock_qty,
+            'reorder_level': p.reorder_level,
             'price': float(p.price)
         }
         for p in low_stock_products
     ]
     
-    # Recent invoices
-    recent_invoices = Invoice.query.filter(
+    # Recent invoices, with the customer name joined in one query
+    recent_invoices = db.session.query(
+        Invoice.id, Invoice.invoice_number, Invoice.status, Invoice.total_amount, Invoice.created_at,
+        Customer.name.label('customer_name')
+    ).outerjoin(Customer, Customer.id == Invoice.customer_id).filter(
         Invoice.status == 'completed'
     ).order_by(Invoice.created_at.desc()).limit(5).all()
     
@@ -164,7 +181,7 @@ def dashboard_stats():
         {
             'id': inv.id,
             'invoice_number': inv.invoice_number,
-            'customer_name': inv.customer.name if inv.customer else None,
+            'customer_name': inv.customer_name,
             'status': inv.status,
             'grand_total': float(inv.total_amount),
             'created_at': inv.created_at.isoformat()
@@ -172,7 +189,7 @@ def dashboard_stats():
         for inv in recent_invoices
     ]
     
-    return jsonify({
+    stats = {
         'today': {
             'total_sales': float(today_sales),
             'invoice_count': today_count
@@ -187,5 +204,8 @@ def dashboard_stats():
         },
         'product_count': total_products,
         'low_stock': low_stock_list,
+        'low_stock_count': low_stock_count,
         'recent_invoices': recent_list
-    }), 200
+    }
+    cache.set(cache_key, stats)
+    return jsonify(stats), 200
@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from scanpos_backend.models import User
 from scanpos_backend.extensions import db
+from scanpos_backend.revocation import revoke_user_tokens
+from scanpos_backend.invalidation import USERS, publish, get_cache
 import traceback
 
 users_bp = Blueprint('users', __name__)
@@ -10,8 +12,14 @@ users_bp = Blueprint('users', __name__)
 def require_admin():
     """Decorator to check if user is admin"""
     user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
-    if not user or user.role != 'admin':
+    # Role lookups are cached per worker and dropped when the user changes
+    cache = get_cache('users')
+    role = cache.get(user_id)
+    if role is None:
+        user = User.query.get(user_id)
+        role = user.role if user else ''
+        cache.set(user_id, role, tags=[user_id])
+    if role != 'admin':
         return jsonify({'message': 'Admin access required'}), 403
     return None
 
@@ -182,8 +190,13 @@ def update_user(user_id):
         if 'password' in data and data['password']:
             user.set_password(data['password'])
         
+        publish(USERS, user.id)
         db.session.commit()
         
+        # A deactivated cashier is signed out of every terminal
+        if 'is_active' in data and not data['is_active']:
+            revoke_user_tokens(user.id)
+        
         return jsonify({
             'message': 'User updated successfully',
             'user': {
@@ -218,9 +231,28 @@ def delete_user(user_id):
             return jsonify({'message': 'User not found'}), 404
         
         db.session.delete(user)
+        publish(USERS, user_id)
         db.session.commit()
+        revoke_user_tokens(user_id)
         
         return jsonify({'message': 'User deleted successfully'}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
+
+
+@users_bp.route('/api/users/<int:user_id>/revoke-sessions', methods=['POST'])
+@jwt_required()
+def revoke_user_sessions(user_id):
+    """Revoke every token issued to a user (admin only)"""
+    admin_check = require_admin()
+    if admin_check:
+        return admin_check
+    
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({'message': 'User not found'}), 404
+    
+    revoke_user_tokens(user.id)
+    
+    return jsonify({'message': 'User sessions revoked'}), 200
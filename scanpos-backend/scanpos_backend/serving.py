@@ -0,0 +1,76 @@
+"""Production serving: worker models, DB pool sizing and admission limits.
+
+`gunicorn.conf.py` reads the SERVER_* settings to run one of three worker
+models, and the app sizes each worker's connection pools from the same
+settings, so a worker never has more requests in flight than it can give
+connections to, and the server as a whole stays within the database's
+connection budget (workers x (pool size + overflow)). Admission control's
+in-flight limits are fitted to the same concurrency.
+"""
+WORKER_CLASSES = ('sync', 'gthread', 'gevent')
+
+
+def worker_concurrency(config):
+    """Requests one worker process can have in flight"""
+    worker_class = config['SERVER_WORKER_CLASS']
+    if worker_class not in WORKER_CLASSES:
+        raise ValueError(f'SERVER_WORKER_CLASS must be one of {", ".join(WORKER_CLASSES)}')
+    if worker_class == 'gthread':
+        return config['SERVER_THREADS']
+    if worker_class == 'gevent':
+        # Admission control caps the green threads doing work at once
+        return min(config['SERVER_WORKER_CONNECTIONS'], config['ADMISSION_MAX_INFLIGHT'])
+    return 1
+
+
+def admission_limits(config):
+    """Admission in-flight limits for one worker: (max_inflight, checkout_reserve, class_limits).
+
+    A sync or gthread worker never runs more requests than its threads; the
+    rest wait in gunicorn's queue, out of admission control's sight. The
+    configured limits are therefore capped at worker_concurrency(): checkout
+    keeps at most a quarter of the slots and no class gets more than half of
+    the others, so a saturated worker still sheds.
+    """
+    max_inflight = min(config['ADMISSION_MAX_INFLIGHT'], worker_concurrency(config))
+    checkout_reserve = min(config['ADMISSION_CHECKOUT_RESERVE'], max_inflight // 4)
+    shared = max_inflight - checkout_reserve
+    class_limits = {
+        route_class: min(limit, max(1, shared // 2))
+        for route_class, limit in config['ADMISSION_CLASS_LIMITS'].items()
+    }
+    return max_inflight, checkout_reserve, class_limits
+
+
+def pool_options(config):
+    """Per-engine pool settings for one worker"""
+    return {
+        'pool_size': config['DB_POOL_SIZE'] or worker_concurrency(config),
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT_SECONDS'],
+    }
+
+
+def total_connections(config):
+    """Most connections the whole server can open to each database"""
+    options = pool_options(config)
+    return config['SERVER_WORKERS'] * (options['pool_size'] + options['max_overflow'])
+
+
+def _in_memory(uri):
+    uri = str(uri)
+    return uri.startswith('sqlite') and (':memory:' in uri or uri.rstrip('/').endswith(':'))
+
+
+def init_pool_sizing(app):
+    """Size the connection pools for the configured worker model.
+
+    Explicit SQLALCHEMY_ENGINE_OPTIONS win. In-memory SQLite uses a static
+    pool that takes no size options, so it is left alone.
+    """
+    uris = [app.config['SQLALCHEMY_DATABASE_URI'], *app.config.get('SQLALCHEMY_BINDS', {}).values()]
+    if any(_in_memory(uri) for uri in uris):
+        return
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **pool_options(app.config), **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    }
@@ -0,0 +1,67 @@
+"""Incrementally streamed JSON responses for list endpoints"""
+import math
+from flask import Response, current_app, stream_with_context
+
+# Items serialized per yielded chunk
+CHUNK_ITEMS = 50
+
+
+def stream_json(envelope, key, items, status=200):
+    """Stream `{**envelope, key: [items...]}` without building it in memory.
+
+    `items` may be any iterable (e.g. a query with yield_per) and must yield
+    JSON-serializable objects. The body is the same JSON a jsonify() of the
+    full dict would produce, apart from key order.
+    """
+    dumps = current_app.json.dumps
+
+    def generate():
+        head = dumps(envelope)[:-1]
+        yield head + (', ' if envelope else '') + dumps(key) + ': ['
+        buffer = []
+        first = True
+        for item in items:
+            buffer.append(dumps(item))
+            if len(buffer) >= CHUNK_ITEMS:
+                yield ('' if first else ', ') + ', '.join(buffer)
+                first = False
+                buffer = []
+        if buffer:
+            yield ('' if first else ', ') + ', '.join(buffer)
+        yield ']}'
+
+    return Response(stream_with_context(generate()), status=status, mimetype='application/json')
+
+
+def stream_page(query, page, page_size, key, serialize, extra=None):
+    """Stream one page of an ordered query in the standard paginated envelope.
+
+    Only the count runs up front; rows are fetched in batches while the body
+    is being written, so memory doesn't grow with page size.
+    """
+    page = max(page, 1)
+    page_size = max(page_size, 1)
+    total = query.order_by(None).count()
+    envelope = {
+        'total': total,
+        'pages': math.ceil(total / page_size),
+        'current_page': page,
+        **(extra or {})
+    }
+    rows = query.limit(page_size).offset((page - 1) * page_size).yield_per(CHUNK_ITEMS)
+    return stream_json(envelope, key, (serialize(row) for row in rows))
+
+
+def stream_ndjson(lines, headers=None):
+    """Stream already serialized JSON documents, one per line (NDJSON)"""
+    def generate():
+        buffer = []
+        for line in lines:
+            buffer.append(line)
+            if len(buffer) >= CHUNK_ITEMS:
+                yield '\n'.join(buffer) + '\n'
+                buffer = []
+        if buffer:
+            yield '\n'.join(buffer) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers=headers)
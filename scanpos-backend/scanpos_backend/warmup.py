@@ -0,0 +1,68 @@
+"""Startup warmup so the first requests after a deploy are not slow.
+
+`warmup(app)` does the per-process work that can be shared copy-on-write:
+mapper configuration, compiling the hot statements, and reading the
+product/barcode data into the OS page cache. Under a pre-fork server, run it
+once in the master before forking (e.g. gunicorn --preload), then call
+`warm_worker(app)` in each worker after the fork to drop the inherited
+connections and open its own pool.
+"""
+import gc
+import time
+from sqlalchemy import text
+from sqlalchemy.orm import configure_mappers
+from .extensions import db
+from .models import Product, Invoice, InvoiceItem, LowStockAlert
+
+
+def warmup(app, freeze=True):
+    """Prepare the app in the master process. Returns timings in ms."""
+    timings = {}
+
+    start = time.perf_counter()
+    configure_mappers()
+    timings['mappers_ms'] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with app.app_context():
+        # Run the hot-path queries once so their compiled SQL is cached on
+        # the engine, and walk the barcode index and product rows so their
+        # pages are in the OS cache shared by every worker
+        db.session.query(Product.id, Product.barcode).filter(Product.is_active == True).all()
+        Product.query.filter_by(barcode='', is_active=True).first()
+        db.session.get(Product, 0)
+        db.session.get(Invoice, 0)
+        InvoiceItem.query.filter_by(invoice_id=0, product_id=0).first()
+        LowStockAlert.query.count()
+        db.session.remove()
+        # Connections must not be shared across a fork
+        for engine in db.engines.values():
+            engine.dispose()
+    timings['prime_ms'] = (time.perf_counter() - start) * 1000
+
+    if freeze:
+        # Move everything allocated so far out of the GC's reach, so
+        # collections in the workers don't write to (and un-share) it
+        gc.collect()
+        gc.freeze()
+
+    app.extensions['warmup'] = timings
+    return timings
+
+
+def warm_worker(app):
+    """Open this worker's own connection pool. Returns elapsed ms."""
+    start = time.perf_counter()
+    with app.app_context():
+        for engine in db.engines.values():
+            # Forget connections inherited from the master without closing them
+            engine.dispose(close=False)
+            # More than the pool holds would be discarded again (or wait on overflow)
+            count = min(app.config['WARMUP_POOL_CONNECTIONS'], getattr(engine.pool, 'size', lambda: 1)())
+            connections = [engine.connect() for _ in range(count)]
+            for connection in connections:
+                connection.execute(text('SELECT 1'))
+                connection.close()
+    elapsed = (time.perf_counter() - start) * 1000
+    app.extensions.setdefault('warmup', {})['worker_ms'] = elapsed
+    return elapsed
@@ -0,0 +1,11 @@
+"""WSGI entry point for production servers.
+
+The app is created and warmed at import time, so a pre-fork server that
+preloads it (gunicorn --preload wsgi:app) shares the warmed state with every
+worker. Each worker must then call warm_worker(app) after the fork.
+"""
+from scanpos_backend import create_app
+from scanpos_backend.warmup import warmup
+
+app = create_app()
+warmup(app)
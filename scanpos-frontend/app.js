@@ -158,8 +158,7 @@ app.run(['$rootScope', '$location', '$window', 'AuthService', function($rootScop
     
     // Logout function
     $rootScope.logout = function() {
-        $window.localStorage.removeItem('scanpos_token');
-        $window.localStorage.removeItem('scanpos_user');
+        AuthService.logout();
         updateAuthState();
         $location.path('/login');
     };
@@ -19,6 +19,13 @@ app.service('AuthService', ['$http', '$window', 'API_URL', function($http, $wind
     
     // Logout
     service.logout = function() {
+        // Revoke the token server-side; the local session ends either way
+        var token = service.getToken();
+        if (token) {
+            $http.post(API_URL + '/api/auth/logout', null, {
+                headers: { 'Authorization': 'Bearer ' + token }
+            });
+        }
         $window.localStorage.removeItem(TOKEN_KEY);
         $window.localStorage.removeItem(USER_KEY);
     };
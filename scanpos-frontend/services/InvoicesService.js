@@ -1,4 +1,4 @@
-app.service('InvoicesService', ['$http', 'API_URL', function($http, API_URL) {
+app.service('InvoicesService', ['$http', '$q', '$timeout', 'API_URL', function($http, $q, $timeout, API_URL) {
     
     // Get auth token from localStorage
     function getAuthHeader() {
@@ -9,6 +9,34 @@ app.service('InvoicesService', ['$http', 'API_URL', function($http, API_URL) {
         };
     }
     
+    // Random key identifying one logical request across retries
+    function newIdempotencyKey() {
+        return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 12);
+    }
+    
+    // Send a write with an Idempotency-Key, retrying with the same key on
+    // timeouts, network errors and "still in progress" so it runs exactly once
+    function sendIdempotent(config, retries) {
+        var headers = getAuthHeader();
+        headers['Idempotency-Key'] = newIdempotencyKey();
+        config.headers = headers;
+        config.timeout = config.timeout || 5000;
+        
+        function attempt(remaining) {
+            return $http(config).catch(function(response) {
+                var retryable = response.status <= 0 || response.status === 409 || response.status === 503;
+                if (!retryable || remaining <= 0) {
+                    return $q.reject(response);
+                }
+                return $timeout(function() {}, 500).then(function() {
+                    return attempt(remaining - 1);
+                });
+            });
+        }
+        
+        return attempt(retries === undefined ? 3 : retries);
+    }
+    
     return {
         // Create a new draft invoice
         createInvoice: function(data) {
@@ -31,10 +59,9 @@ app.service('InvoicesService', ['$http', 'API_URL', function($http, API_URL) {
         
         // Add item to invoice by product_id or barcode
         addItem: function(invoiceId, itemData) {
-            return $http({
+            return sendIdempotent({
                 method: 'POST',
                 url: API_URL + '/api/invoices/' + invoiceId + '/items',
-                headers: getAuthHeader(),
                 data: itemData
             });
         },
@@ -60,10 +87,9 @@ app.service('InvoicesService', ['$http', 'API_URL', function($http, API_URL) {
         
         // Complete invoice with optional discount
         completeInvoice: function(invoiceId, discountAmount) {
-            return $http({
+            return sendIdempotent({
                 method: 'POST',
                 url: API_URL + '/api/invoices/' + invoiceId + '/complete',
-                headers: getAuthHeader(),
                 data: { discount_amount: discountAmount || 0 }
             });
         },